@@ -0,0 +1,283 @@
+# This is the script where I time the parts of the pipeline, to see if a change makes runs faster or slower
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import importlib
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+"""
+Two modes:
+
+    python benchmarks/run_benchmarks.py --mode stub
+    python benchmarks/run_benchmarks.py --mode mcell --iterations 1000
+
+- stub: replaces mcell with benchmarks/stub_mcell/mcell.py, which writes a synthetic .gdat, and times everything
+  around the simulation: prepare_out_folder, process_parameters, a whole run_model() call, and dispatching
+  a sweep one run after the other and on a process pool. Works on machines without MCell.
+- mcell: times the real simulation of each project BNGL file: setup (set_up_model + load_bngl), initialize,
+  iterations per second and end_simulation.
+
+Everything runs in a temporary copy of the BNGL files and mcell_params.py, so data_output/ isn't touched.
+Results are saved as json in benchmarks/results/, and can be compared with an earlier result:
+
+    python benchmarks/run_benchmarks.py --mode stub --compare benchmarks/results/<earlier>.json
+
+Stub mode first checks that the stub has every mcell attribute the repository uses (m.<name> and model.<name>),
+so a change that starts using a new part of the MCell API can't break it unnoticed. --smoke does that check and one
+quick pass of every stub benchmark without saving a result, to run after every change (it exits with an error if
+anything fails):
+
+    python benchmarks/run_benchmarks.py --smoke
+"""
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+STUB_DIR = os.path.join(BENCHMARK_DIR, "stub_mcell")
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+
+PROJECT_BNGL_FILES = ["dodecamer_NMDAR.bngl", "dodecamer_NMDAR_Ca_pulse.bngl", "dodecamer_NMDAR-paper.bngl", "dodecamer.bngl"]
+
+# Files whose `model` isn't an MCell model (bngl_validator.py has its own BNGLModel), left out of the stub check
+STUB_CHECK_SKIP = ["bngl_validator.py"]
+
+# A slowdown of more than this fraction is reported as a regression by --compare
+TOLERANCE = 0.1
+
+def use_stub_mcell():
+    # Put the stand-in first on the path, also for worker processes started by the pool
+    sys.path.insert(0, STUB_DIR)
+    os.environ["PYTHONPATH"] = os.pathsep.join([STUB_DIR, REPO_DIR, os.environ.get("PYTHONPATH", "")])
+
+def check_stub():
+    """
+    Returns the mcell attributes used in the repository (m.<name>, model.<name>) that the stub doesn't have.
+    """
+    stub = importlib.import_module("mcell")
+    stub_model = stub.Model()
+    used = set()
+    for root, dirs, files in os.walk(REPO_DIR):
+        dirs[:] = [d for d in dirs if d != "benchmarks" and not d.startswith(".")]
+        for file_name in files:
+            if not file_name.endswith(".py") or file_name in STUB_CHECK_SKIP:
+                continue
+            with open(os.path.join(root, file_name), 'r', encoding="utf-8", errors="replace") as f:
+                text = f.read()
+            used |= {("m", name) for name in re.findall(r"\bm\.(\w+(?:\.\w+)?)", text)}
+            used |= {("model", name) for name in re.findall(r"\bmodel\.(?!py\b)(\w+(?:\.\w+)?)", text)}
+
+    missing = []
+    for owner, name in sorted(used):
+        value = stub if owner == "m" else stub_model
+        for part in name.split("."):
+            if not hasattr(value, part):
+                missing.append(f"{owner}.{name}")
+                break
+            value = getattr(value, part)
+    return missing
+
+def make_work_folder():
+    # Temporary working directory with the files run_model() copies into each run folder
+    work_folder = tempfile.mkdtemp(prefix="benchmarks_")
+    for file_name in PROJECT_BNGL_FILES + ["mcell_params.py"]:
+        shutil.copy(os.path.join(REPO_DIR, file_name), work_folder)
+    return work_folder
+
+def time_it(function, repeats):
+    """
+    Calls function() repeats times.
+
+    Returns:
+    - dict with the wall time of every call and their median, min and mean (seconds), and the total cpu time.
+    """
+    wall_times = []
+    cpu_start = time.process_time()
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        wall_times.append(time.perf_counter() - start)
+    return {
+        "metric": "seconds",
+        "values": wall_times,
+        "median": statistics.median(wall_times),
+        "min": min(wall_times),
+        "mean": statistics.mean(wall_times),
+        "cpu_seconds": time.process_time() - cpu_start,
+    }
+
+def stub_benchmarks(repeats, n_points, n_workers, iterations):
+    from prepare_run_files import prepare_out_folder
+    from mcell_params import process_parameters
+    from run_model import run_model
+    from global_sensitivity_run import run_overrides
+
+    bngl_file = PROJECT_BNGL_FILES[0]
+    overrides = {"ITERATIONS": iterations}
+    results = {}
+
+    results["prepare_out_folder"] = time_it(
+        lambda: prepare_out_folder("bench_folders", 2, files_to_copy=[bngl_file, "mcell_params.py"]), repeats)
+
+    run_folder, timestamp = prepare_out_folder("bench_parameters", 2, files_to_copy=[bngl_file])
+    results["process_parameters"] = time_it(
+        lambda: process_parameters(bngl_file, run_folder, timestamp, overrides), repeats)
+
+    results["run_model"] = time_it(
+        lambda: run_model(overrides, bngl_file=bngl_file, output_folder="bench_runs", use_cache=False), repeats)
+
+    # Sweep dispatch: n_points different points, so nothing is taken from the run cache
+    def sweep(workers):
+        overrides_list = [{"ITERATIONS": iterations, "kon_CaMKII_NMDAR": 1e3 * (i + 1)} for i in range(n_points)]
+        return lambda: run_overrides(overrides_list, n_workers=workers, output_folder="bench_sweeps",
+                                     bngl_file=bngl_file, use_cache=False)
+    results[f"sweep_{n_points}_points_sequential"] = time_it(sweep(1), repeats)
+    results[f"sweep_{n_points}_points_pool_{n_workers}_workers"] = time_it(sweep(n_workers), repeats)
+
+    return results
+
+def mcell_benchmarks(repeats, iterations, bngl_files):
+    from mcell_params import set_up_model
+
+    results = {}
+    for bngl_file in bngl_files:
+        phases = {"setup": [], "initialize": [], "end_simulation": [], "iterations_per_second": []}
+        for repeat in range(repeats):
+            start = time.perf_counter()
+            model = set_up_model(seed=repeat + 1)
+            model.load_bngl(bngl_file, observables_path_or_file=f"bench_{repeat}_out.gdat")
+            model.config.total_iterations = iterations
+            phases["setup"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            model.initialize()
+            phases["initialize"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            model.run_iterations(iterations)
+            phases["iterations_per_second"].append(iterations / (time.perf_counter() - start))
+
+            start = time.perf_counter()
+            model.end_simulation()
+            phases["end_simulation"].append(time.perf_counter() - start)
+
+        name = os.path.splitext(bngl_file)[0]
+        for phase, values in phases.items():
+            results[f"{name}_{phase}"] = {
+                "metric": "iterations_per_second" if phase == "iterations_per_second" else "seconds",
+                "values": values,
+                "median": statistics.median(values),
+                "min": min(values),
+                "mean": statistics.mean(values),
+            }
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_file, tolerance=TOLERANCE):
+    """
+    Prints how each benchmark changed since the baseline result file.
+
+    Returns:
+    - list of the names of the benchmarks that got slower by more than tolerance.
+    """
+    with open(baseline_file, 'r') as f:
+        baseline = json.load(f)["benchmarks"]
+
+    regressions = []
+    print(f"\nCompared with {baseline_file} (slowdown > 1 is slower):")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"  {name}: new")
+            continue
+        # Medians, so one slow repeat (e.g. the first, with cold file caches) doesn't count
+        if result["metric"] == "iterations_per_second":
+            slowdown = baseline[name]["median"] / result["median"]
+        else:
+            slowdown = result["median"] / baseline[name]["median"]
+        flag = ""
+        if slowdown > 1 + tolerance:
+            flag = "  <-- REGRESSION"
+            regressions.append(name)
+        print(f"  {name}: {slowdown:.2f}{flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the model pipeline.")
+    parser.add_argument("--mode", choices=["stub", "mcell"], default="stub")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=1000, help="iterations per run")
+    parser.add_argument("--points", type=int, default=4, help="stub mode: points in the sweep dispatch benchmark")
+    parser.add_argument("--workers", type=int, default=2, help="stub mode: workers in the pool benchmark")
+    parser.add_argument("--bngl", nargs="+", default=PROJECT_BNGL_FILES, help="mcell mode: BNGL files to benchmark")
+    parser.add_argument("--output", default=None, help="result file, by default benchmarks/results/<timestamp>_<mode>.json")
+    parser.add_argument("--compare", default=None, help="earlier result file to compare with")
+    parser.add_argument("--smoke", action="store_true",
+                        help="stub mode once with small settings, only to check it runs (no result is saved)")
+    args = parser.parse_args(argv)
+
+    if args.smoke:
+        args.mode, args.repeats, args.iterations, args.points = "stub", 1, 100, 2
+    if args.mode == "stub":
+        use_stub_mcell()
+    sys.path.insert(1, REPO_DIR)
+
+    if args.mode == "stub":
+        missing = check_stub()
+        if missing:
+            print(f"The stub MCell ({STUB_DIR}) is missing what the repository uses: {', '.join(missing)}")
+            sys.exit(1)
+
+    work_folder = make_work_folder()
+    original_cwd = os.getcwd()
+    os.chdir(work_folder)
+    try:
+        if args.mode == "stub":
+            results = stub_benchmarks(args.repeats, args.points, args.workers, args.iterations)
+        else:
+            results = mcell_benchmarks(args.repeats, args.iterations, args.bngl)
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+    output = {
+        "mode": args.mode,
+        "date": datetime.now().strftime("%Y-%m-%d_%H-%M-%S"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.node(),
+        "cpu_count": os.cpu_count(),
+        "settings": {"repeats": args.repeats, "iterations": args.iterations, "points": args.points, "workers": args.workers},
+        "benchmarks": results,
+    }
+
+    if args.smoke:
+        print(f"\nSmoke run passed: {', '.join(results)}")
+        return
+
+    print("\nBenchmark medians:")
+    for name, result in results.items():
+        unit = "iter/sec" if result["metric"] == "iterations_per_second" else "s"
+        print(f"  {name}: {result['median']:.4g} {unit}")
+
+    output_file = args.output or os.path.join(RESULTS_DIR, f"{output['date']}_{args.mode}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    with open(output_file, 'w') as f:
+        json.dump(output, f, indent=4)
+    print(f"Results saved to {output_file}")
+
+    if args.compare is not None:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
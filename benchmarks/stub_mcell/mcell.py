@@ -0,0 +1,205 @@
+# Stand-in for the mcell module, used by the benchmarks on machines without MCell
+import os
+import re
+
+import numpy as np
+
+"""
+Only covers the parts of the MCell API this repository uses. load_bngl() reads the observable names
+from the .bngl file and the runs write a synthetic .gdat (a random walk for every observable),
+in the same format as MCell, and MOLECULES_PER_TYPE molecules of each molecule type move around randomly
+inside the geometry (the NMDAR on its surface), so everything around the simulation (run folders, parameter csv, caches,
+sweep dispatch, analysis scripts) behaves as with real runs.
+
+SECONDS_PER_ITERATION adds a fixed amount of work per iteration, 0 measures only the orchestration.
+"""
+
+SECONDS_PER_ITERATION = 0.0
+
+MOLECULES_PER_TYPE = 20
+
+# Molecule types that live on the surface
+SURFACE_TYPES = ["NMDAR"]
+
+class Config:
+    def __init__(self):
+        self.use_bng_units = False
+        self.time_step = 1e-6
+        self.seed = 1
+        self.partition_dimension = 10
+        self.subpartition_dimension = 0.5
+        self.total_iterations = 1000000
+
+class Count:
+    def __init__(self, name, initial_value):
+        self.name = name
+        self.every_n_timesteps = 1
+        self.value = initial_value
+
+    def get_current_value(self):
+        return self.value
+
+class Molecule:
+    def __init__(self, id, species_id, pos3d, wall_index=-1, geometry_object=None):
+        self.id = id
+        self.species_id = species_id
+        self.pos3d = pos3d
+        self.wall_index = wall_index
+        self.geometry_object = geometry_object
+
+class GeometryObject:
+    def __init__(self, name, vertex_list=None, wall_list=None):
+        self.name = name
+        self.vertex_list = vertex_list or []
+        self.wall_list = wall_list or []
+        self.is_bngl_compartment = False
+        self.surface_compartment_name = None
+
+class geometry_utils:
+    @staticmethod
+    def create_icosphere(name, radius, subdivisions=1):
+        # The 12 vertices and 20 walls of an icosahedron, not subdivided
+        t = (1 + 5 ** 0.5) / 2
+        vertices = np.array([[-1, t, 0], [1, t, 0], [-1, -t, 0], [1, -t, 0], [0, -1, t], [0, 1, t],
+                             [0, -1, -t], [0, 1, -t], [t, 0, -1], [t, 0, 1], [-t, 0, -1], [-t, 0, 1]], dtype=float)
+        vertices *= radius / np.linalg.norm(vertices[0])
+        walls = [[0, 11, 5], [0, 5, 1], [0, 1, 7], [0, 7, 10], [0, 10, 11], [1, 5, 9], [5, 11, 4], [11, 10, 2],
+                 [10, 7, 6], [7, 1, 8], [3, 9, 4], [3, 4, 2], [3, 2, 6], [3, 6, 8], [3, 8, 9], [4, 9, 5],
+                 [2, 4, 11], [6, 2, 10], [8, 6, 7], [9, 8, 1]]
+        return GeometryObject(name, vertices.tolist(), walls)
+
+class bngl_utils:
+    @staticmethod
+    def load_bngl_parameters(file_name, parameter_overrides={}):
+        # The parameters evaluated in plain python (bngl_parameters.py in the repository folder)
+        from bngl_parameters import load_bngl_parameters
+        return load_bngl_parameters(file_name, parameter_overrides)
+
+class VizOutput:
+    def __init__(self, output_files_prefix, every_n_timesteps=1, **kwargs):
+        self.output_files_prefix = output_files_prefix
+        self.every_n_timesteps = every_n_timesteps
+
+def read_molecule_types(bngl_file):
+    with open(bngl_file, 'r') as f:
+        text = f.read()
+    block = re.search(r"begin molecule types(.*?)end molecule types", text, re.S)
+    if block is None:
+        return []
+    return [line.split("#")[0].strip() for line in block.group(1).splitlines() if line.split("#")[0].strip()]
+
+def read_observable_names(bngl_file):
+    with open(bngl_file, 'r') as f:
+        text = f.read()
+    block = re.search(r"begin observables(.*?)end observables", text, re.S)
+    if block is None:
+        return []
+    names = []
+    for line in block.group(1).splitlines():
+        words = line.split("#")[0].split()
+        if len(words) >= 3 and words[0] in ("Molecules", "Species"):
+            names.append(words[1])
+    return names
+
+class Model:
+    def __init__(self):
+        self.config = Config()
+        self.counts = []
+        self.geometry_objects = []
+        self.viz_outputs = []
+        self.iteration = 0
+        self.gdat_file = None
+        self.rows = []
+        self.species_names = []
+
+    def add_geometry_object(self, geometry_object):
+        self.geometry_objects.append(geometry_object)
+
+    def add_viz_output(self, viz_output):
+        self.viz_outputs.append(viz_output)
+
+    def load_bngl(self, file_name, observables_path_or_file=None, parameter_overrides=None):
+        self.gdat_file = observables_path_or_file
+        self.counts = [Count(name, 100.0) for name in read_observable_names(file_name)]
+        self.species_names = read_molecule_types(file_name)
+
+    def initialize(self):
+        self.rng = np.random.default_rng(self.config.seed)
+        self.iteration = 0
+        self.rows = []
+        self._record()
+
+        # Molecules at random places inside the first geometry object (a sphere), or on its surface
+        radius = 1.0
+        if self.geometry_objects and self.geometry_objects[0].vertex_list:
+            radius = float(np.linalg.norm(np.array(self.geometry_objects[0].vertex_list), axis=1).mean())
+        self.radius = radius
+        n = MOLECULES_PER_TYPE * len(self.species_names)
+        self.molecule_species = np.repeat(np.arange(len(self.species_names)), MOLECULES_PER_TYPE)
+        directions = self.rng.normal(size=(n, 3))
+        directions /= np.linalg.norm(directions, axis=1)[:, None]
+        self.on_surface = np.array([self.species_names[i].split("(")[0] in SURFACE_TYPES for i in self.molecule_species], dtype=bool)
+        distances = np.where(self.on_surface, radius, radius * self.rng.uniform(size=n) ** (1 / 3))
+        self.positions = directions * distances[:, None]
+
+    def _record(self):
+        self.rows.append([self.iteration * self.config.time_step] + [count.value for count in self.counts])
+
+    def _periodic_counts(self):
+        # Counts with every_n_timesteps = 0 are only computed when read, and not written to the .gdat
+        return [count for count in self.counts if count.every_n_timesteps > 0]
+
+    def _step(self, iterations=1):
+        for count in self.counts:
+            count.value = max(0.0, count.value + self.rng.normal(scale=iterations ** 0.5))
+
+    def _move(self, iterations):
+        if not len(getattr(self, "positions", [])):
+            return
+        self.positions += self.rng.normal(scale=1e-3 * iterations ** 0.5, size=self.positions.shape)
+        distances = np.linalg.norm(self.positions, axis=1)
+        distances = np.where(self.on_surface, self.radius, np.minimum(distances, self.radius))
+        self.positions *= (distances / np.maximum(np.linalg.norm(self.positions, axis=1), 1e-12))[:, None]
+
+    def get_molecule_ids(self, pattern=None):
+        return list(range(len(self.molecule_species)))
+
+    def get_molecule(self, id):
+        wall_index = 0 if self.on_surface[id] else -1
+        geometry_object = self.geometry_objects[0] if self.on_surface[id] and self.geometry_objects else None
+        return Molecule(id, int(self.molecule_species[id]), self.positions[id].tolist(), wall_index, geometry_object)
+
+    def get_species_name(self, species_id):
+        return self.species_names[species_id]
+
+    def run_iterations(self, iterations):
+        self._move(int(iterations))
+        periodic_counts = self._periodic_counts()
+        if not periodic_counts:
+            self.iteration += int(iterations)
+            self._step(int(iterations))
+        else:
+            period = int(min(count.every_n_timesteps for count in periodic_counts))
+            for _ in range(int(iterations)):
+                self.iteration += 1
+                if self.iteration % period == 0:
+                    self._step(period)
+                    self._record()
+        if SECONDS_PER_ITERATION:
+            # Busy work instead of sleep, so it shows up as cpu time like a real run
+            end = os.times().elapsed + SECONDS_PER_ITERATION * iterations
+            while os.times().elapsed < end:
+                pass
+
+    def save_checkpoint(self, custom_dir=None):
+        os.makedirs(custom_dir, exist_ok=True)
+        with open(os.path.join(custom_dir, "model.py"), 'w') as f:
+            f.write(f"# stub checkpoint at iteration {self.iteration}\n")
+
+    def end_simulation(self):
+        if self.gdat_file is None or not self._periodic_counts():
+            return
+        with open(self.gdat_file, 'w') as f:
+            f.write("# time " + " ".join(count.name for count in self.counts) + "\n")
+            for row in self.rows:
+                f.write(" ".join(f"{value:.15g}" for value in row) + "\n")
@@ -0,0 +1,88 @@
+# This is the script where I cache the parameters read from a .bngl file, so the same file isn't parsed again and again
+import os
+import json
+import hashlib
+
+from bngl_parameters import load_bngl_parameters, EVALUATOR_VERSION
+
+"""
+Parameters of a .bngl file with overrides, without parsing the same text again and again:
+- with the plain python evaluator (bngl_parameters.py) the parsed parameters block is kept once per file content hash,
+  and every set of overrides is applied to it in memory (only the downstream parameters are evaluated again),
+- with another loader (MCell's m.bngl_utils.load_bngl_parameters, which process_parameters() uses until
+  bngl_parameters.compare_with_mcell() passes) there is nothing parsed to keep, so the dictionary is cached in memory
+  by file content hash, overrides and loader. That only saves the parse for the same point again (replicates),
+  each new point of a sweep is still parsed once here and once by MCell's own model.load_bngl().
+  Parsing a sweep's model text only once waits for process_parameters() to switch to the python evaluator.
+
+The key uses the content of the file, so the copy of the BNGL file in a run folder hits the same entry as the original,
+and editing the BNGL file gives a new key. Nothing is written to disk unless a cache_folder is given
+(one small json file per entry, so pool workers and later sweeps can share them).
+"""
+
+# Folder for json cache files, None keeps the cache in memory only
+CACHE_FOLDER = None
+
+# In-memory cache: key -> parameter dictionary
+_parameter_cache = {}
+
+# Content hash of each file path, with the modification time it was computed at
+_content_hashes = {}
+
+def bngl_content_hash(bngl_path):
+    mtime = os.path.getmtime(bngl_path)
+    cached = _content_hashes.get(bngl_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(bngl_path, 'rb') as f:
+        content_hash = hashlib.sha1(f.read()).hexdigest()
+    _content_hashes[bngl_path] = (mtime, content_hash)
+    return content_hash
+
+def loader_name(loader=None):
+    # e.g. 'mcell.bngl_utils.load_bngl_parameters' or 'bngl_parameters.load_bngl_parameters-v2'
+    if loader is None or loader is load_bngl_parameters:
+        return f"bngl_parameters.load_bngl_parameters-v{EVALUATOR_VERSION}"
+    module = getattr(loader, '__module__', None) or ""
+    return f"{module}.{getattr(loader, '__qualname__', getattr(loader, '__name__', repr(loader)))}"
+
+def cache_key(bngl_path, parameter_overrides=None, loader=None):
+    overrides = json.dumps(parameter_overrides or {}, sort_keys=True, default=float)
+    return hashlib.sha1(f"{bngl_content_hash(bngl_path)}|{overrides}|{loader_name(loader)}".encode()).hexdigest()
+
+def load_parameters_cached(bngl_path, parameter_overrides=None, loader=None, cache_folder=CACHE_FOLDER):
+    """
+    Returns the dictionary of parameters of a .bngl file, with the overrides applied.
+
+    Arguments:
+    - bngl_path (str): path to the .bngl file.
+    - parameter_overrides (dict): parameters to override.
+    - loader (function): called as loader(bngl_path, parameter_overrides) when the parameters are not cached,
+      defaults to the plain python evaluator in bngl_parameters.py (no MCell needed).
+    - cache_folder (str): folder for json cache files, None (the default) only caches in memory.
+    """
+    if (loader is None or loader is load_bngl_parameters) and cache_folder is None:
+        # Already parsed once per file content, the overrides are applied in memory
+        return load_bngl_parameters(bngl_path, parameter_overrides)
+
+    key = cache_key(bngl_path, parameter_overrides, loader)
+    if key in _parameter_cache:
+        return dict(_parameter_cache[key])
+
+    cache_file = os.path.join(cache_folder, f"{key}.json") if cache_folder else None
+    if cache_file is not None and os.path.exists(cache_file):
+        with open(cache_file, 'r') as f:
+            param_dict = json.load(f)
+    else:
+        param_dict = dict((loader or load_bngl_parameters)(bngl_path, parameter_overrides))
+
+        if cache_file is not None:
+            os.makedirs(cache_folder, exist_ok=True)
+            # Write to a temporary file first, other processes may be reading the same entry
+            tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump(param_dict, f, default=float)
+            os.replace(tmp_file, cache_file)
+
+    _parameter_cache[key] = param_dict
+    return dict(param_dict)
@@ -0,0 +1,252 @@
+# This is the script where I read and evaluate the parameters block of a .bngl file in plain python (no MCell needed)
+import re
+import sys
+import ast
+import math
+import hashlib
+
+"""
+Parameters like `kon_1_CaCaM 2.57e8/NA_um3` or `MCELL_DIFFUSION_CONSTANT_3D_Ca D_VOL` depend on other parameters.
+This script builds the graph of which parameter depends on which, evaluates them in order,
+and when parameters are overridden only re-evaluates the parameters downstream of them.
+
+    params = load_bngl_parameters("dodecamer_NMDAR.bngl", {'kon_CaMKII_NMDAR': 2e4})
+    params['kon_CaMKII_NMDAR'], params['ITERATIONS']
+
+Like MCell, a parameter `MCELL_REDEFINE_<name>` replaces the value of <name> once the file is evaluated, and the
+parameters that use <name> are evaluated again with it (e.g. `MCELL_REDEFINE_NA_um3 VOL_RXN` makes NA_um3 = 1,
+so kon_1_CaCaM is 2.57e8 in MCell). The dictionary is in the order of the file, as MCell's.
+
+It is meant to give the same dictionary as MCell's m.bngl_utils.load_bngl_parameters(), for sweep planning and analysis
+on machines without MCell. compare_with_mcell() checks that on a machine with MCell:
+
+    python bngl_parameters.py --check-mcell dodecamer.bngl dodecamer_NMDAR.bngl dodecamer_NMDAR-paper.bngl dodecamer_NMDAR_Ca_pulse.bngl
+
+Until that check passes, mcell_params.process_parameters() keeps using MCell's own loader for the runs.
+"""
+
+# Changed when the evaluator gives different values than before, so bngl_cache.py doesn't reuse older entries
+EVALUATOR_VERSION = 2
+
+# Prefix of the parameters that redefine another parameter in MCell
+REDEFINE_PREFIX = "MCELL_REDEFINE_"
+
+# Functions and constants allowed in BNGL parameter expressions
+BNGL_FUNCTIONS = {
+    'exp': math.exp, 'ln': math.log, 'log10': math.log10, 'log2': math.log2, 'sqrt': math.sqrt,
+    'abs': abs, 'min': min, 'max': max, 'floor': math.floor, 'ceil': math.ceil, 'rint': round,
+    'sin': math.sin, 'cos': math.cos, 'tan': math.tan, 'asin': math.asin, 'acos': math.acos, 'atan': math.atan,
+    'sinh': math.sinh, 'cosh': math.cosh, 'tanh': math.tanh,
+}
+BNGL_CONSTANTS = {'_pi': math.pi, '_e': math.e}
+
+_BINARY_OPERATORS = {
+    ast.Add: lambda a, b: a + b, ast.Sub: lambda a, b: a - b,
+    ast.Mult: lambda a, b: a * b, ast.Div: lambda a, b: a / b, ast.Pow: lambda a, b: a ** b,
+}
+_UNARY_OPERATORS = {ast.UAdd: lambda a: +a, ast.USub: lambda a: -a}
+
+def read_parameters_block(bngl_text):
+    """
+    Returns the parameters of the `begin parameters` block as an ordered dictionary of name -> expression (string).
+    """
+    expressions = {}
+    in_block = False
+    for line in bngl_text.splitlines():
+        line = line.split('#', 1)[0].strip()  # remove comments
+        if not line:
+            continue
+        if re.match(r"begin\s+parameters\b", line):
+            in_block = True
+            continue
+        if re.match(r"end\s+parameters\b", line):
+            break
+        if not in_block:
+            continue
+
+        # Lines are "name expression", "name = expression" or (in .net files) "index name expression"
+        tokens = line.split(None, 1)
+        if re.fullmatch(r"\d+", tokens[0]) and len(tokens) > 1:
+            tokens = tokens[1].split(None, 1)
+        if len(tokens) < 2:
+            raise ValueError(f"Parameter line without a value: '{line}'")
+        name, expression = tokens[0], tokens[1].strip()
+        if expression.startswith('='):
+            expression = expression[1:].strip()
+        expressions[name] = expression
+
+    return expressions
+
+def parse_expression(expression):
+    # BNGL uses ^ for powers
+    return ast.parse(expression.replace('^', '**'), mode='eval').body
+
+def expression_names(tree):
+    # Names of the parameters an expression uses (function names and constants excluded)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id not in BNGL_FUNCTIONS and node.id not in BNGL_CONSTANTS:
+            names.add(node.id)
+    return names
+
+def evaluate_expression(tree, values):
+    if isinstance(tree, ast.Constant) and isinstance(tree.value, (int, float)):
+        return float(tree.value)
+    if isinstance(tree, ast.Name):
+        if tree.id in values:
+            return values[tree.id]
+        if tree.id in BNGL_CONSTANTS:
+            return BNGL_CONSTANTS[tree.id]
+        raise ValueError(f"Unknown parameter '{tree.id}'")
+    if isinstance(tree, ast.BinOp) and type(tree.op) in _BINARY_OPERATORS:
+        return _BINARY_OPERATORS[type(tree.op)](evaluate_expression(tree.left, values), evaluate_expression(tree.right, values))
+    if isinstance(tree, ast.UnaryOp) and type(tree.op) in _UNARY_OPERATORS:
+        return _UNARY_OPERATORS[type(tree.op)](evaluate_expression(tree.operand, values))
+    if isinstance(tree, ast.Call) and isinstance(tree.func, ast.Name) and tree.func.id in BNGL_FUNCTIONS:
+        return float(BNGL_FUNCTIONS[tree.func.id](*[evaluate_expression(arg, values) for arg in tree.args]))
+    raise ValueError(f"Unsupported expression: '{ast.unparse(tree)}'")
+
+class ParameterGraph:
+    """
+    The parameters of a BNGL file with the graph of which parameter depends on which.
+
+    evaluate() gives the values of all parameters with the BNGL expressions,
+    and evaluate(overrides) re-evaluates only the parameters downstream of the overridden ones.
+    """
+    def __init__(self, expressions):
+        self.expressions = dict(expressions)
+        self.trees = {name: parse_expression(expression) for name, expression in self.expressions.items()}
+        self.depends_on = {name: expression_names(tree) for name, tree in self.trees.items()}
+
+        for name, names in self.depends_on.items():
+            unknown = names - set(self.expressions)
+            if unknown:
+                raise ValueError(f"Parameter '{name}' uses undefined parameter(s) {sorted(unknown)}")
+
+        # Parameters that use each parameter
+        self.used_by = {name: set() for name in self.expressions}
+        for name, names in self.depends_on.items():
+            for dependency in names:
+                self.used_by[dependency].add(name)
+
+        # Parameter -> the MCELL_REDEFINE_ parameter that replaces its value
+        self.redefined_by = {name[len(REDEFINE_PREFIX):]: name for name in self.expressions
+                             if name.startswith(REDEFINE_PREFIX) and name[len(REDEFINE_PREFIX):] in self.expressions}
+
+        self.order = self._topological_order()
+        # Values of the file as written, before the MCELL_REDEFINE_ parameters are applied
+        self.base_values = self._evaluate(self.order, {})
+
+    def _topological_order(self):
+        order = []
+        state = {}  # name -> 'visiting' or 'done'
+
+        def visit(name, path):
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError(f"Circular parameter definition: {' -> '.join(path + [name])}")
+            state[name] = 'visiting'
+            for dependency in sorted(self.depends_on[name]):
+                visit(dependency, path + [name])
+            state[name] = 'done'
+            order.append(name)
+
+        for name in self.expressions:
+            visit(name, [])
+        return order
+
+    def _evaluate(self, names, values):
+        for name in names:
+            values[name] = evaluate_expression(self.trees[name], values)
+        return values
+
+    def downstream(self, names):
+        # All the parameters that depend (directly or not) on any of names
+        found = set()
+        stack = list(names)
+        while stack:
+            for user in self.used_by.get(stack.pop(), ()):
+                if user not in found:
+                    found.add(user)
+                    stack.append(user)
+        return found
+
+    def evaluate(self, parameter_overrides=None):
+        """
+        Returns a dictionary of all parameter values, with overrides applied.
+
+        Like MCell, overrides of names that are not parameters of the file are ignored (with a warning),
+        and the MCELL_REDEFINE_ parameters are applied last, so they win over an override of the parameter they redefine.
+        """
+        overrides = {}
+        for name, value in (parameter_overrides or {}).items():
+            if name in self.expressions:
+                overrides[name] = float(value)
+            else:
+                print(f"Warning: override '{name}' is not a parameter of the BNGL file, it is ignored.")
+            if name in self.redefined_by:
+                print(f"Warning: override '{name}' is replaced by {self.redefined_by[name]}, as in MCell.")
+
+        values = dict(self.base_values)
+        values.update(overrides)
+        changed = self.downstream(overrides) - set(overrides)
+        self._evaluate([name for name in self.order if name in changed], values)
+
+        # Then the redefinitions, and the parameters that use the redefined ones
+        # (the overridden and MCELL_REDEFINE_ parameters keep their value)
+        redefined = {name: values[redefine] for name, redefine in self.redefined_by.items()}
+        values.update(redefined)
+        changed = self.downstream(redefined) - set(redefined) - set(overrides) - set(self.redefined_by.values())
+        self._evaluate([name for name in self.order if name in changed], values)
+
+        return {name: values[name] for name in self.expressions}
+
+# Parsed graphs, by hash of the file content
+_graphs = {}
+
+def get_parameter_graph(bngl_path):
+    with open(bngl_path, 'r') as f:
+        text = f.read()
+    content_hash = hashlib.sha1(text.encode()).hexdigest()
+    if content_hash not in _graphs:
+        _graphs[content_hash] = ParameterGraph(read_parameters_block(text))
+    return _graphs[content_hash]
+
+def load_bngl_parameters(bngl_path, parameter_overrides=None):
+    """
+    Same as MCell's m.bngl_utils.load_bngl_parameters(): returns a dictionary of parameter name -> value.
+    The file is only parsed once per process, later calls only re-evaluate what the overrides change.
+    """
+    return get_parameter_graph(bngl_path).evaluate(parameter_overrides)
+
+def compare_with_mcell(bngl_file, parameter_overrides=None, rtol=1e-12):
+    """
+    Compares load_bngl_parameters() with MCell's m.bngl_utils.load_bngl_parameters() on a file (needs MCell).
+    Returns a list of differences (empty if both give the same parameters and values).
+    """
+    import mcell_params  # imports MCell from MCELL_PATH
+    expected = mcell_params.m.bngl_utils.load_bngl_parameters(bngl_file, parameter_overrides or {})
+    found = load_bngl_parameters(bngl_file, parameter_overrides)
+
+    differences = [f"'{name}' only in MCell's parameters" for name in expected if name not in found]
+    differences += [f"'{name}' not in MCell's parameters" for name in found if name not in expected]
+    for name in expected:
+        if name in found and not math.isclose(found[name], expected[name], rel_tol=rtol):
+            differences.append(f"'{name}': {found[name]:g} here, {expected[name]:g} in MCell")
+    return differences
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--check-mcell":
+        all_same = True
+        for bngl_file in sys.argv[2:]:
+            differences = compare_with_mcell(bngl_file)
+            all_same = all_same and not differences
+            print(f"{bngl_file}: {'same as MCell' if not differences else f'{len(differences)} difference(s)'}")
+            for difference in differences:
+                print(f"  {difference}")
+        sys.exit(0 if all_same else 1)
+
+    bngl_file = input("Enter the .bngl file: ").strip()
+    for name, value in load_bngl_parameters(bngl_file).items():
+        print(f"{name} = {value:g}")
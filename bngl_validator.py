@@ -0,0 +1,458 @@
+# This is the script where I check a .bngl file before a sweep, so a broken model fails straight away instead of on a worker
+import re
+import sys
+import hashlib
+import argparse
+
+from bngl_parameters import read_parameters_block, parse_expression, expression_names, ParameterGraph
+
+"""
+Problems in the .bngl file (an undefined compartment, a typo in a molecule or state name, a rate constant that
+isn't a parameter, an override of a parameter that doesn't exist) only show up once MCell has been started on a worker,
+and with a sweep they fail every run. This parses the file in plain python (no MCell needed) and checks:
+- blocks: every `begin X` has its `end X`, no block is opened twice, no line is left that can't be parsed,
+- parameters: every expression evaluates (no undefined or circular parameters),
+- compartments: dimensions are 2 or 3, volumes evaluate, parents are defined and of the other dimension,
+- molecule types, species, reaction rules and observables: every molecule, component and state is declared
+  in the molecule types, every compartment used is defined, bonds are closed, rate constants and species counts
+  are parameters, and there are as many rates as the rule needs,
+- observables: no name is used twice,
+- overrides: every overridden name is a parameter of the file (MCell would just ignore it).
+
+@IN and @OUT in reaction rules are an MCell extension (the orientation of a volume molecule against a surface),
+BioNetGen itself stops with "Undefined compartment IN". They are accepted with a warning for a rule that has a surface
+reactant, and are errors with strict_bionetgen=True.
+
+    errors, warnings = validate_bngl("dodecamer_NMDAR.bngl", [{'kon_CaMKII_NMDAR': 2e4}])
+    preflight("dodecamer_NMDAR.bngl", overrides_list)   # raises ValueError listing every error
+
+or from the command line: python bngl_validator.py dodecamer_NMDAR.bngl --design sweep_design.csv
+"""
+
+# Blocks a .bngl file can have, `begin model`/`end model` only wraps the others
+KNOWN_BLOCKS = ["parameters", "compartments", "molecule types", "seed species", "species", "reaction rules",
+                "observables", "functions", "model"]
+
+# Compartment names MCell uses for the orientation against a surface in reaction rules
+ORIENTATION_COMPARTMENTS = {"IN", "OUT"}
+
+# Modifiers that can follow the rates of a reaction rule
+RULE_MODIFIERS = {"DeleteMolecules", "MoveConnected", "TotalRate"}
+
+def _strip_line(line):
+    return line.split('#', 1)[0].strip()
+
+def _remove_inner_spaces(text):
+    # Spaces inside parentheses are allowed by MCell, e.g. CaMKII(cam!1, open~1)
+    out, depth = [], 0
+    for char in text:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        if depth > 0 and char.isspace():
+            continue
+        out.append(char)
+    return "".join(out)
+
+def _split_top_level(text, separators):
+    # Splits on any of the separator characters outside parentheses
+    parts, current, depth = [], [], 0
+    for char in text:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        if depth == 0 and char in separators:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    parts.append("".join(current))
+    return [part for part in parts if part]
+
+def read_blocks(bngl_text):
+    """
+    Returns the lines of each block as a dictionary of block name -> list of (line number, line),
+    with comments removed and continued lines (ending in \\) joined, and a list of errors about the block structure.
+    """
+    blocks, errors = {}, []
+    current, begin_line = None, None
+    pending, pending_number = "", None
+    for number, raw_line in enumerate(bngl_text.splitlines(), start=1):
+        line = _strip_line(raw_line)
+        if line.endswith("\\"):
+            pending, pending_number = pending + line[:-1] + " ", pending_number or number
+            continue
+        line, number = (pending + line).strip(), pending_number or number
+        pending, pending_number = "", None
+        if not line:
+            continue
+
+        begin = re.fullmatch(r"begin\s+(.+)", line)
+        end = re.fullmatch(r"end\s+(.+)", line)
+        if begin:
+            name = " ".join(begin.group(1).split())
+            if name == "model":
+                continue
+            if name not in KNOWN_BLOCKS:
+                errors.append(f"line {number}: unknown block 'begin {name}'")
+            if current is not None:
+                errors.append(f"line {number}: 'begin {name}' inside block '{current}' (opened on line {begin_line}), "
+                              f"'end {current}' is missing")
+            if name in blocks:
+                errors.append(f"line {number}: block '{name}' is opened a second time")
+            current, begin_line = name, number
+            blocks.setdefault(name, [])
+        elif end:
+            name = " ".join(end.group(1).split())
+            if name == "model":
+                continue
+            if name != current:
+                errors.append(f"line {number}: 'end {name}' without a matching 'begin {name}'")
+            current = None
+        elif current is not None:
+            blocks[current].append((number, line))
+    if current is not None:
+        errors.append(f"line {begin_line}: block '{current}' is never closed")
+    return blocks, errors
+
+def parse_pattern(pattern):
+    """
+    Splits a BNGL pattern like '@CP:CaM(ca~4,camkii!1).CaMKII(cam!1)' into its species compartment ('CP')
+    and a list of molecules (name, [(component, state, bond)], compartment). Raises ValueError if it can't be parsed.
+    """
+    pattern = _remove_inner_spaces(pattern)
+    species_compartment = None
+    prefix = re.match(r"@(\w+):", pattern)
+    if prefix:
+        species_compartment, pattern = prefix.group(1), pattern[prefix.end():]
+
+    molecules = []
+    for molecule in _split_top_level(pattern, "."):
+        match = re.fullmatch(r"([A-Za-z_]\w*)(?:\((.*)\))?(?:@(\w+))?", molecule)
+        if match is None:
+            raise ValueError(f"can't parse molecule '{molecule}'")
+        name, components_text, compartment = match.groups()
+        components = []
+        for component in (components_text or "").split(","):
+            if not component:
+                continue
+            component_match = re.fullmatch(r"([A-Za-z_]\w*)((?:[~!][\w+?]+)*)", component)
+            if component_match is None:
+                raise ValueError(f"can't parse component '{component}' of molecule '{name}'")
+            marks = re.findall(r"([~!])([\w+?]+)", component_match.group(2))
+            states = [value for mark, value in marks if mark == '~']
+            bonds = [value for mark, value in marks if mark == '!']
+            if len(states) > 1 or len(bonds) > 1:
+                raise ValueError(f"component '{component}' of molecule '{name}' has more than one state or bond")
+            components.append((component_match.group(1), states[0] if states else None, bonds[0] if bonds else None))
+        molecules.append((name, components, compartment))
+    if not molecules:
+        raise ValueError("empty pattern")
+    return species_compartment, molecules
+
+class BNGLModel:
+    """
+    The blocks of a .bngl file, parsed just enough to check them against each other.
+    """
+    def __init__(self, bngl_text):
+        self.blocks, self.errors = read_blocks(bngl_text)
+        self.warnings = []
+        self.parameters = {}
+        self.compartments = {}     # name -> (dimension, parent)
+        self.molecule_types = {}   # name -> {component: [set of states, one per copy of the component]}
+        self.surface_types = set() # molecule types put in a 2D compartment in the species block
+        self.functions = set()
+        self.observables = []
+
+        self._read_parameters(bngl_text)
+        self._read_functions()
+        self._read_compartments()
+        self._read_molecule_types()
+        self._read_species()
+        self._read_reaction_rules()
+        self._read_observables()
+
+    def _error(self, number, message):
+        message = f"line {number}: {message}"
+        if message not in self.errors:
+            self.errors.append(message)
+
+    def _read_parameters(self, bngl_text):
+        if "parameters" not in self.blocks:
+            return
+        try:
+            self.parameters = ParameterGraph(read_parameters_block(bngl_text)).base_values
+        except (ValueError, SyntaxError) as e:
+            self.errors.append(f"parameters: {e}")
+            self.parameters = dict.fromkeys(read_parameters_block(bngl_text))
+
+    def _read_functions(self):
+        for number, line in self.blocks.get("functions", []):
+            match = re.match(r"([A-Za-z_]\w*)\s*\(\s*\)", line)
+            if match is None:
+                self._error(number, f"can't parse function '{line}'")
+            else:
+                self.functions.add(match.group(1))
+
+    def _check_expression(self, number, expression, what):
+        try:
+            names = expression_names(parse_expression(expression))
+        except SyntaxError:
+            self._error(number, f"{what} '{expression}' is not a valid expression")
+            return
+        unknown = names - set(self.parameters) - self.functions
+        if unknown:
+            self._error(number, f"{what} '{expression}' uses undefined parameter(s) {sorted(unknown)}")
+
+    def _read_compartments(self):
+        for number, line in self.blocks.get("compartments", []):
+            words = line.split()
+            if len(words) < 3 or words[1] not in ("2", "3"):
+                self._error(number, f"compartment line '{line}' should be 'name dimension volume [parent]' with dimension 2 or 3")
+                continue
+            if words[0] in self.compartments:
+                self._error(number, f"compartment '{words[0]}' is defined twice")
+            self._check_expression(number, words[2], f"volume of compartment '{words[0]}'")
+            self.compartments[words[0]] = (int(words[1]), words[3] if len(words) > 3 else None)
+
+        for name, (dimension, parent) in self.compartments.items():
+            if parent is None:
+                continue
+            if parent not in self.compartments:
+                self.errors.append(f"compartments: parent '{parent}' of compartment '{name}' is not defined")
+            elif self.compartments[parent][0] == dimension:
+                self.errors.append(f"compartments: compartment '{name}' and its parent '{parent}' are both {dimension}D")
+
+    def _read_molecule_types(self):
+        for number, line in self.blocks.get("molecule types", []):
+            match = re.fullmatch(r"([A-Za-z_]\w*)(?:\((.*)\))?", _remove_inner_spaces(line))
+            if match is None:
+                self._error(number, f"can't parse molecule type '{line}'")
+                continue
+            name, components_text = match.groups()
+            if name in self.molecule_types:
+                self._error(number, f"molecule type '{name}' is declared twice")
+            # Components list their possible states, e.g. ca~0~1~2~3~4, and can appear more than once
+            declared = {}
+            for component in (components_text or "").split(","):
+                if not component:
+                    continue
+                if re.fullmatch(r"[A-Za-z_]\w*(~\w+)*", component) is None:
+                    self._error(number, f"can't parse component '{component}' of molecule type '{name}'")
+                    continue
+                component_name, *states = component.split("~")
+                declared.setdefault(component_name, []).append(set(states))
+            self.molecule_types[name] = declared
+
+    def _check_pattern(self, number, pattern, where, allow_orientation=False):
+        """
+        Checks one pattern against the molecule types and compartments, returns its molecules (or None if it didn't parse).
+        """
+        if pattern == "0" or pattern == "Trash()":
+            return []
+        try:
+            species_compartment, molecules = parse_pattern(pattern)
+        except ValueError as e:
+            self._error(number, f"{where}: {e} in '{pattern}'")
+            return None
+
+        compartments = [species_compartment] + [compartment for _, _, compartment in molecules]
+        for compartment in compartments:
+            if compartment is None or compartment in self.compartments:
+                continue
+            if compartment in ORIENTATION_COMPARTMENTS and allow_orientation:
+                continue
+            self._error(number, f"{where}: undefined compartment '{compartment}' in '{pattern}'")
+
+        bonds = {}
+        for name, components, _ in molecules:
+            if name not in self.molecule_types:
+                self._error(number, f"{where}: molecule '{name}' is not a declared molecule type")
+                continue
+            declared = self.molecule_types[name]
+            used = {}
+            for component, state, bond in components:
+                if component not in declared:
+                    self._error(number, f"{where}: molecule '{name}' has no component '{component}'")
+                    continue
+                used[component] = used.get(component, 0) + 1
+                if used[component] > len(declared[component]):
+                    self._error(number, f"{where}: component '{component}' of '{name}' is used more times than declared")
+                    continue
+                allowed = declared[component][used[component] - 1]
+                if state is not None and state != '?' and state not in allowed:
+                    self._error(number, f"{where}: '{state}' is not a state of component '{component}' of '{name}'"
+                                        + (f" (states: {sorted(allowed)})" if allowed else " (it has no states)"))
+                if bond is not None and bond not in ('+', '?'):
+                    bonds[bond] = bonds.get(bond, 0) + 1
+        for bond, count in bonds.items():
+            if count != 2:
+                self._error(number, f"{where}: bond !{bond} appears {count} time(s) in '{pattern}', it should appear twice")
+        return molecules
+
+    def _read_species(self):
+        block = self.blocks.get("seed species", []) + self.blocks.get("species", [])
+        for number, line in block:
+            words = _split_top_level(_remove_inner_spaces(line), " \t")
+            if len(words) < 2:
+                self._error(number, f"species line '{line}' should be 'pattern count'")
+                continue
+            pattern, count = words[0].lstrip("$"), " ".join(words[1:])
+            molecules = self._check_pattern(number, pattern, "species")
+            self._check_expression(number, count, "species count")
+            if not molecules:
+                continue
+            species_compartment, _ = parse_pattern(pattern)
+            for name, _, compartment in molecules:
+                compartment = compartment or species_compartment
+                if compartment in self.compartments and self.compartments[compartment][0] == 2:
+                    self.surface_types.add(name)
+
+    def _read_reaction_rules(self):
+        for number, line in self.blocks.get("reaction rules", []):
+            rule_text = line
+            line = _remove_inner_spaces(line)
+            label = re.match(r"([A-Za-z_]\w*)\s*:\s*", line)
+            if label and not line[label.end():].startswith(":"):
+                line = line[label.end():]
+            arrow = re.search(r"<->|->", line)
+            if arrow is None:
+                self._error(number, f"can't parse reaction rule '{rule_text}' (no -> or <->)")
+                continue
+            reversible = arrow.group() == "<->"
+            reactants_text, products_text = line[:arrow.start()], line[arrow.end():]
+
+            reactants = [part.strip() for part in _split_top_level(reactants_text, "+") if part.strip()]
+            # The products are the first word and every word after a +, the rest are the rates
+            words = _split_top_level(re.sub(r"\s*\+\s*", " + ", products_text.strip()), " \t")
+            products, rates_words = [], []
+            expect_pattern = True
+            for index, word in enumerate(words):
+                if word == "+":
+                    expect_pattern = True
+                elif expect_pattern and not rates_words:
+                    products.append(word)
+                    expect_pattern = False
+                else:
+                    rates_words = words[index:]
+                    break
+            rates_words = [word for word in rates_words if word not in RULE_MODIFIERS]
+            rates = [rate.strip() for rate in " ".join(rates_words).split(",") if rate.strip()]
+
+            if not reactants or not products:
+                self._error(number, f"reaction rule '{rule_text}' needs reactants and products (use 0 for none)")
+                continue
+
+            has_surface_reactant = False
+            orientation = False
+            for pattern in reactants + products:
+                molecules = self._check_pattern(number, pattern, "reaction rule", allow_orientation=True)
+                for name, _, compartment in molecules or []:
+                    if pattern in reactants and name in self.surface_types:
+                        has_surface_reactant = True
+                    if compartment in ORIENTATION_COMPARTMENTS:
+                        orientation = True
+            if orientation:
+                if not has_surface_reactant:
+                    self._error(number, "@IN/@OUT is only allowed in a rule with a surface reactant "
+                                        f"(molecule types on a 2D compartment: {sorted(self.surface_types)})")
+                else:
+                    self.warnings.append(f"line {number}: @IN/@OUT is MCell-only, BioNetGen stops on it with "
+                                         "'Undefined compartment' (fine for MCell runs)")
+
+            if len(rates) != (2 if reversible else 1):
+                self._error(number, f"reaction rule needs {2 if reversible else 1} rate(s), found {len(rates)}: {rates}")
+            for rate in rates:
+                self._check_expression(number, rate, "rate")
+
+    def _read_observables(self):
+        names = {}
+        for number, line in self.blocks.get("observables", []):
+            words = line.split(None, 2)
+            if len(words) < 3 or words[0] not in ("Molecules", "Species"):
+                self._error(number, f"observable line '{line}' should be 'Molecules|Species name pattern'")
+                continue
+            name = words[1]
+            if name in names:
+                self._error(number, f"observable '{name}' is already defined on line {names[name]}")
+            names[name] = number
+            for pattern in _split_top_level(_remove_inner_spaces(words[2]), ", \t"):
+                self._check_pattern(number, pattern, f"observable '{name}'")
+        self.observables = list(names)
+
+def validate_bngl(bngl_file, overrides_list=None, strict_bionetgen=False):
+    """
+    Checks a .bngl file (and the names of the parameter overrides of a sweep) without MCell.
+
+    Returns:
+    - errors (list of str): problems that would make MCell fail or the sweep wrong.
+    - warnings (list of str): things that work with MCell but are worth knowing.
+    """
+    with open(bngl_file, 'r') as f:
+        model = BNGLModel(f.read())
+    errors, warnings = list(model.errors), list(model.warnings)
+
+    if strict_bionetgen:
+        errors.extend(warnings)
+        warnings = []
+    for section in ("parameters", "compartments", "molecule types", "reaction rules", "observables"):
+        if section not in model.blocks:
+            errors.append(f"no '{section}' block")
+
+    unknown = set()
+    for parameter_overrides in overrides_list or []:
+        unknown.update(name for name in parameter_overrides if name not in model.parameters)
+    for name in sorted(unknown):
+        errors.append(f"override '{name}' is not a parameter of {bngl_file}")
+    return errors, warnings
+
+# Files already checked in this process, by hash of the content and the override names
+_checked = set()
+
+def preflight(bngl_file, overrides_list=None, strict_bionetgen=False):
+    """
+    Validates the model before a sweep starts, raises ValueError listing every error so nothing is queued or run.
+    Warnings are printed. A file that has already passed (with the same override names) is not checked again.
+    """
+    with open(bngl_file, 'rb') as f:
+        content_hash = hashlib.sha1(f.read()).hexdigest()
+    override_names = sorted({name for parameter_overrides in overrides_list or [] for name in parameter_overrides})
+    key = (content_hash, tuple(override_names), strict_bionetgen)
+    if key in _checked:
+        return
+
+    errors, warnings = validate_bngl(bngl_file, overrides_list, strict_bionetgen)
+    for warning in warnings:
+        print(f"Warning: {bngl_file} {warning}")
+    if errors:
+        raise ValueError(f"{bngl_file} failed the preflight check with {len(errors)} error(s):\n  " + "\n  ".join(errors))
+    _checked.add(key)
+    print(f"Preflight check of {bngl_file} passed.")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check a .bngl file before running it.")
+    parser.add_argument("bngl_files", nargs="+")
+    parser.add_argument("--design", default=None, help="design table .csv (see samplers.py), its parameter names are checked too")
+    parser.add_argument("--strict-bionetgen", action="store_true", help="treat MCell-only syntax (@IN/@OUT) as errors")
+    args = parser.parse_args(argv)
+
+    overrides_list = None
+    if args.design:
+        from samplers import design_to_overrides
+        overrides_list = design_to_overrides(args.design)
+
+    failed = False
+    for bngl_file in args.bngl_files:
+        errors, warnings = validate_bngl(bngl_file, overrides_list, args.strict_bionetgen)
+        print(f"{bngl_file}: {len(errors)} error(s), {len(warnings)} warning(s)")
+        for error in errors:
+            print(f"  error: {error}")
+        for warning in warnings:
+            print(f"  warning: {warning}")
+        failed = failed or bool(errors)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,59 @@
+# This is the script where I save and find MCell checkpoints inside a run folder
+import os
+import glob
+import json
+import shutil
+
+# Written into a checkpoint folder once MCell has finished saving it,
+# so a checkpoint cut short by a crash is never used to resume
+COMPLETE_MARKER = "checkpoint_complete"
+
+def run_info_file(run_folder, timestamp):
+    return os.path.join(run_folder, f"{timestamp}_run_info.json")
+
+def save_run_info(run_folder, timestamp, **info):
+    """
+    Saves what is needed to resume a run later (overrides, seed, bngl file, working directory, ...).
+    """
+    info = {"timestamp": timestamp, "cwd": os.getcwd(), **info}
+    with open(run_info_file(run_folder, timestamp), 'w') as f:
+        json.dump(info, f, indent=4, default=float)
+
+def load_run_info(run_folder):
+    info_files = glob.glob(os.path.join(run_folder, "*_run_info.json"))
+    if len(info_files) != 1:
+        raise FileNotFoundError(f"Expected one *_run_info.json in {run_folder}, found {len(info_files)}.")
+    with open(info_files[0], 'r') as f:
+        return json.load(f)
+
+def checkpoint_iteration(checkpoint_dir):
+    # Checkpoint folders are called it_<iteration>
+    return int(os.path.basename(checkpoint_dir).split('_')[-1])
+
+def list_checkpoints(run_folder):
+    """
+    Returns the complete checkpoint folders of a run, oldest first.
+    """
+    checkpoint_dirs = glob.glob(os.path.join(run_folder, "checkpoints", "it_*"))
+    checkpoint_dirs = [d for d in checkpoint_dirs if os.path.exists(os.path.join(d, COMPLETE_MARKER))]
+    return sorted(checkpoint_dirs, key=checkpoint_iteration)
+
+def latest_checkpoint(run_folder):
+    checkpoint_dirs = list_checkpoints(run_folder)
+    return checkpoint_dirs[-1] if checkpoint_dirs else None
+
+def save_checkpoint(model, run_folder, iteration, keep=2):
+    """
+    Saves the current state of the model to <run_folder>/checkpoints/it_<iteration>,
+    and deletes older checkpoints so only the last `keep` are kept.
+    """
+    checkpoint_dir = os.path.join(run_folder, "checkpoints", f"it_{int(iteration)}")
+    model.save_checkpoint(custom_dir=checkpoint_dir)
+    with open(os.path.join(checkpoint_dir, COMPLETE_MARKER), 'w') as f:
+        f.write(f"{int(iteration)}\n")
+    print(f"Checkpoint saved at iteration {int(iteration)} in {checkpoint_dir}")
+
+    for old_dir in list_checkpoints(run_folder)[:-keep]:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    return checkpoint_dir
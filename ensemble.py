@@ -0,0 +1,244 @@
+# This is the script where I put all the runs of a sweep in one memory-mapped array (observable x run x time)
+import os
+import sys
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from gdat_io import HeaderIndex
+from run_store import ingest, RunStore
+
+"""
+build_ensemble() reads the binary store of every run under a folder (see run_store.py, the runs are ingested first)
+and writes them into one array on disk, <cube_folder>/cube.npy, plus:
+- time.npy: the time axis,
+- meta.json: the observable names and the size and modification time of the .gdat of each run,
+- parameters.csv: one row per run with its parameters, seed, group (the folder the run is in, relative to base_dir,
+  e.g. 'WT' or an ensemble folder) and run folder.
+The array is stored observable-major, (observable, run, time), so the runs of one observable are one contiguous block
+of the file, which is how it is read (observable(), the reductions). The Ensemble still gives its axes as
+(run, time, observable). Runs are written one at a time, so the cube never has to fit in memory.
+
+If the runs don't all have the same time axis (an output cadence that depends on the run, or runs stopped early at
+steady state), they are interpolated onto the times of all runs, up to the end of the longest one. A run that ended
+earlier is held at its last value after its end (the end of each run is in the end_time column of parameters.csv),
+and the reductions ignore NaNs. The burn-in runs of warm starts (EXCLUDE_FOLDERS) are not part of the ensemble.
+Calling build_ensemble() again only rebuilds the cube if runs were added or their .gdat changed.
+
+    ensemble = build_ensemble("data_output")
+    wt = ensemble.select(group="WT")                          # or kon_CaMKII_NMDAR=2e4, seed=[1, 2, 3]
+    wt.observable("CaMKII_open")                               # (run, time), memory-mapped
+    ensemble.mean("run"), ensemble.std("run")                  # (time, observable)
+    ensemble.final("CaMKII_open")                              # last value of every run
+"""
+
+CUBE_FOLDER = os.path.join("data_output", "ensemble_cube")
+
+AXES = ("run", "time", "observable")
+
+# Order of the axes of cube.npy on disk
+CUBE_AXES = ("observable", "run", "time")
+
+# Folders under base_dir whose runs are left out of the ensemble (warm start burn-ins, see warm_start.py)
+EXCLUDE_FOLDERS = ["warm_start"]
+
+# Observables (or runs) read at a time by Ensemble.reduce()
+REDUCE_BLOCK = 8
+
+class Ensemble:
+    """
+    A (run, time, observable) array with labelled axes and the table of each run's parameters
+    (on disk the array is (observable, run, time), see CUBE_AXES).
+
+    select() gives a smaller Ensemble over the same file (it only keeps the indices of its runs),
+    and the array is only read where it is used: observable() reads one observable of the selected runs,
+    and the reductions go through the cube a few observables (or runs) at a time.
+    """
+    def __init__(self, data, time, observables, parameters, rows=None):
+        self._data = data
+        self.rows = np.arange(data.shape[1]) if rows is None else np.asarray(rows)
+        self.time = np.asarray(time)
+        self.observables = list(observables)
+        self.parameters = parameters.reset_index(drop=True)
+        self._index = HeaderIndex(["time"] + self.observables)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __repr__(self):
+        return f"Ensemble({len(self)} runs x {len(self.time)} times x {len(self.observables)} observables)"
+
+    @property
+    def shape(self):
+        return (len(self), len(self.time), len(self.observables))
+
+    @property
+    def data(self):
+        # The whole (run, time, observable) array of the selected runs, read into memory
+        return np.moveaxis(self._data[:, self.rows], 0, -1)
+
+    def _axis(self, axis):
+        return AXES.index(axis) if isinstance(axis, str) else axis
+
+    def observable_index(self, name):
+        # Position of an observable on the last axis, the name is case-insensitive
+        if name not in self._index:
+            raise KeyError(f"No observable '{name}' in the ensemble.")
+        return self._index[name] - 1
+
+    def observable(self, name):
+        """
+        Returns the (run, time) array of one observable.
+        """
+        return self._data[self.observable_index(name)][self.rows]
+
+    def final(self, name):
+        # Last value of an observable in every run (runs that ended earlier are held at their last value)
+        return self._data[self.observable_index(name), :, -1][self.rows]
+
+    def where(self, mask):
+        """
+        Returns the Ensemble of the runs where mask (one bool per run) is True.
+        """
+        mask = np.asarray(mask, dtype=bool)
+        return Ensemble(self._data, self.time, self.observables, self.parameters[mask], rows=self.rows[mask])
+
+    def select(self, **conditions):
+        """
+        Returns the Ensemble of the runs matching every condition, e.g. select(group="WT", seed=[1, 2]).
+        A condition is a column of parameters (a parameter, 'seed', 'group' or 'run_folder') and a value or list of values.
+        Parameter values are compared with a relative tolerance, as they went through the .csv.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for column, wanted in conditions.items():
+            if column not in self.parameters:
+                raise KeyError(f"No column '{column}' in the parameters of the ensemble.")
+            values = self.parameters[column]
+            wanted = wanted if isinstance(wanted, (list, tuple, set, np.ndarray)) else [wanted]
+            if pd.api.types.is_numeric_dtype(values):
+                values = values.to_numpy(dtype=float)
+                mask &= np.any([np.isclose(values, float(value), rtol=1e-9) for value in wanted], axis=0)
+            else:
+                mask &= values.isin(list(wanted)).to_numpy()
+        return self.where(mask)
+
+    def groupby(self, column):
+        """
+        Returns {value: Ensemble} for every value of a column of parameters (e.g. 'group' or a swept parameter).
+        """
+        return {value: self.where(self.parameters[column] == value) for value in self.parameters[column].unique()}
+
+    def reduce(self, function, axis="run"):
+        """
+        Applies a numpy reduction (np.nanmean, np.nanstd, np.nanmedian, ...) along an axis given by name or number.
+        Along 'run' or 'time' it is done REDUCE_BLOCK observables at a time, along 'observable' REDUCE_BLOCK runs at a time.
+        The result has the axes of the Ensemble (run, time, observable) without the one reduced.
+        """
+        axis = self._axis(axis)
+        if axis == 2:
+            return np.concatenate([function(self._data[:, self.rows[start:start + REDUCE_BLOCK]], axis=0)
+                                   for start in range(0, len(self), REDUCE_BLOCK)], axis=0)
+        # A block is (observable, run, time), the run and time axes are one further along than in the Ensemble
+        return np.concatenate([np.moveaxis(function(self._data[start:start + REDUCE_BLOCK][:, self.rows], axis=axis + 1), 0, -1)
+                               for start in range(0, len(self.observables), REDUCE_BLOCK)], axis=-1)
+
+    def mean(self, axis="run"):
+        return self.reduce(np.nanmean, axis)
+
+    def std(self, axis="run"):
+        return self.reduce(np.nanstd, axis)
+
+    def min(self, axis="run"):
+        return self.reduce(np.nanmin, axis)
+
+    def max(self, axis="run"):
+        return self.reduce(np.nanmax, axis)
+
+def _common_time(times):
+    # The time axis of the cube: the runs' own if they all share it, else every time of any run (up to the longest end)
+    if all(len(t) == len(times[0]) and np.array_equal(t, times[0]) for t in times):
+        return np.array(times[0])
+    return np.unique(np.concatenate(times))
+
+def _sources(stores):
+    return {store.folder: [store.meta["source_size"], store.meta["source_mtime_ns"]] for store in stores}
+
+def build_ensemble(base_dir="data_output", cube_folder=CUBE_FOLDER, observables=None, dtype=np.float32, force=False,
+                   exclude=EXCLUDE_FOLDERS):
+    """
+    Writes the cube of every run under base_dir (see the top of this file) and returns it as an Ensemble.
+
+    Arguments:
+    - observables (list of str): optional, only these observables (by default all of the first run's).
+    - dtype: type of the cube, float32 holds molecule counts exactly up to 16 million.
+    - exclude (list of str): names of folders under base_dir whose runs are left out.
+    """
+    stores = [RunStore(folder) for folder in ingest(base_dir, exclude=exclude)]
+    if not stores:
+        raise FileNotFoundError(f"No complete runs in {base_dir}.")
+    names = [stores[0].observable_name(name) for name in (observables or stores[0].names)]
+    # Runs without all the observables (e.g. from another .bngl file) are left out
+    stores = [store for store in stores if all(name in store for name in names)]
+
+    meta_file = os.path.join(cube_folder, "meta.json")
+    if not force and os.path.exists(meta_file):
+        with open(meta_file, 'r') as f:
+            meta = json.load(f)
+        if (meta["sources"] == _sources(stores) and meta["observables"] == names and meta["dtype"] == np.dtype(dtype).name
+                and meta.get("axes") == list(CUBE_AXES)):
+            print(f"Ensemble cube in {cube_folder} is up to date.")
+            return load_ensemble(cube_folder)
+
+    time = _common_time([np.asarray(store.time) for store in stores])
+    os.makedirs(cube_folder, exist_ok=True)
+    tmp_file = os.path.join(cube_folder, "cube.npy.tmp")
+    cube = np.lib.format.open_memmap(tmp_file, mode='w+', dtype=dtype, shape=(len(names), len(stores), len(time)))
+    rows = []
+    for run, store in enumerate(stores):
+        store_time = np.asarray(store.time)
+        same_time = len(store_time) == len(time) and np.array_equal(store_time, time)
+        for idx, name in enumerate(names):
+            column = store.column(name)
+            # np.interp holds the run's last value after its end
+            cube[idx, run] = column if same_time else np.interp(time, store_time, column)
+        run_folder = os.path.dirname(store.folder)
+        rows.append({**store.parameters, "seed": store.seed, "end_time": float(store_time[-1]),
+                     "group": os.path.relpath(os.path.dirname(run_folder), base_dir), "run_folder": run_folder})
+    cube.flush()
+    del cube
+    os.replace(tmp_file, os.path.join(cube_folder, "cube.npy"))
+
+    pd.DataFrame(rows).to_csv(os.path.join(cube_folder, "parameters.csv"), index=False)
+    np.save(os.path.join(cube_folder, "time.npy"), time)
+    with open(meta_file, 'w') as f:
+        json.dump({"base_dir": base_dir, "axes": list(CUBE_AXES), "observables": names, "dtype": np.dtype(dtype).name,
+                   "sources": _sources(stores)}, f, indent=4)
+    print(f"Ensemble cube of {len(stores)} runs x {len(time)} times x {len(names)} observables saved in {cube_folder}.")
+    return load_ensemble(cube_folder)
+
+def load_ensemble(cube_folder=CUBE_FOLDER):
+    """
+    Opens a cube made by build_ensemble(), memory-mapped.
+    """
+    with open(os.path.join(cube_folder, "meta.json"), 'r') as f:
+        meta = json.load(f)
+    if meta.get("axes") != list(CUBE_AXES):
+        raise ValueError(f"The cube in {cube_folder} was saved (run, time, observable), rebuild it with build_ensemble().")
+    data = np.load(os.path.join(cube_folder, "cube.npy"), mmap_mode='r')
+    time = np.load(os.path.join(cube_folder, "time.npy"))
+    parameters = pd.read_csv(os.path.join(cube_folder, "parameters.csv"), dtype={"group": str, "run_folder": str})
+    return Ensemble(data, time, meta["observables"], parameters)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the (observable, run, time) cube of all runs under a folder.")
+    parser.add_argument("base_dir", nargs="?", default="data_output")
+    parser.add_argument("--cube", default=CUBE_FOLDER, help="folder to save the cube in")
+    parser.add_argument("--observables", nargs="+", default=None)
+    parser.add_argument("--force", action="store_true", help="rebuild even if nothing changed")
+    args = parser.parse_args(argv)
+    print(build_ensemble(args.base_dir, args.cube, observables=args.observables, force=args.force))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,206 @@
+# This is the script where I read the .gdat files MCell writes, so every analysis and plotting script loads them the same (fast) way
+import os
+
+import numpy as np
+
+"""
+A .gdat file is a header line `# time name1 name2 ...` followed by one row of numbers per output time.
+np.loadtxt goes through the rows in python and the scripts used to open every file a second time for the header;
+this reads the header line and then parses the rest of the file in one go with numpy's C parser (np.fromstring).
+
+    data, header_index = read_gdat("run_.../..._out.gdat")
+    data[:, header_index['camkii_open']]      # names are case-insensitive, data[:, 0] is the time
+
+    data, header_index = read_gdat(gdat_file, columns=['CaMKII_open', 'NMDAR_free'])   # time + only these columns
+
+The significance scripts only need the last row. read_final_row() reads the header line, then reads the file backwards
+from the end in blocks until it has the last complete row, so the cost doesn't depend on the length of the run.
+A last line without its newline (a run that crashed while writing) raises TruncatedGdatError,
+or with allow_truncated=True gives the row before it.
+
+    row, header_index = read_final_row(gdat_file)
+    row[header_index['camkii_open']]
+
+load_final_values(folder, name) gives the final value of one observable in every .gdat under a folder
+(skipping truncated ones), which is what t_test.py, one-way-ANOVA.py, normality_test.py and plot_histogram.py use.
+"""
+
+# Bytes read at a time when looking for the last row from the end of the file
+TAIL_BLOCK_SIZE = 64 * 1024
+
+class TruncatedGdatError(ValueError):
+    pass
+
+class HeaderIndex(dict):
+    """
+    Column name -> column index in the array read_gdat() returns, looked up case-insensitively.
+    The keys are the lower case names (without 'time'), names has the names as written in the file, time first.
+    """
+    def __init__(self, names):
+        super().__init__((name.lower(), idx) for idx, name in enumerate(names) if idx > 0)
+        self.names = list(names)
+
+    def __getitem__(self, name):
+        return super().__getitem__(name.lower())
+
+    def __contains__(self, name):
+        return isinstance(name, str) and super().__contains__(name.lower())
+
+    def get(self, name, default=None):
+        return super().get(name.lower(), default)
+
+def read_header(gdat_file):
+    """
+    Returns the column names of a .gdat file, time first, e.g. ['time', 'CaM_free', ...].
+    """
+    with open(gdat_file, 'r') as f:
+        return _parse_header(f.readline(), gdat_file)
+
+def _parse_header(line, gdat_file):
+    if not line.startswith("#"):
+        raise ValueError(f"{gdat_file} has no '# time ...' header line.")
+    return line.lstrip("#").split()
+
+def read_gdat(gdat_file, columns=None, dtype=np.float64):
+    """
+    Reads a .gdat file.
+
+    Arguments:
+    - columns (list of str): optional, only return the time and these columns (case-insensitive),
+      raises KeyError if one isn't in the file.
+    - dtype: type of the returned array.
+
+    Returns:
+    - data (2D array): one row per output time, the time in column 0.
+    - header_index (HeaderIndex): lower case column name -> column index in data.
+
+    A last line that was cut off (a run killed while writing) is dropped, with a warning.
+    """
+    with open(gdat_file, 'r') as f:
+        names = _parse_header(f.readline(), gdat_file)
+        text = f.read()
+
+    if text and not text.endswith("\n"):
+        print(f"Warning: the last line of {gdat_file} is incomplete, it is skipped.")
+        text = text[:text.rfind("\n") + 1]
+    values = np.fromstring(text, dtype=np.float64, sep=' ')
+
+    n_columns = len(names)
+    n_rows, leftover = divmod(len(values), n_columns)
+    if leftover:
+        print(f"Warning: {gdat_file} has {leftover} values more than whole rows, the last row is skipped.")
+        values = values[:n_rows * n_columns]
+    data = values.reshape(n_rows, n_columns)
+
+    if columns is not None:
+        header_index = HeaderIndex(names)
+        missing = [name for name in columns if name not in header_index]
+        if missing:
+            raise KeyError(f"Column(s) {missing} not in {gdat_file}")
+        indices = [0] + [header_index[name] for name in columns]
+        names = [names[idx] for idx in indices]
+        data = data[:, indices]
+
+    return np.ascontiguousarray(data, dtype=dtype), HeaderIndex(names)
+
+def read_final_row(gdat_file, columns=None, allow_truncated=False, min_rows=1):
+    """
+    Reads only the header and the last row of a .gdat file.
+
+    Arguments:
+    - columns (list of str): optional, only return the time and these columns (case-insensitive).
+    - allow_truncated (bool): if the last line was cut off, return the last complete row instead of raising
+      TruncatedGdatError.
+    - min_rows (int): raise ValueError if the file has fewer complete rows than this
+      (e.g. 2 for a run that died after writing only t=0).
+
+    Returns:
+    - row (1D array): the time then the values of the last row.
+    - header_index (HeaderIndex): lower case column name -> index in row.
+    """
+    with open(gdat_file, 'rb') as f:
+        names = _parse_header(f.readline().decode(), gdat_file)
+        header_end = f.tell()
+        position = f.seek(0, os.SEEK_END)
+
+        # With three newlines in the tail, the last two lines are all there even if the very last one was cut off
+        tail = b""
+        while position > header_end and tail.count(b"\n") < 3:
+            step = min(TAIL_BLOCK_SIZE, position - header_end)
+            position -= step
+            f.seek(position)
+            tail = f.read(step) + tail
+
+    ends_with_newline = tail.endswith(b"\n")
+    lines = tail.split(b"\n")
+    if ends_with_newline:
+        lines = lines[:-1]
+    if position > header_end:
+        lines = lines[1:]  # the first piece may start in the middle of a line
+    lines = [line for line in lines if line.strip()]
+    if not lines:
+        raise ValueError(f"{gdat_file} has no rows.")
+
+    row = _parse_row(lines[-1], len(names))
+    if row is None or not ends_with_newline:
+        if not allow_truncated:
+            raise TruncatedGdatError(f"The last line of {gdat_file} is incomplete, the run may have crashed while writing it.")
+        row = _parse_row(lines[-2], len(names)) if len(lines) > 1 else None
+        if row is None:
+            raise ValueError(f"{gdat_file} has no complete rows.")
+        print(f"Warning: the last line of {gdat_file} is incomplete, using the row before it.")
+        lines = lines[:-1]
+    if position <= header_end and len(lines) < min_rows:
+        # The whole file is in the tail, so lines are all its rows
+        raise ValueError(f"{gdat_file} has {len(lines)} row(s), fewer than {min_rows}.")
+
+    header_index = HeaderIndex(names)
+    if columns is not None:
+        missing = [name for name in columns if name not in header_index]
+        if missing:
+            raise KeyError(f"Column(s) {missing} not in {gdat_file}")
+        indices = [0] + [header_index[name] for name in columns]
+        row, header_index = row[indices], HeaderIndex([names[idx] for idx in indices])
+    return row, header_index
+
+def _parse_row(line, n_columns):
+    # The values of one line, or None if it doesn't have n_columns numbers
+    try:
+        row = np.array(line.split(), dtype=np.float64)
+    except ValueError:
+        return None
+    return row if len(row) == n_columns else None
+
+def find_gdat_files(folder_path):
+    # All .gdat files under a folder (searched recursively), in a fixed order
+    gdat_files = []
+    for root, dirs, files in os.walk(folder_path):
+        dirs.sort()
+        gdat_files.extend(os.path.join(root, file) for file in sorted(files) if file.endswith(".gdat"))
+    return gdat_files
+
+def load_final_values(folder_path, variable_name, verbose=False):
+    """
+    Returns the final value of variable_name (case-insensitive) in every .gdat file under folder_path.
+    Files that don't have the variable, have fewer than 2 rows (a run that died after writing t=0),
+    or whose last line was cut off (crashed runs) are skipped.
+    """
+    final_values = []
+    for gdat_file in find_gdat_files(folder_path):
+        if verbose:
+            print(f"Processing {os.path.basename(gdat_file)}...")
+        try:
+            row, header_index = read_final_row(gdat_file, min_rows=2)
+        except TruncatedGdatError as e:
+            print(f"⚠️ {e} Skipping.")
+            continue
+        except ValueError as e:
+            if verbose:
+                print(f"⚠️ {e} Skipping.")
+            continue
+        if variable_name not in header_index:
+            if verbose:
+                print(f"⚠️ Variable '{variable_name}' not found in {os.path.basename(gdat_file)}. Skipping.")
+            continue
+        final_values.append(float(row[header_index[variable_name]]))
+    return final_values
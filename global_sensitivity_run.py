@@ -1,4 +1,15 @@
+import os
+
 from run_model import run_model
+from mcell_params import DEFAULT_SEED
+from parallel_runs import run_in_pool
+from replicates import run_replicate_sweep, get_seeds
+from sweep_ledger import SweepLedger, sweep_context, RUNNING, DONE, FAILED
+from samplers import design_to_overrides
+from warm_start import get_warm_start
+from isolated_run import run_isolated
+from runtime_predictor import load_runtime_model, longest_first, estimate_eta
+from bngl_validator import preflight
 import itertools # is a module in Python that provides a set of fast, memory-efficient tools for working with iterators (objects that generate items one at a time).
 
 import numpy as np
@@ -17,19 +28,59 @@ factors = np.array([0.01])
 kon_values = 2e6*factors
 koff_values = 0.03*factors
 
+# Number of runs to do at the same time. 1 runs them one after the other, None uses all the cores of the machine.
+n_workers = 1
+
+# Number of replicates (different seeds) per combination of parameters. None does a single run with the default seed.
+# Seeds are drawn from a reproducible seed stream starting at base_seed (see replicates.py).
+n_replicates = None
+base_seed = 0
+
+# File where the state of each run of the sweep is recorded. If the sweep is interrupted, 
+# running this script again skips the runs that are already done. Set to None to always run everything.
+ledger_file = "data_output/sweep_ledger.jsonl"
+
+# Stop each run early once its observables stop changing (see steady_state.py), e.g. {'method': 'slope', 'window': 20, 'threshold': 0.01}
+# None always runs the full ITERATIONS.
+steady_state = None
+
+# When to write the observables to the .gdat (see output_cadence.py), e.g. {'method': 'log', 'n_points': 1000}
+# to get the fast Ca-CaM binding at the start at full resolution. None writes every 50000 iterations.
+output_cadence = None
+
+# Save molecule positions as compressed arrays (see viz_export.py), e.g.
+# {'cadence': {'method': 'log', 'n_points': 200}, 'species': ['CaMKII', 'NMDAR'], 'region': {'near_surface': 0.05}}
+# None saves no positions.
+viz_output = None
+
+# Number of iterations to equilibrate Ca-CaM binding for, once per set of Ca/CaM parameters, before the sweep (see warm_start.py).
+# Every run then starts from that equilibrated state. None starts every run from all CaM at ca~0.
+warm_start = None
+
+# Run each model in its own child process, killed if it goes over the timeout (seconds) or memory limit (MB),
+# and tried again up to max_retries times (see isolated_run.py). None runs the models directly.
+isolation = None  # e.g. {'timeout': 48 * 3600, 'max_rss_mb': 8000, 'max_retries': 2}
+
+# Start the runs predicted to take longest first, and print an ETA for the sweep (see runtime_predictor.py).
+# Needs a runtime model fitted with 'python runtime_predictor.py fit', otherwise the sweep runs in its own order.
+schedule_longest_first = True
+
 # Note that if parameter_value does not match, this code currently will not throw an error and will just run with the preset value stated in the .bngl file. 
 
-def parameter_sweep(parameters_dict):
+def parameter_sweep(parameters_dict, n_workers=1, n_replicates=None, seeds=None, base_seed=0, ledger_file=None,
+                    warm_start=None, isolation=None, schedule_longest_first=False, **run_kwargs):
     """
-    This (void) function does a parameter sweep by iterating over a list of values for a given parameter.
+    This function does a parameter sweep by iterating over a list of values for a given parameter.
 
-    It's primary goal is to perform an action (run model iteratively) rather than calculate and return a value.
+    It's primary goal is to perform an action (run model iteratively), 
+    the finished and failed runs are returned in case they are needed afterwards (see run_overrides()).
 
     Arguments it takes:
     parameters_dict (dict): 
     A dictionary where -
     keys are param_names (e.g. 'kon', 'koff') 
     and param_value_combinations are lists of values to sweep through for those parameters.
+    The other arguments are described in run_overrides().
     """
     # Create a list of parameter names (keys from the dictionary)
     param_names = list(parameters_dict.keys())
@@ -39,18 +90,169 @@ def parameter_sweep(parameters_dict):
     # This will generate all combinations of values for the parameters in the dictionary
     param_value_combinations = itertools.product(*parameters_dict.values())
 
-    for param_values in param_value_combinations:
-        # Create a dictionary of parameter overrides
-        parameter_overrides = dict(zip(param_names, param_values))
+    # Create a dictionary of parameter overrides for each combination
+    overrides_list = [dict(zip(param_names, param_values)) for param_values in param_value_combinations]
+
+    return run_overrides(overrides_list, n_workers=n_workers, n_replicates=n_replicates, seeds=seeds,
+                         base_seed=base_seed, ledger_file=ledger_file, warm_start=warm_start, isolation=isolation,
+                         schedule_longest_first=schedule_longest_first, **run_kwargs)
+
+def design_sweep(design, n_workers=1, n_replicates=None, seeds=None, base_seed=0, ledger_file=None,
+                 warm_start=None, isolation=None, schedule_longest_first=False, **run_kwargs):
+    """
+    Runs a sweep over the rows of a design table made by samplers.py (Latin hypercube, Sobol or Morris),
+    instead of every combination of values.
+
+    Arguments it takes:
+    design (str or pd.DataFrame): path to the design table .csv, or the table itself.
+    The other arguments are described in run_overrides().
+    """
+    overrides_list = design_to_overrides(design)
+    print(f"Design sweep of {len(overrides_list)} points over parameters {list(overrides_list[0]) if overrides_list else []}")
+
+    return run_overrides(overrides_list, n_workers=n_workers, n_replicates=n_replicates, seeds=seeds,
+                         base_seed=base_seed, ledger_file=ledger_file, warm_start=warm_start, isolation=isolation,
+                         schedule_longest_first=schedule_longest_first, **run_kwargs)
+
+def run_overrides(overrides_list, n_workers=1, n_replicates=None, seeds=None, base_seed=0, ledger_file=None,
+                  warm_start=None, isolation=None, schedule_longest_first=False, **run_kwargs):
+    """
+    Runs the model once for every dictionary of parameter overrides in overrides_list.
 
+    Arguments it takes:
+    overrides_list (list of dict): parameter overrides for each point of the sweep.
+    n_workers (int):
+    Number of runs to do at the same time in separate processes (None uses every core).
+    With more than one worker a failed run is reported and the rest of the sweep carries on.
+    n_replicates (int) or seeds (list of int):
+    If given, each combination is run once per seed, and its runs are saved together in one ensemble folder.
+    The runs of every combination and seed share the same n_workers processes (see replicates.run_replicate_sweep()).
+    ledger_file (str):
+    If given, the state of every run is recorded in this file (see sweep_ledger.py).
+    Running the same sweep again skips the runs that are already done, 
+    and re-runs the ones that failed or were interrupted.
+    warm_start (int):
+    If given, the Ca-CaM binding is equilibrated for this many iterations once per set of upstream parameters, 
+    and every run starts from that state instead of all CaM at ca~0 (see warm_start.py).
+    isolation (dict):
+    If given, each run is done in its own child process with a wall-clock timeout, a memory limit and retries,
+    e.g. {'timeout': 48 * 3600, 'max_rss_mb': 8000, 'max_retries': 2} (see isolated_run.py).
+    A run that still fails is reported and the sweep carries on.
+    schedule_longest_first (bool):
+    If True and a runtime model has been fitted (see runtime_predictor.py), the points predicted to take longest
+    are started first, so the slow runs don't all end up at the end of the sweep, and an ETA is printed.
+    run_kwargs:
+    Any other keyword arguments are passed on to run_model() (e.g. steady_state).
+
+    The .bngl file and the override names are checked once before any run starts (see bngl_validator.py),
+    a ValueError lists the problems.
+
+    Returns:
+    - results (list): (parameter_overrides, (run_folder, timestamp, df)) for every run that finished.
+    - failures (list): (parameter_overrides, error message) for every run that failed (with n_workers > 1, replicates
+      or isolation, the other ones carry on). They are also listed at the end of the sweep.
+    """
+    preflight(run_kwargs.get("bngl_file", "dodecamer_NMDAR.bngl"), overrides_list)
+
+    ledger = None
+    if ledger_file:
+        # The BNGL file and the options that change the output are part of the ledger keys (see sweep_ledger.py)
+        options = {name: value for name, value in run_kwargs.items() if name != "bngl_file"}
+        ledger = SweepLedger(ledger_file, sweep_context(run_kwargs.get("bngl_file", "dodecamer_NMDAR.bngl"),
+                                                         warm_start=warm_start, **options))
+
+    if schedule_longest_first and overrides_list:
+        runtime_model = load_runtime_model()
+        if runtime_model is not None:
+            bngl_file = run_kwargs.get("bngl_file", "dodecamer_NMDAR.bngl")
+            overrides_list = [overrides_list[i] for i in longest_first(overrides_list, runtime_model, bngl_file)]
+            n_runs = len(get_seeds(n_replicates, seeds, base_seed)) if n_replicates is not None or seeds is not None else 1
+            estimate_eta(overrides_list * n_runs, runtime_model, n_workers or os.cpu_count(), bngl_file)
+
+    def point_kwargs(parameter_overrides):
+        # run_model() arguments for one point, with the warm start BNGL file if asked for
+        if warm_start is None:
+            return run_kwargs
+        bngl_file = run_kwargs.get("bngl_file", "dodecamer_NMDAR.bngl")
+        return {**run_kwargs, "bngl_file": get_warm_start(bngl_file, parameter_overrides, burn_in_iterations=warm_start)}
+
+    if n_replicates is not None or seeds is not None:
+        point_seeds = get_seeds(n_replicates, seeds, base_seed)
+        seeds_per_point, ensemble_folders = [], []
+        for parameter_overrides in overrides_list:
+            todo_seeds = point_seeds
+            ensemble_folder = None
+            if ledger is not None:
+                todo_seeds = [seed for seed in point_seeds if not ledger.is_done(parameter_overrides, seed)]
+                if 0 < len(todo_seeds) < len(point_seeds):
+                    # Add the missing replicates to the ensemble folder the finished ones are in
+                    done_seed = next(seed for seed in point_seeds if seed not in todo_seeds)
+                    done_run_folder = ledger.entries[ledger.key(parameter_overrides, done_seed)]["run_folder"]
+                    ensemble_folder = os.path.dirname(os.path.normpath(done_run_folder))
+                if not todo_seeds:
+                    print(f"Skipping parameters: {parameter_overrides}, all replicates already done.")
+            seeds_per_point.append(todo_seeds)
+            ensemble_folders.append(ensemble_folder)
+
+        # Every (point, seed) run goes to the same pool, the runs are grouped into one ensemble folder per point
+        ensemble_folders, results, failures = run_replicate_sweep(
+            overrides_list, point_seeds, n_workers=n_workers, ensemble_folders=ensemble_folders,
+            seeds_per_point=seeds_per_point, ledger=ledger, isolation=isolation,
+            per_point_kwargs=[point_kwargs(parameter_overrides) if todo_seeds else {}
+                              for parameter_overrides, todo_seeds in zip(overrides_list, seeds_per_point)])
+        for parameter_overrides, ensemble_folder in zip(overrides_list, ensemble_folders):
+            if ensemble_folder is not None:
+                print(f"Replicates completed for parameters: {parameter_overrides}, saved in {ensemble_folder}")
+        return results, report_failures(failures)
+
+    if ledger is not None:
+        overrides_list = [parameter_overrides for parameter_overrides, seed
+                          in ledger.remaining([(parameter_overrides, DEFAULT_SEED) for parameter_overrides in overrides_list])]
+
+    if n_workers is None or n_workers > 1:
+        results, failures = run_in_pool(overrides_list, n_workers=n_workers, ledger=ledger, isolation=isolation,
+                                        per_run_kwargs=[point_kwargs(parameter_overrides) for parameter_overrides in overrides_list])
+        return results, report_failures(failures)
+
+    results, failures = [], []
+    for parameter_overrides in overrides_list:
         # Print out the parameters and their corresponding values for this run
         print(f"Starting run with parameters: {parameter_overrides}")
-        
+        if ledger is not None:
+            ledger.mark(parameter_overrides, DEFAULT_SEED, RUNNING)
+
         # Call the model with the current parameter overrides
-        run_model(parameter_overrides)
+        try:
+            if isolation is not None:
+                run_output = run_isolated(parameter_overrides, **isolation, **point_kwargs(parameter_overrides))
+            else:
+                run_output = run_model(parameter_overrides, **point_kwargs(parameter_overrides))
+        except Exception as e:
+            if ledger is not None:
+                ledger.mark(parameter_overrides, DEFAULT_SEED, FAILED, error=f"{type(e).__name__}: {e}")
+            if isolation is None:
+                raise
+            # With isolation, a run that failed every attempt doesn't stop the sweep
+            print(f"Run FAILED for parameters: {parameter_overrides}\n{e}")
+            failures.append((parameter_overrides, f"{type(e).__name__}: {e}"))
+            continue
+
+        if ledger is not None:
+            ledger.mark(parameter_overrides, DEFAULT_SEED, DONE, run_folder=run_output[0])
+        results.append((parameter_overrides, run_output))
         
         print(f"Run completed for parameters: {parameter_overrides}")
 
+    return results, report_failures(failures)
+
+def report_failures(failures):
+    # Lists the points that failed at the end of the sweep, so they don't get lost in the output of the other runs
+    if failures:
+        print(f"{len(failures)} run(s) FAILED:")
+        for parameter_overrides, error in failures:
+            print(f"  {parameter_overrides}: {error.strip().splitlines()[-1] if error.strip() else error}")
+    return failures
+
 
 # Define the parameters and their possible values
 parameters = {
@@ -58,5 +260,19 @@ parameters = {
     'koff_CaMKII_NMDAR': koff_values  # Replace with the actual parameter name in the model
 }
 
-# Run the parameter sweep for kon and koff
-parameter_sweep(parameters)
\ No newline at end of file
+# Design table from samplers.py to run instead of the kon x koff grid above, e.g. "sweep_design.csv"
+design_file = None
+
+# The guard is needed so the worker processes can import this file without starting the sweep again
+if __name__ == "__main__":
+    if design_file is not None:
+        design_sweep(design_file, n_workers=n_workers, n_replicates=n_replicates, base_seed=base_seed,
+                     ledger_file=ledger_file, warm_start=warm_start, isolation=isolation,
+                     schedule_longest_first=schedule_longest_first, steady_state=steady_state,
+                     output_cadence=output_cadence, viz_output=viz_output)
+    else:
+        # Run the parameter sweep for kon and koff
+        parameter_sweep(parameters, n_workers=n_workers, n_replicates=n_replicates, base_seed=base_seed,
+                        ledger_file=ledger_file, warm_start=warm_start, isolation=isolation,
+                        schedule_longest_first=schedule_longest_first, steady_state=steady_state,
+                        output_cadence=output_cadence, viz_output=viz_output)
@@ -0,0 +1,152 @@
+# This is the script where I run the model in a separate process with a time limit and a memory limit
+import os
+import json
+import time
+import traceback
+import multiprocessing as mp
+from datetime import datetime
+
+from process_memory import get_rss_mb
+
+"""
+A bad parameter (e.g. one that makes bound complexes grow without end) can make a run hang or use up all the memory
+of the node. run_isolated() runs run_model() in a child process and kills it if it goes over the wall-clock timeout
+or the memory (RSS) limit. Killed or crashed runs are tried again up to max_retries times.
+
+Every failed attempt writes <timestamp>_failure.json into its run folder with the cause
+('timeout', 'memory', 'error' or 'crash'), or into <output_folder>/failed_runs/ if the run folder wasn't made yet.
+
+Isolation settings are a dictionary, e.g. {'timeout': 48 * 3600, 'max_rss_mb': 8000, 'max_retries': 2}
+"""
+
+# How often the parent checks the child's time and memory (seconds)
+POLL_SECONDS = 5
+
+def _child(connection_end, parameter_overrides, run_kwargs):
+    from run_model import run_model
+
+    def send_run_folder(run_folder, timestamp):
+        connection_end.send(("run_folder", (run_folder, timestamp)))
+
+    try:
+        run_output = run_model(parameter_overrides, run_folder_callback=send_run_folder, **run_kwargs)
+        connection_end.send(("result", run_output))
+    except Exception:
+        connection_end.send(("error", traceback.format_exc()))
+
+def write_failure(failure, run_folder, timestamp, output_folder):
+    if run_folder is None:
+        run_folder = os.path.join(output_folder, "failed_runs")
+        os.makedirs(run_folder, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S-%f")
+    failure_file = os.path.join(run_folder, f"{timestamp}_failure.json")
+    with open(failure_file, 'w') as f:
+        json.dump(failure, f, indent=4, default=float)
+    return failure_file
+
+def run_attempt(parameter_overrides, run_kwargs, timeout=None, max_rss_mb=None):
+    """
+    One attempt at running the model in a child process.
+
+    Returns:
+    - (run_output, None) if the run finished, or (None, failure) where failure is a dictionary describing what happened.
+    """
+    parent_end, child_end = mp.Pipe(duplex=False)
+    process = mp.Process(target=_child, args=(child_end, parameter_overrides, run_kwargs))
+    start = time.time()
+    process.start()
+    child_end.close()
+
+    run_folder, timestamp = None, None
+    run_output, error = None, None
+    cause = None
+    peak_rss_mb = 0.0
+
+    def read_messages():
+        # Read everything the child has sent so far
+        nonlocal run_folder, timestamp, run_output, error, cause
+        while parent_end.poll():
+            try:
+                kind, payload = parent_end.recv()
+            except EOFError:
+                break
+            if kind == "run_folder":
+                run_folder, timestamp = payload
+            elif kind == "result":
+                run_output = payload
+            else:
+                error, cause = payload, "error"
+
+    while True:
+        process.join(timeout=POLL_SECONDS)
+        read_messages()
+
+        if not process.is_alive():
+            # The child may have sent its result and ended between the read above and this check
+            read_messages()
+            break
+
+        elapsed = time.time() - start
+        rss_mb = get_rss_mb(process.pid)
+        if rss_mb is not None:
+            peak_rss_mb = max(peak_rss_mb, rss_mb)
+        if timeout is not None and elapsed > timeout:
+            cause = "timeout"
+        elif max_rss_mb is not None and rss_mb is not None and rss_mb > max_rss_mb:
+            cause = "memory"
+        if cause in ("timeout", "memory"):
+            print(f"Killing run {run_folder} ({cause}: {elapsed:.0f} s, {rss_mb or 0:.0f} MB).")
+            process.kill()
+            process.join()
+            break
+
+    if run_output is not None:
+        return run_output, None
+
+    if cause is None:
+        cause = "crash"  # the process ended without sending a result, e.g. a segfault or the OS killing it
+    failure = {
+        "cause": cause,
+        "parameter_overrides": parameter_overrides,
+        "run_kwargs": run_kwargs,
+        "elapsed_seconds": time.time() - start,
+        "peak_rss_mb": peak_rss_mb,
+        "timeout": timeout,
+        "max_rss_mb": max_rss_mb,
+        "exitcode": process.exitcode,
+        "error": error,
+        "run_folder": run_folder,
+        "timestamp": timestamp,
+    }
+    return None, failure
+
+def run_isolated(parameter_overrides=None, timeout=None, max_rss_mb=None, max_retries=0, **run_kwargs):
+    """
+    Runs the model in a child process with a wall-clock timeout (seconds) and a memory limit (MB),
+    trying again up to max_retries times if it is killed or crashes (not if run_model raises an error).
+
+    Returns:
+        (run_folder, timestamp, df) like run_model().
+    Raises:
+        RuntimeError if every attempt failed, with the cause of the last one.
+    """
+    if parameter_overrides is None:
+        parameter_overrides = {}
+    output_folder = run_kwargs.get("output_folder", "data_output")
+
+    for attempt in range(1, max_retries + 2):
+        run_output, failure = run_attempt(parameter_overrides, run_kwargs, timeout, max_rss_mb)
+        if failure is None:
+            return run_output
+
+        failure["attempt"] = attempt
+        failure["max_retries"] = max_retries
+        failure_file = write_failure(failure, failure["run_folder"], failure["timestamp"], output_folder)
+        print(f"Attempt {attempt} of {max_retries + 1} failed ({failure['cause']}) for {parameter_overrides}, see {failure_file}")
+
+        # A python error will happen again with the same inputs, only killed or crashed runs are tried again
+        if failure["cause"] == "error":
+            break
+
+    raise RuntimeError(f"Run failed after {attempt} attempt(s) ({failure['cause']}) for {parameter_overrides}, "
+                       f"see {failure_file}\n{failure['error'] or ''}")
@@ -0,0 +1,254 @@
+# This is the script where I keep a queue of runs in a SQLite file, so workers on several machines can share a sweep
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import traceback
+import multiprocessing as mp
+
+"""
+The queue is a single SQLite file on a filesystem all the machines can see (e.g. data_output/job_queue.sqlite).
+
+    python job_queue.py submit --queue data_output/job_queue.sqlite --design sweep_design.csv --replicates 5
+    python job_queue.py worker --queue data_output/job_queue.sqlite        (start one or more per machine)
+    python job_queue.py status --queue data_output/job_queue.sqlite
+
+A worker claims a job inside a write transaction, so two workers never get the same job.
+While the run is going the worker keeps renewing its lease on the job; if a worker dies (node lost, killed),
+its lease runs out and the job goes back to pending for another worker. A worker that was only slow to renew
+(e.g. its machine was suspended) finds out that its lease is gone at the next renewal, stops its run and leaves
+the job to the worker that has it now, so a job is never run to the end by two workers.
+
+Note: SQLite locking relies on the filesystem. It works on local disks and most shared filesystems,
+but on some NFS setups file locks are unreliable, in that case keep the queue file on a filesystem with working locks.
+"""
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+
+def connect(queue_file):
+    folder = os.path.dirname(queue_file)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    # isolation_level=None: transactions are started by hand with BEGIN IMMEDIATE
+    connection = sqlite3.connect(queue_file, timeout=60, isolation_level=None)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            overrides TEXT NOT NULL,
+            run_kwargs TEXT NOT NULL,
+            state TEXT NOT NULL,
+            worker TEXT,
+            lease_expires REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            run_folder TEXT,
+            error TEXT,
+            submitted REAL,
+            finished REAL
+        )""")
+    connection.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state)")
+    return connection
+
+def submit(queue_file, overrides_list, per_run_kwargs=None, **run_kwargs):
+    """
+    Adds one job per override dictionary to the queue. run_kwargs (and per_run_kwargs, one dict per job)
+    are passed on to run_model(), e.g. seed, bngl_file, steady_state.
+    The .bngl files are checked first (see bngl_validator.py), nothing is added if one fails.
+
+    Returns the ids of the new jobs.
+    """
+    if per_run_kwargs is None:
+        per_run_kwargs = [{}] * len(overrides_list)
+
+    # Check the model before anything is queued, so no worker picks up a job that can only fail
+    from bngl_validator import preflight
+    bngl_files = {}
+    for parameter_overrides, kwargs in zip(overrides_list, per_run_kwargs):
+        bngl_file = {**run_kwargs, **kwargs}.get("bngl_file", "dodecamer_NMDAR.bngl")
+        bngl_files.setdefault(bngl_file, []).append(parameter_overrides)
+    for bngl_file, file_overrides in bngl_files.items():
+        preflight(bngl_file, file_overrides)
+
+    connection = connect(queue_file)
+    now = time.time()
+    ids = []
+    connection.execute("BEGIN IMMEDIATE")
+    for parameter_overrides, kwargs in zip(overrides_list, per_run_kwargs):
+        cursor = connection.execute(
+            "INSERT INTO jobs (overrides, run_kwargs, state, submitted) VALUES (?, ?, ?, ?)",
+            (json.dumps(parameter_overrides, default=float), json.dumps({**run_kwargs, **kwargs}, default=float), PENDING, now))
+        ids.append(cursor.lastrowid)
+    connection.execute("COMMIT")
+    connection.close()
+    print(f"Submitted {len(ids)} jobs to {queue_file}.")
+    return ids
+
+def requeue_expired(connection, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    # Jobs whose worker stopped renewing the lease go back to pending (or to failed after max_attempts)
+    now = time.time()
+    connection.execute(
+        "UPDATE jobs SET state = ?, error = 'lease expired, worker ' || worker || ' lost' "
+        "WHERE state = ? AND lease_expires < ? AND attempts >= ?", (FAILED, RUNNING, now, max_attempts))
+    connection.execute(
+        "UPDATE jobs SET state = ?, worker = NULL WHERE state = ? AND lease_expires < ?", (PENDING, RUNNING, now))
+
+def claim_job(connection, worker_name, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Atomically takes the oldest pending job. Returns (job_id, overrides, run_kwargs) or None if there are none.
+    """
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        requeue_expired(connection, max_attempts)
+        row = connection.execute(
+            "SELECT id, overrides, run_kwargs FROM jobs WHERE state = ? ORDER BY id LIMIT 1", (PENDING,)).fetchone()
+        if row is None:
+            connection.execute("COMMIT")
+            return None
+        connection.execute(
+            "UPDATE jobs SET state = ?, worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+            (RUNNING, worker_name, time.time() + lease_seconds, row[0]))
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+    return row[0], json.loads(row[1]), json.loads(row[2])
+
+def renew_lease(connection, job_id, worker_name, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """
+    Extends the worker's lease on a running job. Returns False if the worker doesn't hold the job anymore
+    (its lease ran out and the job was put back in the queue, or taken by another worker).
+    """
+    cursor = connection.execute(
+        "UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND state = ?",
+        (time.time() + lease_seconds, job_id, worker_name, RUNNING))
+    return cursor.rowcount > 0
+
+def finish_job(connection, job_id, worker_name, run_folder=None, error=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    # A failed job is tried again (by any worker) until it has been attempted max_attempts times.
+    # Returns False if the worker didn't hold the job anymore, then nothing is changed
+    if error is None:
+        state = DONE
+    else:
+        attempts = connection.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+        state = FAILED if attempts >= max_attempts else PENDING
+    cursor = connection.execute(
+        "UPDATE jobs SET state = ?, run_folder = ?, error = ?, finished = ?, worker = NULL "
+        "WHERE id = ? AND worker = ? AND state = ?",
+        (state, run_folder, error, time.time(), job_id, worker_name, RUNNING))
+    return cursor.rowcount > 0
+
+def _run_job(connection_end, parameter_overrides, run_kwargs):
+    # Runs in a child process, so the worker can keep renewing its lease while MCell runs
+    try:
+        from run_model import run_model
+        run_folder, timestamp, df = run_model(parameter_overrides, **run_kwargs)
+        connection_end.send((run_folder, None))
+    except Exception:
+        connection_end.send((None, traceback.format_exc()))
+
+def worker(queue_file, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS, wait=False, poll_seconds=30):
+    """
+    Takes jobs from the queue and runs them one at a time, until there are no pending jobs left
+    (or forever, checking every poll_seconds, if wait is True).
+    """
+    worker_name = f"{socket.gethostname()}:{os.getpid()}"
+    connection = connect(queue_file)
+    print(f"Worker {worker_name} taking jobs from {queue_file}.")
+
+    while True:
+        job = claim_job(connection, worker_name, lease_seconds, max_attempts)
+        if job is None:
+            if not wait:
+                break
+            time.sleep(poll_seconds)
+            continue
+
+        job_id, parameter_overrides, run_kwargs = job
+        print(f"Worker {worker_name} starting job {job_id}: {parameter_overrides} {run_kwargs}")
+
+        parent_end, child_end = mp.Pipe(duplex=False)
+        process = mp.Process(target=_run_job, args=(child_end, parameter_overrides, run_kwargs))
+        process.start()
+        lease_lost = False
+        while process.is_alive():
+            process.join(timeout=lease_seconds / 3)
+            if not renew_lease(connection, job_id, worker_name, lease_seconds):
+                lease_lost = True
+                break
+
+        if lease_lost:
+            # Another worker may be running the job now, stop ours and leave the job to it
+            process.terminate()
+            process.join()
+            print(f"Worker {worker_name} lost its lease on job {job_id}, its run was stopped.")
+            continue
+
+        if parent_end.poll():
+            run_folder, error = parent_end.recv()
+        else:
+            run_folder, error = None, f"run process exited with code {process.exitcode} without a result"
+
+        if not finish_job(connection, job_id, worker_name, run_folder, error, max_attempts):
+            print(f"Worker {worker_name} lost its lease on job {job_id} as its run ended, the result is not recorded.")
+        elif error is None:
+            print(f"Job {job_id} done: {run_folder}")
+        else:
+            print(f"Job {job_id} failed:\n{error}")
+
+    connection.close()
+    print(f"Worker {worker_name} found no more pending jobs, stopping.")
+
+def status(queue_file):
+    connection = connect(queue_file)
+    counts = dict(connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+    connection.close()
+    print(", ".join(f"{state}: {counts.get(state, 0)}" for state in (PENDING, RUNNING, DONE, FAILED)))
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SQLite job queue for model runs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    submit_parser = subparsers.add_parser("submit", help="add the rows of a design table (see samplers.py) as jobs")
+    submit_parser.add_argument("--queue", required=True)
+    submit_parser.add_argument("--design", required=True, help="design table .csv")
+    submit_parser.add_argument("--bngl", default="dodecamer_NMDAR.bngl")
+    submit_parser.add_argument("--replicates", type=int, default=None, help="number of seeds per point")
+    submit_parser.add_argument("--base-seed", type=int, default=0)
+
+    worker_parser = subparsers.add_parser("worker", help="run jobs from the queue")
+    worker_parser.add_argument("--queue", required=True)
+    worker_parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, help="lease length in seconds")
+    worker_parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS)
+    worker_parser.add_argument("--wait", action="store_true", help="keep waiting for new jobs instead of stopping")
+
+    status_parser = subparsers.add_parser("status", help="count jobs in each state")
+    status_parser.add_argument("--queue", required=True)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "submit":
+        from samplers import design_to_overrides
+        from replicates import seed_stream
+        overrides_list = design_to_overrides(args.design)
+        per_run_kwargs = None
+        if args.replicates is not None:
+            seeds = seed_stream(args.replicates, args.base_seed)
+            per_run_kwargs = [{"seed": seed} for _ in overrides_list for seed in seeds]
+            overrides_list = [parameter_overrides for parameter_overrides in overrides_list for _ in seeds]
+        submit(args.queue, overrides_list, per_run_kwargs, bngl_file=args.bngl)
+    elif args.command == "worker":
+        worker(args.queue, lease_seconds=args.lease, max_attempts=args.max_attempts, wait=args.wait)
+    else:
+        status(args.queue)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
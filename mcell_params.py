@@ -1,5 +1,6 @@
 import os
 import sys
+import json
 import numpy as np
 import pandas as pd
 
@@ -7,24 +8,69 @@ MCELL_PATH = os.environ.get('MCELL_PATH', '')
 sys.path.append(os.path.join(MCELL_PATH, 'lib'))
 
 import mcell as m
+from bngl_cache import load_parameters_cached
 print("Import of MCell was successful 3")
 
-def set_up_model():
-    
-    model = m.Model()
+# Seed used when none is given
+DEFAULT_SEED = 2
+
+# Partition sizes (um) used when there is no tuned configuration
+DEFAULT_PARTITION_DIMENSION = 1.5 # 1.5 was before
+DEFAULT_SUBPARTITION_DIMENSION = 0.05
+
+# Fastest partition sizes found by partition_tuner.py, used by set_up_model() when the file exists
+PARTITION_CONFIG_FILE = "partition_config.json"
+
+# Vertices and walls of the CP icosphere, built the first time create_geometry() is called in this process
+_cp_mesh = None
 
-    # Define specific seed
-    seed = 2
+def create_geometry():
+    """
+    Creates the CP compartment (an icosphere with the spine volume) and its PM surface.
+
+    The icosphere is only computed once per process; later calls build a new geometry object
+    from the saved vertices and walls, because an object can only be added to one model.
+    """
+    global _cp_mesh
 
-    # Creating geometry
-    vol_cp = 0.50588 # units of um3
-    r = (3*vol_cp/(4*np.pi))**(1/3.0) # units of microns
+    if _cp_mesh is None:
+        # Creating geometry
+        vol_cp = 0.50588 # units of um3
+        r = (3*vol_cp/(4*np.pi))**(1/3.0) # units of microns
 
-    cp = m.geometry_utils.create_icosphere(
-        'CP', radius = r, subdivisions=2)
+        cp = m.geometry_utils.create_icosphere(
+            'CP', radius = r, subdivisions=2)
+        _cp_mesh = (cp.vertex_list, cp.wall_list)
+
+    vertex_list, wall_list = _cp_mesh
+    cp = m.GeometryObject(name='CP', vertex_list=vertex_list, wall_list=wall_list)
     cp.is_bngl_compartment = True
     cp.surface_compartment_name = 'PM'
-    model.add_geometry_object(cp)
+    return cp
+
+def load_partition_config(config_file=PARTITION_CONFIG_FILE):
+    """
+    Returns (partition_dimension, subpartition_dimension) from the tuned configuration file,
+    or the defaults above if it hasn't been made (see partition_tuner.py).
+    """
+    if not os.path.exists(config_file):
+        return DEFAULT_PARTITION_DIMENSION, DEFAULT_SUBPARTITION_DIMENSION
+    with open(config_file, 'r') as f:
+        config = json.load(f)
+    return config["partition_dimension"], config["subpartition_dimension"]
+
+def set_up_model(seed=DEFAULT_SEED, partition_dimension=None, subpartition_dimension=None):
+    """
+    Sets up the mcell model: geometry and configuration.
+
+    Parameters:
+    - seed: Seed for MCell's random number generator, replicate runs should each use a different one.
+    - partition_dimension, subpartition_dimension: Optional partition sizes in um, 
+      by default the tuned ones in partition_config.json if it exists, otherwise 1.5 and 0.05.
+    """
+    model = m.Model()
+
+    model.add_geometry_object(create_geometry())
 
     #Do not use bng units:
     model.config.use_bng_units = False
@@ -32,8 +78,9 @@ def set_up_model():
     # Variable parameters
     model.config.time_step = 10e-5 # time steps taken by individual molecules. but this time step is still used by all output statements.
     model.config.seed = seed
-    model.config.partition_dimension = 1.5 # 1.5 was before
-    model.config.subpartition_dimension = 0.05
+    tuned_partition, tuned_subpartition = load_partition_config()
+    model.config.partition_dimension = partition_dimension if partition_dimension is not None else tuned_partition
+    model.config.subpartition_dimension = subpartition_dimension if subpartition_dimension is not None else tuned_subpartition
 
     return model
 
@@ -46,10 +93,13 @@ def process_parameters(file, folder, timestamp, parameter_overrides=None):
     - folder: The directory where the .bngl file is located and where output should be saved.
     - timestamp: A string representing the current timestamp, used for naming the output CSV file.
     """
-    # Load parameters from the .bngl file, override parameters of hey are there
-    param_dict = m.bngl_utils.load_bngl_parameters(
+    # Load parameters from the .bngl file, override parameters of hey are there.
+    # The parameters are cached by file content and overrides (see bngl_cache.py), that only saves the parse when the same point runs again.
+    # They are read with MCell's own loader, bngl_parameters.py is only used here once compare_with_mcell() passes on the model files
+    param_dict = load_parameters_cached(
         os.path.join(folder, file),
-        parameter_overrides)
+        parameter_overrides,
+        loader=m.bngl_utils.load_bngl_parameters)
     
     ITERATIONS = param_dict.get('ITERATIONS', None)  # Handle cases where 'ITERATIONS' might not be present
 
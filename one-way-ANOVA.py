@@ -1,12 +1,11 @@
 import sys
-import os
-import numpy as np
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 from scipy import stats
 from statsmodels.stats.multicomp import pairwise_tukeyhsd
 from statannotations.Annotator import Annotator
+from gdat_io import load_final_values
 
 """
 This script performs statistical analysis on the final values of a specified molecule extracted from `.gdat` files
@@ -34,29 +33,6 @@ Dependencies:
 """
 
 
-def load_final_values(folder_path, variable_name):
-    final_values = []
-    for root, dirs, files in os.walk(folder_path):
-        for file in files:
-            if file.endswith(".gdat"):
-                target_filepath = os.path.join(root, file)
-                data = np.loadtxt(target_filepath)
-                if data.ndim == 1:
-                    continue  # Skip malformed
-
-                with open(target_filepath, 'r') as f:
-                    first_line = f.readline().strip()
-                    header = first_line.split()[2:]  # skip "# time"
-
-                header_dict = {var.lower(): idx + 1 for idx, var in enumerate(header)}
-                var_lower = variable_name.lower()
-
-                if var_lower in header_dict:
-                    idx = header_dict[var_lower]
-                    final_val = data[-1, idx]
-                    final_values.append(final_val)
-    return final_values
-
 def run_anova_analysis(group_paths: dict, variable_name: str):
     """Takes a dict of group_name -> folder_path and a variable name, runs ANOVA & shows plot"""
     all_data = []
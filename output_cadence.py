@@ -0,0 +1,150 @@
+# This is the script where I decide at which iterations the observables are written to the .gdat
+import os
+
+import numpy as np
+
+"""
+By default MCell writes every observable every count_every_n_timesteps (50000) iterations. That misses the fast
+Ca-CaM binding at the start of a run and writes many identical rows once the model has settled.
+
+An output cadence is a dictionary given to run_model(output_cadence=...), with one of these methods:
+- {'method': 'uniform', 'every': 50000}: the same as MCell's fixed period.
+- {'method': 'log', 'first': 10, 'n_points': 1000}: n_points iterations log-spaced from first to ITERATIONS,
+  so the start of the run is at full resolution and the plateau only gets a few rows.
+- {'method': 'piecewise', 'pieces': [[0, 100], [1e4, 1000], [1e6, 50000]]}: [start iteration, period] pairs,
+  every 100 iterations until 1e4, then every 1000 until 1e6, then every 50000.
+- {'method': 'change', 'check_every': 1000, 'threshold': 0.01, 'max_every': 50000}: the observables are checked
+  every check_every iterations and a row is written when any of them has changed by more than threshold
+  (relative) since the last row, or max_every iterations have passed.
+
+The first (iteration 0) and last rows are always written. The counts are read with count.get_current_value()
+and written to <timestamp>_out.gdat.partial while the run goes, which is renamed to <timestamp>_out.gdat
+when the run has ended, in the same format as the .gdat MCell writes. The time column is then not evenly spaced,
+the plotting scripts plot against it (and resample_runs() puts runs with different time axes on a common one).
+"""
+
+DEFAULT_CADENCE = {
+    'method': 'uniform',   # 'uniform', 'log', 'piecewise' or 'change'
+    'every': 50000,        # uniform: period in iterations
+    'first': 10,           # log: first iteration after 0
+    'n_points': 1000,      # log: number of rows
+    'pieces': None,        # piecewise: list of [start iteration, period]
+    'check_every': 1000,   # change: how often the observables are checked
+    'threshold': 0.01,     # change: relative change that triggers a row
+    'max_every': 50000,    # change: longest gap between rows
+}
+
+def make_cadence(cadence=None):
+    """
+    Fills in the defaults for any setting that isn't given, and checks the method.
+    """
+    full_cadence = dict(DEFAULT_CADENCE)
+    if cadence:
+        unknown = set(cadence) - set(DEFAULT_CADENCE)
+        if unknown:
+            raise ValueError(f"Unknown output cadence settings: {sorted(unknown)}")
+        full_cadence.update(cadence)
+    if full_cadence['method'] not in ('uniform', 'log', 'piecewise', 'change'):
+        raise ValueError(f"Unknown output cadence method '{full_cadence['method']}', use 'uniform', 'log', 'piecewise' or 'change'.")
+    if full_cadence['method'] == 'piecewise' and not full_cadence['pieces']:
+        raise ValueError("The piecewise output cadence needs 'pieces', e.g. [[0, 100], [1e4, 1000]].")
+    return full_cadence
+
+def output_iterations(cadence, ITERATIONS):
+    """
+    Returns the sorted iterations a row is written at, for the fixed schedules (all but 'change').
+    """
+    ITERATIONS = int(ITERATIONS)
+    method = cadence['method']
+    if method == 'uniform':
+        iterations = np.arange(0, ITERATIONS + 1, int(cadence['every']))
+    elif method == 'log':
+        first = max(1, int(cadence['first']))
+        iterations = np.geomspace(first, max(first, ITERATIONS), int(cadence['n_points']))
+    elif method == 'piecewise':
+        pieces = sorted((int(start), int(every)) for start, every in cadence['pieces'])
+        ends = [start for start, _ in pieces[1:]] + [ITERATIONS]
+        iterations = np.concatenate([np.arange(start, min(end, ITERATIONS), every)
+                                     for (start, every), end in zip(pieces, ends) if start < ITERATIONS])
+    else:
+        return None
+    iterations = np.round(iterations).astype(int)
+    return np.unique(np.concatenate([[0], iterations[(iterations >= 0) & (iterations <= ITERATIONS)], [ITERATIONS]]))
+
+class CountWriter:
+    def __init__(self, model, gdat_file, cadence, ITERATIONS):
+        """
+        Writes the observables of an initialized model at the iterations given by the cadence.
+        The counts of the model should be set to every_n_timesteps = 0, so MCell only computes them when asked.
+        """
+        self.cadence = make_cadence(cadence)
+        self.counts = list(model.counts)
+        self.time_step = model.config.time_step
+        self.ITERATIONS = int(ITERATIONS)
+        self.schedule = output_iterations(self.cadence, self.ITERATIONS)
+        self.gdat_file = gdat_file
+        self.partial_file = f"{gdat_file}.partial"
+        self.last_row = None  # (iteration, values) of the last row written
+
+        self.file = open(self.partial_file, 'w')
+        self.file.write("# time " + " ".join(count.name for count in self.counts) + "\n")
+        self.record(0)
+
+    def next_output(self, iteration):
+        # The next iteration after this one where the counts have to be looked at
+        if self.schedule is None:
+            return min(iteration + int(self.cadence['check_every']), self.ITERATIONS)
+        later = self.schedule[self.schedule > iteration]
+        return int(later[0]) if len(later) else self.ITERATIONS
+
+    def _changed(self, iteration, values):
+        last_iteration, last_values = self.last_row
+        if iteration - last_iteration >= self.cadence['max_every']:
+            return True
+        change = np.abs(values - last_values) / np.maximum(np.abs(last_values), 1)
+        return bool(np.any(change > self.cadence['threshold']))
+
+    def record(self, iteration, force=False):
+        """
+        Writes a row for this iteration if the cadence asks for one (always if force is True).
+        """
+        if self.last_row is not None and self.last_row[0] == iteration:
+            return
+        if self.schedule is not None and not force and iteration not in self.schedule:
+            return
+        values = np.array([count.get_current_value() for count in self.counts], dtype=float)
+        if self.schedule is None and not force and self.last_row is not None and not self._changed(iteration, values):
+            return
+        row = [iteration * self.time_step] + list(values)
+        self.file.write(" ".join(f"{value:.15g}" for value in row) + "\n")
+        self.file.flush()
+        self.last_row = (iteration, values)
+
+    def close(self, iteration):
+        """
+        Writes the last row (the iteration the run stopped at), call it before model.end_simulation().
+        """
+        self.record(iteration, force=True)
+        self.file.close()
+
+    def finish(self):
+        # Moves the finished file to the .gdat name, after model.end_simulation() so MCell can't write over it
+        os.replace(self.partial_file, self.gdat_file)
+
+def resample_runs(time_arrays, value_arrays):
+    """
+    Puts runs with different time axes (e.g. from the 'change' cadence) on a common one, so they can be averaged.
+
+    Arguments:
+    - time_arrays (list of 1D arrays): time column of each run.
+    - value_arrays (list of 1D arrays): values of one observable in each run.
+
+    Returns:
+    - (common time axis, 2D array with one row per run). If all runs have the same time axis they are returned as they are,
+      otherwise the values are interpolated onto every time point of any run, and a run that ended earlier is held
+      at its last value after its end (the same as streaming_stats.py and the ensemble cube).
+    """
+    if all(len(t) == len(time_arrays[0]) and np.array_equal(t, time_arrays[0]) for t in time_arrays):
+        return time_arrays[0], np.stack(value_arrays)
+    common_time = np.unique(np.concatenate(time_arrays))
+    return common_time, np.stack([np.interp(common_time, t, v) for t, v in zip(time_arrays, value_arrays)])
@@ -0,0 +1,136 @@
+# This is the script where I run several model runs at the same time on a pool of worker processes
+import os
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from run_model import run_model
+from mcell_params import DEFAULT_SEED
+from sweep_ledger import RUNNING, DONE, FAILED
+from worker_server import warm_up_worker
+from isolated_run import run_isolated
+
+def _run_one(parameter_overrides, run_kwargs, isolation=None):
+    """
+    Runs a single model in a worker process (in its own child process, with limits, if isolation is given).
+
+    Errors are turned into a traceback string here, in the worker, because MCell exceptions
+    can't always be pickled back to the main process.
+    """
+    try:
+        if isolation is not None:
+            return run_isolated(parameter_overrides, **isolation, **run_kwargs), None
+        return run_model(parameter_overrides, **run_kwargs), None
+    except Exception:
+        return None, traceback.format_exc()
+
+def run_in_pool(overrides_list, n_workers=None, per_run_kwargs=None, ledger=None, isolation=None, **run_kwargs):
+    """
+    Sends each override dictionary to a pool of worker processes and collects the runs as they finish.
+
+    Arguments:
+    - overrides_list (list of dict): one dictionary of parameter overrides per run.
+    - n_workers (int): number of worker processes, defaults to the number of cores on the machine.
+    - per_run_kwargs (list of dict): optional keyword arguments for each run (same order as overrides_list),
+      e.g. a different seed per replicate.
+    - ledger (SweepLedger): optional, every run is marked running when it starts and done or failed when it finishes.
+    - isolation (dict): optional, run each model in its own child process with a timeout, memory limit and retries,
+      e.g. {'timeout': 48 * 3600, 'max_rss_mb': 8000, 'max_retries': 2} (see isolated_run.py).
+    - run_kwargs: any other keyword arguments are passed on to run_model() (e.g. bngl_file).
+
+    Returns:
+    - results (list): (parameter_overrides, (run_folder, timestamp, df)) for every run that finished.
+    - failures (list): (parameter_overrides, error message) for every run that failed.
+      A failed run does not stop the others.
+
+    If a worker process dies (killed for memory, a segfault inside MCell), the pool is broken for every run in it.
+    The runs that hadn't started go to a new pool, and the ones that were running are run again each on its own,
+    so only the run that killed its worker is counted as failed.
+    """
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+
+    if per_run_kwargs is None:
+        per_run_kwargs = [{}] * len(overrides_list)
+
+    results = []
+    failures = []
+    jobs = deque((parameter_overrides, {**run_kwargs, **kwargs}) for parameter_overrides, kwargs in zip(overrides_list, per_run_kwargs))
+    print(f"Running {len(jobs)} runs on {n_workers} worker processes.")
+
+    while jobs:
+        in_flight = _run_batch(jobs, n_workers, ledger, isolation, results, failures)
+        if len(in_flight) == 1:
+            _record(in_flight[0], None, "the worker process died while running it (killed by the OS or crashed)",
+                    ledger, results, failures)
+        elif in_flight:
+            # One of these killed the pool, run each again in its own pool to find which
+            print(f"A worker process died, running the {len(in_flight)} runs that were in progress again one per pool.")
+            with ThreadPoolExecutor(max_workers=len(in_flight)) as threads:
+                for job, lost in zip(in_flight, threads.map(
+                        lambda job: _run_batch(deque([job]), 1, ledger, isolation, results, failures), in_flight)):
+                    if lost:
+                        _record(job, None, "the worker process died while running it (killed by the OS or crashed)",
+                                ledger, results, failures)
+
+    print(f"{len(results)} runs completed, {len(failures)} runs failed.")
+    return results, failures
+
+def _record(job, run_output, error, ledger, results, failures):
+    parameter_overrides, kwargs = job
+    if error is None:
+        results.append((parameter_overrides, run_output))
+        print(f"Run completed for parameters: {parameter_overrides} -> {run_output[0]}")
+    else:
+        failures.append((parameter_overrides, error))
+        print(f"Run FAILED for parameters: {parameter_overrides}\n{error}")
+
+    if ledger is not None:
+        seed = kwargs.get("seed", DEFAULT_SEED)
+        if error is None:
+            ledger.mark(parameter_overrides, seed, DONE, run_folder=run_output[0])
+        else:
+            ledger.mark(parameter_overrides, seed, FAILED, error=error)
+
+def _run_batch(jobs, n_workers, ledger, isolation, results, failures):
+    """
+    Runs the jobs (a deque of (parameter_overrides, run_kwargs), taken from the left) on one pool,
+    keeping only n_workers of them submitted at a time, so a run is marked running when it really starts.
+
+    Returns the jobs that were running when a worker process died (empty if none did),
+    the jobs that hadn't been started are left in jobs.
+    """
+    # Each worker imports MCell and builds the geometry once when it starts, not once per run
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=warm_up_worker) as executor:
+        futures = {}
+
+        def submit_next():
+            job = jobs.popleft()
+            if ledger is not None:
+                ledger.mark(job[0], job[1].get("seed", DEFAULT_SEED), RUNNING)
+            futures[executor.submit(_run_one, job[0], job[1], isolation)] = job
+
+        while jobs and len(futures) < n_workers:
+            submit_next()
+
+        while futures:
+            future = next(as_completed(futures))
+            job = futures.pop(future)
+            try:
+                run_output, error = future.result()
+            except BrokenProcessPool:
+                # Runs that finished before the pool broke still have their result, the others were running
+                in_flight = [job]
+                for other_future, other_job in futures.items():
+                    if other_future.done() and not isinstance(other_future.exception(), BrokenProcessPool):
+                        _record(other_job, *other_future.result(), ledger, results, failures)
+                    else:
+                        in_flight.append(other_job)
+                return in_flight
+            except Exception as e:
+                run_output, error = None, f"{type(e).__name__}: {e}"
+            _record(job, run_output, error, ledger, results, failures)
+            if jobs:
+                submit_next()
+    return []
@@ -0,0 +1,189 @@
+# This is the script where I look for the partition sizes that make MCell run fastest for our model
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import itertools
+from datetime import datetime
+
+import numpy as np
+from scipy import stats
+
+from mcell_params import set_up_model, load_partition_config, PARTITION_CONFIG_FILE
+from run_cache import file_hash
+
+"""
+MCell splits space into subpartitions to find which molecules and walls can collide.
+Too large and every step checks many molecules, too small and molecules keep crossing subpartition borders,
+so the best size depends on the model (our spine is 0.506 um3, about 0.99 um across).
+
+For each (partition_dimension, subpartition_dimension) in the grid, this script runs a short simulation of
+the BNGL file with several seeds, and measures the iterations per second and the final value of every observable.
+A configuration only counts if the final mean of every observable is shown to be equivalent to the one of the current
+configuration: the 90% confidence interval of the difference of the means across seeds has to be within
+EQUIVALENCE_MARGIN of the current mean (two one-sided tests). A failed test that can't show a difference would let
+anything through with a few seeds, this one rejects configurations until there are enough seeds and iterations
+to show they give the same results. The fastest configuration that passes is saved to partition_config.json,
+and set_up_model() uses it from then on:
+
+    python partition_tuner.py --bngl dodecamer_NMDAR.bngl --iterations 20000 --seeds 10
+
+The partition has to contain the whole spine, so partition dimensions below ~1 um fail and are skipped.
+"""
+
+PARTITION_DIMENSIONS = [1.2, 1.5, 2.0]
+SUBPARTITION_DIMENSIONS = [0.02, 0.03, 0.05, 0.08, 0.1, 0.15, 0.2]
+
+# Significance level of each one-sided test of the observables check
+ALPHA = 0.05
+
+# Largest difference of the final mean of an observable still counted as the same:
+# this fraction of the current mean, and at least EQUIVALENCE_MIN_MARGIN molecules
+EQUIVALENCE_MARGIN = 0.05
+EQUIVALENCE_MIN_MARGIN = 1.0
+
+def benchmark_config(bngl_file, partition_dimension, subpartition_dimension, seed, n_iterations, work_folder):
+    """
+    Runs n_iterations of the model with these partition sizes.
+
+    Returns:
+    - (iterations per second, dict of the final value of each observable)
+    """
+    model = set_up_model(seed, partition_dimension=partition_dimension, subpartition_dimension=subpartition_dimension)
+    model.load_bngl(bngl_file, observables_path_or_file=os.path.join(work_folder, f"tune_{seed}_out.gdat"))
+    # Only one count output at the end, so writing the .gdat doesn't take part in the timing
+    for count in model.counts:
+        count.every_n_timesteps = n_iterations
+    model.config.total_iterations = n_iterations
+
+    model.initialize()
+    start = time.time()
+    model.run_iterations(n_iterations)
+    seconds = time.time() - start
+    final_values = {count.name: count.get_current_value() for count in model.counts}
+    model.end_simulation()
+
+    return n_iterations / seconds, final_values
+
+def observables_unchanged(values, baseline_values, alpha=ALPHA, margin=EQUIVALENCE_MARGIN, min_margin=EQUIVALENCE_MIN_MARGIN):
+    """
+    Checks that the final observables of a configuration are equivalent to the baseline ones, run with the same seeds.
+
+    Arguments:
+    - values, baseline_values (list of dict): final value of each observable, one dict per seed.
+
+    Returns:
+    - (True/False, largest ratio of the confidence interval bound of the difference to its margin, 1 or less passes)
+    """
+    worst = 0.0
+    for name in baseline_values[0]:
+        a = np.array([v[name] for v in values], dtype=float)
+        b = np.array([v[name] for v in baseline_values], dtype=float)
+        allowed = max(margin * abs(b.mean()), min_margin)
+        difference = a.mean() - b.mean()
+
+        # Welch confidence interval of the difference of the means, (1 - 2 alpha) for the two one-sided tests
+        se = np.sqrt(a.var(ddof=1) / len(a) + b.var(ddof=1) / len(b))
+        if se > 0:
+            df = se ** 4 / ((a.var(ddof=1) / len(a)) ** 2 / (len(a) - 1) + (b.var(ddof=1) / len(b)) ** 2 / (len(b) - 1))
+            half_width = stats.t.ppf(1 - alpha, df) * se
+        else:
+            half_width = 0.0
+        worst = max(worst, (abs(difference) + half_width) / allowed)
+    return bool(worst <= 1.0), float(worst)
+
+def autotune(bngl_file="dodecamer_NMDAR.bngl", n_iterations=20000, n_seeds=10,
+             partition_dimensions=None, subpartition_dimensions=None, config_file=PARTITION_CONFIG_FILE):
+    """
+    Benchmarks every combination of partition sizes and saves the fastest one that keeps the observables unchanged.
+
+    Returns:
+    - dict saved to config_file, with the chosen sizes and the results of every combination.
+    """
+    if partition_dimensions is None:
+        partition_dimensions = PARTITION_DIMENSIONS
+    if subpartition_dimensions is None:
+        subpartition_dimensions = SUBPARTITION_DIMENSIONS
+    if n_seeds < 2:
+        raise ValueError("The observables check needs at least 2 seeds per configuration.")
+    seeds = list(range(1, n_seeds + 1))
+
+    # The configuration used now (tuned before, or the defaults) is the reference for the observables
+    baseline = load_partition_config(config_file)
+    grid = [baseline] + [(p, s) for p, s in itertools.product(partition_dimensions, subpartition_dimensions)
+                         if s < p and (p, s) != baseline]
+
+    work_folder = tempfile.mkdtemp(prefix="partition_tuner_")
+    results = []
+    try:
+        for partition_dimension, subpartition_dimension in grid:
+            print(f"Benchmarking partition_dimension={partition_dimension}, subpartition_dimension={subpartition_dimension}")
+            try:
+                runs = [benchmark_config(bngl_file, partition_dimension, subpartition_dimension, seed, n_iterations, work_folder)
+                        for seed in seeds]
+            except Exception as e:
+                print(f"  failed: {e}")
+                results.append({"partition_dimension": partition_dimension, "subpartition_dimension": subpartition_dimension,
+                                "error": f"{type(e).__name__}: {e}"})
+                continue
+            results.append({
+                "partition_dimension": partition_dimension,
+                "subpartition_dimension": subpartition_dimension,
+                "iterations_per_second": float(np.mean([rate for rate, _ in runs])),
+                "final_values": [values for _, values in runs],
+            })
+            print(f"  {results[-1]['iterations_per_second']:.2f} iter/sec")
+    finally:
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+    baseline_result = results[0]
+    if "error" in baseline_result:
+        raise RuntimeError(f"The current configuration {baseline} failed: {baseline_result['error']}")
+
+    for result in results[1:]:
+        if "error" not in result:
+            result["observables_unchanged"], result["equivalence_ratio"] = observables_unchanged(
+                result["final_values"], baseline_result["final_values"])
+    baseline_result["observables_unchanged"], baseline_result["equivalence_ratio"] = True, 0.0
+
+    valid = [result for result in results if result.get("observables_unchanged")]
+    best = max(valid, key=lambda result: result["iterations_per_second"])
+
+    config = {
+        "partition_dimension": best["partition_dimension"],
+        "subpartition_dimension": best["subpartition_dimension"],
+        "iterations_per_second": best["iterations_per_second"],
+        "baseline_iterations_per_second": baseline_result["iterations_per_second"],
+        "bngl_file": bngl_file,
+        "bngl_hash": file_hash(bngl_file),
+        "n_iterations": n_iterations,
+        "seeds": seeds,
+        "tuned_on": datetime.now().strftime("%Y-%m-%d_%H-%M-%S"),
+        "results": [{key: value for key, value in result.items() if key != "final_values"} for result in results],
+    }
+    with open(config_file, 'w') as f:
+        json.dump(config, f, indent=4, default=float)
+
+    print(f"Fastest configuration: partition_dimension={best['partition_dimension']}, "
+          f"subpartition_dimension={best['subpartition_dimension']} "
+          f"({best['iterations_per_second']:.2f} iter/sec, "
+          f"{best['iterations_per_second'] / baseline_result['iterations_per_second']:.2f}x the current one), saved to {config_file}")
+    return config
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find the fastest MCell partition sizes for a BNGL model.")
+    parser.add_argument("--bngl", default="dodecamer_NMDAR.bngl")
+    parser.add_argument("--iterations", type=int, default=20000, help="iterations per benchmark run")
+    parser.add_argument("--seeds", type=int, default=10, help="runs per configuration, for the observables check")
+    parser.add_argument("--partition", type=float, nargs="+", default=None, help="partition dimensions to try (um)")
+    parser.add_argument("--subpartition", type=float, nargs="+", default=None, help="subpartition dimensions to try (um)")
+    parser.add_argument("--output", default=PARTITION_CONFIG_FILE)
+    args = parser.parse_args(argv)
+
+    autotune(args.bngl, args.iterations, args.seeds, args.partition, args.subpartition, args.output)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -2,6 +2,8 @@ import os
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.lines import Line2D
+from output_cadence import resample_runs
+from gdat_io import read_gdat
 
 def process_folder(folder_path, selected_variables=None):
     variable_data = {}
@@ -15,22 +17,15 @@ def process_folder(folder_path, selected_variables=None):
                 print(f"Processing {file}...")
 
                 try:
-                    data = np.loadtxt(fname=target_filepath)
+                    data, header_dict = read_gdat(target_filepath)
                 except Exception as e:
                     print(f"⚠️ Failed to read {file}: {e}")
                     continue
 
-                if data.ndim == 1 or data.shape[1] < 2:
+                if len(data) < 2 or data.shape[1] < 2:
                     print(f"⚠️ Warning: {file} appears to have wrong format. Skipping.")
                     continue
 
-                with open(target_filepath, 'r') as f:
-                    first_line = f.readline().strip()
-                    header = first_line.lstrip("#").split()
-                    header = header[1:]  # skip 'time'
-
-                header_dict = {var_name.lower(): idx + 1 for idx, var_name in enumerate(header)}
-
                 if selected_variables is None and not variables_determined:
                     selected_variables = list(header_dict.keys())
                     variables_determined = True
@@ -38,17 +33,19 @@ def process_folder(folder_path, selected_variables=None):
                     selected_variables = [var.lower() for var in selected_variables]
                     variables_determined = True
 
-                if time_values is None:
-                    time_values = data[:, 0]
-                    print(f" Time values detected, shape: {time_values.shape}")
-
                 for var_name in selected_variables:
                     if var_name in header_dict:
                         idx = header_dict[var_name]
-                        variable_data.setdefault(var_name, []).append(data[:, idx])
+                        variable_data.setdefault(var_name, []).append((data[:, 0], data[:, idx]))
                     else:
                         print(f" Variable '{var_name}' not found in {file}. Skipping.")
 
+    # Runs written with an output cadence (see output_cadence.py) can have different time axes, put them on a common one
+    for var_name, series in variable_data.items():
+        time_values, variable_data[var_name] = resample_runs([t for t, _ in series], [v for _, v in series])
+    if time_values is not None:
+        print(f" Time values detected, shape: {time_values.shape}")
+
     if not variable_data:
         print(" No variables were collected! Please check your selected variables and files.")
     else:
@@ -57,8 +54,8 @@ def process_folder(folder_path, selected_variables=None):
     return variable_data, time_values
 
 def plot_mean_from_gdat(wt_folder, mt_folder, selected_variables=None):
-    wt_data, time_values = process_folder(wt_folder, selected_variables)
-    mt_data, _ = process_folder(mt_folder, selected_variables)
+    wt_data, wt_time = process_folder(wt_folder, selected_variables)
+    mt_data, mt_time = process_folder(mt_folder, selected_variables)
 
     if not wt_data or not mt_data:
         print(" No data to plot. Please check your inputs.")
@@ -121,13 +118,13 @@ def plot_mean_from_gdat(wt_folder, mt_folder, selected_variables=None):
             print(f"    Final WT mean: {wt_mean[-1]:.3f}")
 
             color = color_palette["WT"]
-            plt.plot(time_values, wt_mean, color=color, label=f"WT - {var_name}")
-            plt.fill_between(time_values, wt_mean - wt_std, wt_mean + wt_std, color=color, alpha=0.3)
+            plt.plot(wt_time, wt_mean, color=color, label=f"WT - {var_name}")
+            plt.fill_between(wt_time, wt_mean - wt_std, wt_mean + wt_std, color=color, alpha=0.3)
             legend_handles.append(Line2D([0], [0], color=color, lw=2, label=f"WT - {var_name}"))
 
             # Final point marker
-            plt.plot(time_values[-1], wt_mean[-1], 'o', color=color)
-            place_label(time_values[-1], wt_mean[-1], f"{wt_mean[-1]:.1f}", color)
+            plt.plot(wt_time[-1], wt_mean[-1], 'o', color=color)
+            place_label(wt_time[-1], wt_mean[-1], f"{wt_mean[-1]:.1f}", color)
 
         # MT
         if var_name in mt_data:
@@ -139,13 +136,13 @@ def plot_mean_from_gdat(wt_folder, mt_folder, selected_variables=None):
             print(f"    Final MT mean: {mt_mean[-1]:.3f}")
 
             color = color_palette["MT"]
-            plt.plot(time_values, mt_mean, color=color, label=f"MT - {var_name}")
-            plt.fill_between(time_values, mt_mean - mt_std, mt_mean + mt_std, color=color, alpha=0.3)
+            plt.plot(mt_time, mt_mean, color=color, label=f"MT - {var_name}")
+            plt.fill_between(mt_time, mt_mean - mt_std, mt_mean + mt_std, color=color, alpha=0.3)
             legend_handles.append(Line2D([0], [0], color=color, lw=2, label=f"MT - {var_name}"))
 
             # Final point marker
-            plt.plot(time_values[-1], mt_mean[-1], 'o', color=color)
-            place_label(time_values[-1], mt_mean[-1], f"{mt_mean[-1]:.1f}", color)
+            plt.plot(mt_time[-1], mt_mean[-1], 'o', color=color)
+            place_label(mt_time[-1], mt_mean[-1], f"{mt_mean[-1]:.1f}", color)
 
     plt.xlabel("Time (s)")
     plt.ylabel("Molecule Count")
@@ -1,7 +1,7 @@
-import os
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.stats import ttest_ind
+from gdat_io import load_final_values
 
 # Dictionary for variable colors (as provided by you)
 variable_colors = {
@@ -27,32 +27,6 @@ variable_colors = {
     # Add more as needed...
 }
 
-# Function to load final values from .gdat files
-def load_final_values(folder_path, variable_name):
-    final_values = []
-    for root, dirs, files in os.walk(folder_path):
-        for file in files:
-            if file.endswith(".gdat"):
-                target_filepath = os.path.join(root, file)
-                data = np.loadtxt(target_filepath)
-                if data.ndim == 1:
-                    continue  # Skip if the data format is unexpected
-                
-                # Read header to find the index of the variable
-                with open(target_filepath, 'r') as f:
-                    first_line = f.readline().strip()
-                    header = first_line.split()[2:]  # Skip the "# time" column
-                
-                header_dict = {var_name.lower(): idx + 1 for idx, var_name in enumerate(header)}
-                var_lower = variable_name.lower()
-
-                if var_lower in header_dict:
-                    idx = header_dict[var_lower]
-                    final_val = data[-1, idx]  # Use the last data point
-                    final_values.append(final_val)
-    
-    return final_values
-
 # Function to perform a T-test between WT and MT
 def perform_ttest(wt_values, mt_values):
     stat, p_value = ttest_ind(wt_values, mt_values)
@@ -3,6 +3,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.ticker import LogFormatterSciNotation
 import pandas as pd
+from gdat_io import read_gdat
 
 def extract_parameters(params_dict, param_names):
     """
@@ -59,16 +60,11 @@ def plot_multiple_gdat(target_folder, selected_variables=None, param_names=None)
                 target_filepath = os.path.join(root, file)
                 print(f"Processing {file}...")
 
-                data = np.loadtxt(fname=target_filepath)
-                if data.ndim == 1:
+                data, header_dict = read_gdat(target_filepath)
+                if len(data) < 2:
                     print(f"Warning: {file} appears to have an unexpected format. Skipping.")
                     continue
 
-                with open(target_filepath, 'r') as f:
-                    first_line = f.readline().strip()
-                    header = first_line.split()[2:]
-
-                header_dict = {var_name.lower(): idx + 1 for idx, var_name in enumerate(header)}
                 if selected_variables is None:
                     selected_variables = list(header_dict.keys())
                 else:
@@ -1,53 +1,26 @@
 import os
-import numpy as np
 import matplotlib.pyplot as plt
+from gdat_io import find_gdat_files
+from streaming_stats import aggregate_gdat_files
 
 def plot_mean_from_gdat(target_folder, selected_variables=None, variable_colors=None):
     """
     Reads multiple .gdat files from a folder, computes mean and std for selected variables,
     and plots the average trace across simulations.
+    The runs are read one at a time into running statistics (see streaming_stats.py), so memory doesn't grow with the number of runs.
     """
     plt.figure(figsize=(10, 6))
-    variable_data = {}  # Stores time-series data for each variable across files
-    time_values = None
+    if selected_variables is not None:
+        selected_variables = [var.lower() for var in selected_variables]
 
-    for root, dirs, files in os.walk(target_folder):
-        for file in files:
-            if file.endswith(".gdat"):
-                target_filepath = os.path.join(root, file)
-                print(f"Processing {file}...")
-
-                data = np.loadtxt(fname=target_filepath)
-                if data.ndim == 1:
-                    print(f"Warning: {file} appears to have an unexpected format. Skipping.")
-                    continue
-
-                with open(target_filepath, 'r') as f:
-                    first_line = f.readline().strip()
-                    header = first_line.split()[2:]
-
-                header_dict = {var_name.lower(): idx + 1 for idx, var_name in enumerate(header)}
-
-                if selected_variables is None:
-                    selected_variables = list(header_dict.keys())
-                else:
-                    selected_variables = [var.lower() for var in selected_variables]
-
-                if time_values is None:
-                    time_values = data[:, 0]
-
-                for var_name in selected_variables:
-                    if var_name in header_dict:
-                        idx = header_dict[var_name]
-                        variable_data.setdefault(var_name, []).append(data[:, idx])
-                    else:
-                        print(f"Variable '{var_name}' not found in {file}. Skipping.")
+    # Running mean and std of each variable across the files, on the time axis of the first run
+    variable_stats = aggregate_gdat_files(find_gdat_files(target_folder), selected_variables)
 
     # Plot mean and standard deviation for each variable
-    for var_name, all_arrays in variable_data.items():
-        stacked = np.stack(all_arrays)
-        mean_values = np.mean(stacked, axis=0)
-        std_values = np.std(stacked, axis=0)
+    for var_name, stats in variable_stats.items():
+        time_values = stats.time
+        mean_values = stats.mean
+        std_values = stats.std()
 
         # Print final mean and std for figure legend
         final_mean = mean_values[-1] 
@@ -1,6 +1,6 @@
 import os
-import numpy as np
 import matplotlib.pyplot as plt
+from gdat_io import read_gdat
 
 def plot_target_file(target_file, selected_variables=None):
     # Function to search for the target file within directories containing "run_"
@@ -24,15 +24,10 @@ def plot_target_file(target_file, selected_variables=None):
         print(f"File '{target_file}' not found in any directory containing 'run_'")
 
 def plot_data(target_filepath, selected_variables=None):
-    # Load the data from the .gdat file
-    data = np.loadtxt(fname=target_filepath)
-    # Extract the header from the .gdat file
-    with open(target_filepath, 'r') as f:
-        header = f.readline().strip().split()[2:]
-    
-    # Create a dictionary to map variable names to their column indices
-    header_dict = {var_name: idx+1 for idx, var_name in enumerate(header)}
-    print(header_dict)
+    # Load the data from the .gdat file, header_dict maps the variable names (any case) to their column indices
+    data, header_dict = read_gdat(target_filepath)
+    header = header_dict.names[1:]
+    print(dict(header_dict))
 
     # If specific variables are selected, use them, otherwise plot all
     if selected_variables is None:
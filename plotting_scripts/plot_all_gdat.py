@@ -1,7 +1,12 @@
 import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 
+# gdat_io.py is in the folder above
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from gdat_io import read_gdat
+
 # this one goes thru all files
 # avoid doing a full run of script as it will iterate and save a png for each folder, 
 # only run if you want all figures at once
@@ -29,12 +34,12 @@ def plot_all_gdat_files(root_dir="."):
             print(f"Processing file: {gdat_file}")
 
             # Load the data from the .gdat file
-            data = np.loadtxt(fname=gdat_file)
+            data, header_index = read_gdat(gdat_file)
             data_new = np.delete(data, 0, 1)  # Removing the first column if needed
             
-            # Generate the plot
+            # Generate the plot, against the time column (rows aren't evenly spaced in time with an output cadence)
             plt.figure(figsize=(8, 6))
-            plt.plot(data_new)
+            plt.plot(data[:, 0], data_new)
             plt.xlabel("Time(s)")
             plt.ylabel("Molecule count")
             plt.title(f"Molecule counts through time ({os.path.basename(gdat_file)})")
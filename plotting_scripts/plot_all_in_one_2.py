@@ -1,7 +1,11 @@
 import os
-import numpy as np
+import sys
 import matplotlib.pyplot as plt
 
+# gdat_io.py is in the folder above
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from gdat_io import read_gdat
+
 def plot_multiple_gdat(target_folder, selected_variables=None):
     """
     Reads and plots data from .gdat files in the specified folder, 
@@ -20,24 +24,13 @@ def plot_multiple_gdat(target_folder, selected_variables=None):
                 print(f"Processing {file}...")
 
                 # Load the data
-                data = np.loadtxt(fname=target_filepath)
+                data, header_dict = read_gdat(target_filepath)
 
-                # Ensure data is 2D (skip if it's not)
-                if data.ndim == 1:
+                # Skip files with fewer than two rows
+                if len(data) < 2:
                     print(f"Warning: {file} appears to have an unexpected format. Skipping.")
                     continue
 
-                # Extract header
-                with open(target_filepath, 'r') as f:
-                    first_line = f.readline().strip()
-                    print(f"Header in {file}: {first_line}")  # Debugging
-
-                    header = first_line.split()[2:]  # Adjust if necessary
-
-                # Ensure headers are correctly mapped
-                header_dict = {var_name.lower(): idx + 1 for idx, var_name in enumerate(header)}
-                print(f"Parsed headers: {header_dict}")  # Debugging
-
                 # Convert user input to lowercase for case-insensitive matching
                 if selected_variables is None:
                     selected_variables = list(header_dict.keys())
@@ -1,9 +1,14 @@
 import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.ticker import LogFormatterSciNotation
 import pandas as pd
 
+# gdat_io.py is in the folder above
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from gdat_io import read_gdat
+
 def extract_parameters(params_dict, param_names):
     """
     Extracts multiple parameters and their values from a pandas DataFrame.
@@ -83,18 +88,11 @@ def plot_multiple_gdat(target_folder, selected_variables=None, param_names=None)
                 print(f"Processing {file}...")
 
                 # Load the data
-                data = np.loadtxt(fname=target_filepath)
-                if data.ndim == 1:
+                data, header_dict = read_gdat(target_filepath)
+                if len(data) < 2:
                     print(f"Warning: {file} appears to have an unexpected format. Skipping.")
                     continue
 
-                # Extract header
-                with open(target_filepath, 'r') as f:
-                    first_line = f.readline().strip()
-                    header = first_line.split()[2:]
-
-                # Ensure selected variables are mapped
-                header_dict = {var_name.lower(): idx + 1 for idx, var_name in enumerate(header)}
                 if selected_variables is None:
                     selected_variables = list(header_dict.keys())
                 else:
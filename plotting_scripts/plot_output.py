@@ -1,8 +1,13 @@
 # This script is to be run in command line as $ python plot_output.py
 import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 
+# gdat_io.py is in the folder above
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from gdat_io import read_gdat
+
 def plot_target_file(target_file):
     # Function to search for the target file within directories containing "run_"
     def find_target_file(root_dir, target_filename):
@@ -20,14 +25,15 @@ def plot_target_file(target_file):
     if target_filepath is not None:
         print("Using file:", target_filepath)
 
-        data = np.loadtxt(fname=target_filepath)
+        data, header_index = read_gdat(target_filepath)
         data_new = np.delete(data, 0, 1)
 
         plt.xlabel("Time(s)")
         plt.ylabel("Molecule count")
         plt.title("Molecule counts through time")
 
-        plt.plot(data_new)
+        # Plot against the time column, rows aren't evenly spaced in time with an output cadence (see output_cadence.py)
+        plt.plot(data[:, 0], data_new)
 
         # Save the .png file using the name of the .gdat file
         target_directory = os.path.dirname(target_filepath)
@@ -1,13 +1,17 @@
 import os
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 import glob
 
+# gdat_io.py is in the folder above
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import gdat_io
+
 def read_gdat(filename):
-    # read gdat file output and put it into a dataframe
-    data = pd.read_table(filename, delim_whitespace=True)
-    data.columns = data.columns[1:].append(pd.Index(["remove"]))
-    return data.drop("remove", axis=1)
+    # read gdat file output and put it into a dataframe (columns time and the observable names)
+    data, header_index = gdat_io.read_gdat(filename)
+    return pd.DataFrame(data, columns=header_index.names)
 
 # def extract_statistic(data):
 #     # function for extracting final concentration [C]
@@ -9,12 +9,18 @@ def prepare_out_folder(folder_name, seed, files_to_copy=["file.bngl", "file.py"]
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     folder_name = os.path.join(folder_name, f"run_{timestamp}_seed_{seed}")
 
-    # Create the timestamped folder
-    os.makedirs(folder_name)
+    # Create the timestamped folder.
+    # Runs started in parallel can land on the same second, in that case add the microseconds to the timestamp
+    try:
+        os.makedirs(folder_name)
+    except FileExistsError:
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S-%f")
+        folder_name = os.path.join(os.path.dirname(folder_name), f"run_{timestamp}_seed_{seed}")
+        os.makedirs(folder_name)
 
     # Loop over each file and copy it to the destination folder
     for file_name in files_to_copy:
-        dest_file = os.path.join(folder_name, file_name)  # Destination path with original name
+        dest_file = os.path.join(folder_name, os.path.basename(file_name))  # Destination path with original name
         shutil.copy(file_name, dest_file)  # Copy the file with original name
     
     print(f"New run, files will be saved in {folder_name}.")
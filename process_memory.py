@@ -0,0 +1,56 @@
+# This is the script where I measure how much memory a process uses, for the run limits and the perf files
+"""
+get_rss_mb(pid) is the memory a process uses now. get_peak_rss_mb() is the most the current process has used since
+reset_peak_rss() was last called, so a worker that does many runs can measure the peak of each run on its own
+(the peak from getrusage() is for the whole life of the process). Both are read from /proc on Linux;
+get_rss_mb() falls back on psutil if it is installed.
+"""
+
+_warned_no_rss = False
+
+def get_rss_mb(pid):
+    """
+    Returns the resident memory of a process in MB, or None if it can't be measured on this machine.
+    Uses /proc on Linux, or psutil if it is installed.
+    """
+    global _warned_no_rss
+    try:
+        with open(f"/proc/{pid}/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024  # kB to MB
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / 1024**2
+    except ImportError:
+        if not _warned_no_rss:
+            print("Warning: can't measure memory use on this machine (no /proc and no psutil), memory limits are not checked.")
+            _warned_no_rss = True
+    except Exception:
+        pass  # the process already ended
+    return None
+
+def reset_peak_rss():
+    """
+    Resets the peak resident memory of this process to its current memory (Linux 4.0 and later).
+    Returns True if it could, then get_peak_rss_mb() is the peak since this call.
+    """
+    try:
+        with open("/proc/self/clear_refs", 'w') as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def get_peak_rss_mb():
+    # Peak resident memory of this process in MB (since the last reset_peak_rss()), or None without /proc
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024  # kB to MB
+    except OSError:
+        pass
+    return None
@@ -0,0 +1,148 @@
+# This is the script where I run replicates (same parameters, different seeds) of the model
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# MCell seeds have to be positive integers that fit in a signed 32 bit int
+MAX_SEED = 2**31 - 1
+
+def seed_stream(n_replicates, base_seed=0):
+    """
+    Returns a reproducible list of n_replicates different seeds.
+
+    The same base_seed always gives the same seeds, and asking for more replicates
+    keeps the first seeds the same, so an ensemble can be extended later on.
+    """
+    seeds = []
+    seed_sequence = np.random.SeedSequence(base_seed)
+    while len(seeds) < n_replicates:
+        # Spawn one child at a time, so the first seeds don't depend on n_replicates
+        child = seed_sequence.spawn(1)[0]
+        seed = int(child.generate_state(1)[0]) % MAX_SEED + 1
+        if seed not in seeds:
+            seeds.append(seed)
+    return seeds
+
+def get_seeds(n_replicates=None, seeds=None, base_seed=0):
+    """
+    Works out the list of seeds to use, either given directly (seeds) or drawn from the seed stream (n_replicates).
+    """
+    if seeds is not None:
+        return [int(seed) for seed in seeds]
+    if n_replicates is None:
+        raise ValueError("Either n_replicates or seeds must be given.")
+    return seed_stream(n_replicates, base_seed)
+
+def new_ensemble_folder(output_folder="data_output"):
+    """
+    Creates a new, empty ensemble_<timestamp> folder in output_folder and returns its path.
+    """
+    while True:
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S-%f")
+        ensemble_folder = os.path.join(output_folder, f"ensemble_{timestamp}")
+        if not os.path.exists(ensemble_folder):
+            os.makedirs(ensemble_folder)
+            return ensemble_folder
+
+def run_replicates(parameter_overrides=None, n_replicates=None, seeds=None, base_seed=0,
+                   n_workers=None, output_folder="data_output", ensemble_folder=None, ledger=None,
+                   isolation=None, **run_kwargs):
+    """
+    Runs the model once per seed for one set of parameters, all replicates at the same time.
+
+    All the run folders (and so all the .gdat files) go into one ensemble folder,
+    which can be given directly to t_test.py, one-way-ANOVA.py, normality_test.py, etc.
+    The seeds and run folders are also listed in ensemble_seeds.csv in that folder.
+
+    Arguments:
+    - parameter_overrides (dict): parameters to override, the same for every replicate.
+    - n_replicates (int): number of replicates, seeds are taken from seed_stream(n_replicates, base_seed).
+    - seeds (list of int): seeds to use instead of the seed stream.
+    - n_workers (int): number of replicates to run at the same time (None uses every core).
+    - output_folder (str): folder where the ensemble folder is created.
+    - ensemble_folder (str): optional, add the runs to an existing ensemble folder instead (e.g. when resuming a sweep).
+    - ledger (SweepLedger): optional, passed on to run_in_pool() to record the state of each replicate.
+    - isolation (dict): optional, passed on to run_in_pool() to run each replicate with limits (see isolated_run.py).
+    - run_kwargs: any other keyword arguments are passed on to run_model() (e.g. bngl_file).
+
+    Returns:
+    - ensemble_folder (str), results and failures as returned by parallel_runs.run_in_pool().
+    """
+    if parameter_overrides is None:
+        parameter_overrides = {}
+
+    seeds = get_seeds(n_replicates, seeds, base_seed)
+    ensemble_folders, results, failures = run_replicate_sweep(
+        [parameter_overrides], seeds, n_workers=n_workers, output_folder=output_folder,
+        ensemble_folders=[ensemble_folder], ledger=ledger, isolation=isolation, **run_kwargs)
+    return ensemble_folders[0], results, failures
+
+def run_replicate_sweep(overrides_list, seeds, n_workers=None, output_folder="data_output", ensemble_folders=None,
+                        seeds_per_point=None, per_point_kwargs=None, ledger=None, isolation=None, **run_kwargs):
+    """
+    Runs every point of a sweep once per seed, with all the (point, seed) runs sent to the same pool of workers,
+    so the workers are kept busy across points instead of waiting for the slowest replicate of each point.
+
+    Each point gets its own ensemble folder, and the runs are put in the folder of their point as they are started.
+    ensemble_seeds.csv is written in each folder once the sweep is done.
+
+    Arguments:
+    - overrides_list (list of dict): parameter overrides of each point.
+    - seeds (list of int): seeds to run for each point.
+    - n_workers (int): number of runs to do at the same time (None uses every core).
+    - output_folder (str): folder where the new ensemble folders are created.
+    - ensemble_folders (list of str): optional, one per point, an existing ensemble folder to add the runs to
+      (e.g. when resuming a sweep), None for a new one.
+    - seeds_per_point (list of list of int): optional, the seeds to run for each point instead of seeds
+      (e.g. only the replicates that aren't done yet). A point with no seeds is skipped.
+    - per_point_kwargs (list of dict): optional, run_model() arguments for each point (e.g. a warm start bngl_file).
+    - ledger (SweepLedger), isolation (dict): passed on to run_in_pool().
+    - run_kwargs: any other keyword arguments are passed on to run_model().
+
+    Returns:
+    - ensemble_folders (list of str, one per point, None for a skipped point), results and failures
+      as returned by parallel_runs.run_in_pool().
+    """
+    # Imported here so the seed functions above can be used without MCell installed (e.g. job_queue.py submit)
+    from parallel_runs import run_in_pool
+
+    if ensemble_folders is None:
+        ensemble_folders = [None] * len(overrides_list)
+    if seeds_per_point is None:
+        seeds_per_point = [seeds] * len(overrides_list)
+    if per_point_kwargs is None:
+        per_point_kwargs = [{}] * len(overrides_list)
+
+    ensemble_folders = list(ensemble_folders)
+    jobs_overrides, jobs_kwargs = [], []
+    for i, (parameter_overrides, point_seeds) in enumerate(zip(overrides_list, seeds_per_point)):
+        if not point_seeds:
+            continue
+        if ensemble_folders[i] is None:
+            ensemble_folders[i] = new_ensemble_folder(output_folder)
+        print(f"Ensemble of {len(point_seeds)} replicates with parameters: {parameter_overrides}, "
+              f"runs will be saved in {ensemble_folders[i]}.")
+        for seed in point_seeds:
+            jobs_overrides.append(parameter_overrides)
+            jobs_kwargs.append({**per_point_kwargs[i], "seed": seed, "output_folder": ensemble_folders[i]})
+
+    results, failures = run_in_pool(jobs_overrides, n_workers=n_workers, per_run_kwargs=jobs_kwargs,
+                                    ledger=ledger, isolation=isolation, **run_kwargs)
+
+    # Keep a record of which seed went to which run folder, in the ensemble folder of each point
+    # (the seed is at the end of the run folder name, e.g. run_2025-03-25_14-48-31_seed_2)
+    records = {}
+    for parameter_overrides, (run_folder, run_timestamp, df) in results:
+        records.setdefault(os.path.dirname(os.path.normpath(run_folder)), []).append(
+            {"seed": int(os.path.basename(os.path.normpath(run_folder)).split('_')[-1]), "run_folder": run_folder,
+             "timestamp": run_timestamp, **parameter_overrides})
+    for ensemble_folder in ensemble_folders:
+        if ensemble_folder is None or os.path.normpath(ensemble_folder) not in records:
+            continue
+        seeds_file = os.path.join(ensemble_folder, "ensemble_seeds.csv")
+        pd.DataFrame.from_records(records[os.path.normpath(ensemble_folder)]).to_csv(
+            seeds_file, mode='a', header=not os.path.exists(seeds_file), index=False)
+
+    return ensemble_folders, results, failures
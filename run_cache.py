@@ -0,0 +1,83 @@
+# This is the script where I remember finished runs, so a run with exactly the same inputs isn't simulated twice
+import os
+import glob
+import json
+import hashlib
+
+import pandas as pd
+
+from bngl_parameters import load_bngl_parameters
+from sweep_ledger import gdat_is_complete
+
+"""
+Two sweep points can end up with the same effective model, e.g. when an override name doesn't match any parameter
+(it is ignored and the run uses the value in the .bngl file), or when two designs share points.
+MCell runs are deterministic for a given seed, so the second run would give exactly the same output.
+
+The key of a run is a hash of:
+- the fully evaluated parameter dictionary (after overrides),
+- the content of the BNGL file and of mcell_params.py,
+- the MCell configuration (time_step, partition_dimension, subpartition_dimension),
+- the seed,
+- the run options that change the output (count period, steady state criterion).
+Finished runs are listed in CACHE_INDEX, one json line per run.
+A cached run is only used if it is in the output folder asked for, so a replicate asked for in an ensemble folder
+is never answered with a run folder somewhere else (the ensemble folder would then be missing it).
+"""
+
+CACHE_INDEX = os.path.join("data_output", "run_cache.jsonl")
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def run_cache_key(bngl_file, parameter_overrides, seed, config, run_options=None, mcell_param_file="mcell_params.py"):
+    """
+    Arguments:
+    - config (dict): MCell configuration values, e.g. {'time_step': ..., 'partition_dimension': ...}.
+    - run_options (dict): other run_model() options that change the output.
+    """
+    key_inputs = {
+        "parameters": load_bngl_parameters(bngl_file, parameter_overrides),
+        "bngl": file_hash(bngl_file),
+        "mcell_params": file_hash(mcell_param_file),
+        "config": config,
+        "seed": int(seed),
+        "run_options": run_options or {},
+    }
+    text = json.dumps(key_inputs, sort_keys=True, default=float)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+def find_cached_run(key, output_folder, cache_index=CACHE_INDEX):
+    """
+    Returns (run_folder, timestamp, df) of a finished run with this key in output_folder, or None.
+    A run only counts if its .gdat is complete and its parameters .csv is still there.
+    """
+    if not os.path.exists(cache_index):
+        return None
+
+    found = None
+    with open(cache_index, 'r') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            same_folder = os.path.abspath(os.path.dirname(entry["run_folder"])) == os.path.abspath(output_folder)
+            if entry["key"] == key and same_folder:
+                found = entry  # keep the latest one
+
+    if found is None or not gdat_is_complete(found["run_folder"]):
+        return None
+    param_files = glob.glob(os.path.join(found["run_folder"], f"{found['timestamp']}_parameters.csv"))
+    if not param_files:
+        return None
+
+    return found["run_folder"], found["timestamp"], pd.read_csv(param_files[0])
+
+def record_run(key, run_folder, timestamp, cache_index=CACHE_INDEX):
+    folder = os.path.dirname(cache_index)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(cache_index, 'a') as f:
+        f.write(json.dumps({"key": key, "run_folder": run_folder, "timestamp": timestamp}) + "\n")
@@ -1,36 +1,97 @@
 import os
+import sys
+import json
+import subprocess
 from prepare_run_files import prepare_out_folder
+from steady_state import make_criterion, is_steady
+from checkpoints import save_run_info, load_run_info, save_checkpoint, latest_checkpoint, checkpoint_iteration
+from run_cache import run_cache_key, find_cached_run, record_run
+from run_telemetry import PerfRecorder, PERF_SAMPLES
+from output_cadence import make_cadence, CountWriter
+from viz_export import make_viz_output, VizWriter
 # Call the function "set_up_model" that runs mcell model with params specs from mcell_params.py
-from mcell_params import set_up_model, process_parameters
+from mcell_params import set_up_model, process_parameters, DEFAULT_SEED, PARTITION_CONFIG_FILE
 
-def run_model(parameter_overrides=None, bngl_file="dodecamer_NMDAR.bngl"):
+def run_model(parameter_overrides=None, bngl_file="dodecamer_NMDAR.bngl", seed=DEFAULT_SEED, output_folder="data_output",
+              chunk_iterations=None, steady_state=None, checkpoint_every=None, use_cache=False,
+              run_folder_callback=None, output_cadence=None, viz_output=None):
     """
     Runs the MCell model with optional parameter overrides.
 
     Args:
         parameter_overrides: Optional dictionary of parameters to override.
-        bngl_file: Name of the BNGL file to load.
+        bngl_file: Name (or path) of the BNGL file to load.
+        seed: Seed for MCell's random number generator.
+        output_folder: Folder where the timestamped run folder is created.
+        chunk_iterations: Optional, run the model in blocks of this many iterations instead of all at once.
+        steady_state: Optional steady state criterion (see steady_state.py). The observables are checked 
+            after every block and the run stops early once they are steady. 
+            If chunk_iterations is not given, blocks are the same size as the count output period.
+        checkpoint_every: Optional, save a checkpoint of the model into the run folder every this many iterations,
+            so the run can be continued with resume_run(run_folder) after a crash.
+        use_cache: If True and a run with exactly the same parameters, BNGL file, MCell configuration and seed
+            has already finished in output_folder, its run folder is returned instead of simulating again (see run_cache.py).
+        run_folder_callback: Optional function, called with (run_folder, timestamp) as soon as the run folder is made.
+        output_cadence: Optional, when to write the observables to the .gdat instead of every count_every_n_timesteps,
+            e.g. {'method': 'log', 'n_points': 1000} (see output_cadence.py). Can't be used with checkpoint_every.
+        viz_output: Optional, save molecule positions as compressed arrays in <run_folder>/viz_data, e.g.
+            {'cadence': {'method': 'log', 'n_points': 200}, 'species': ['CaMKII', 'NMDAR'], 'region': {'near_surface': 0.05}}
+            (see viz_export.py).
         
     Returns:
         Tuple containing the run folder path, timestamp, and processed parameters DataFrame.
     """
 
+    # Time and memory of each phase of the run, saved to <timestamp>_perf.json (see run_telemetry.py)
+    perf = PerfRecorder()
+
     # Set up the model described in mcell_params.py under the function set_up_model()
-    model = set_up_model()
+    with perf.phase("set_up_model"):
+        model = set_up_model(seed)
 
     # Define MCell parameter files
     mcell_param_file = "mcell_params.py"
 
-    # Call the function and capture the path to the run folder and timestamp
-    run_folder, timestamp = prepare_out_folder("data_output", model.config.seed, files_to_copy=[bngl_file, mcell_param_file])
+    # Count output period
+    count_every_n_timesteps = 50000
 
-    # This wont run now, will run if set to True. Save viz_data under timestamped folder
-    if False:
-        viz_output = m.VizOutput(
-            os.path.join(run_folder, f"viz_data/Scene_"),
-            every_n_timesteps=100
-        )
-        model.add_viz_output(viz_output)
+    if output_cadence is not None:
+        if checkpoint_every is not None:
+            raise ValueError("output_cadence can't be used with checkpoint_every, a resumed run writes the counts with MCell's fixed period.")
+        output_cadence = make_cadence(output_cadence)
+    if viz_output is not None:
+        viz_output = make_viz_output(viz_output)
+
+    # MCell configuration of the run, the partition sizes may come from partition_config.json (see partition_tuner.py)
+    config = {
+        "time_step": model.config.time_step,
+        "partition_dimension": model.config.partition_dimension,
+        "subpartition_dimension": model.config.subpartition_dimension,
+    }
+
+    # Return the earlier run if this exact run has already been done
+    if use_cache:
+        run_options = {"count_every_n_timesteps": count_every_n_timesteps, "steady_state": steady_state,
+                       "chunk_iterations": chunk_iterations if steady_state is not None else None}
+        if output_cadence is not None:
+            run_options["output_cadence"] = output_cadence
+        if viz_output is not None:
+            run_options["viz_output"] = viz_output
+        cache_key = run_cache_key(bngl_file, parameter_overrides, seed, config, run_options, mcell_param_file)
+        cached_run = find_cached_run(cache_key, output_folder)
+        if cached_run is not None:
+            print(f"Identical run already done, using {cached_run[0]}.")
+            return cached_run
+
+    # Call the function and capture the path to the run folder and timestamp
+    with perf.phase("prepare_out_folder"):
+        # The tuned partition sizes are copied with the run too, mcell_params.py alone doesn't say which were used
+        files_to_copy = [bngl_file, mcell_param_file]
+        if os.path.exists(PARTITION_CONFIG_FILE):
+            files_to_copy.append(PARTITION_CONFIG_FILE)
+        run_folder, timestamp = prepare_out_folder(output_folder, model.config.seed, files_to_copy=files_to_copy)
+    if run_folder_callback is not None:
+        run_folder_callback(run_folder, timestamp)
 
     #  If no overrides are provided, 
     #  passing an empty dictionary ensures the model behaves as it would without any overrides.
@@ -38,18 +99,21 @@ def run_model(parameter_overrides=None, bngl_file="dodecamer_NMDAR.bngl"):
         parameter_overrides = {}
 
     # Load the BNGL file and apply the parameter overrides
-    model.load_bngl(
-        os.path.join(run_folder, bngl_file), 
-        observables_path_or_file=os.path.join(run_folder, f"{timestamp}_out.gdat"),
-        parameter_overrides=parameter_overrides
-    )
+    with perf.phase("load_bngl"):
+        model.load_bngl(
+            os.path.join(run_folder, os.path.basename(bngl_file)), 
+            observables_path_or_file=os.path.join(run_folder, f"{timestamp}_out.gdat"),
+            parameter_overrides=parameter_overrides
+        )
     
     # Specifies periodicity of visualization output
     for count in model.counts:
-        count.every_n_timesteps = 50000
+        # With an output cadence the counts are only computed when they are read (every_n_timesteps = 0)
+        count.every_n_timesteps = count_every_n_timesteps if output_cadence is None else 0
 
     # Process the parameters and save them to CSV
-    ITERATIONS, df = process_parameters(bngl_file, run_folder, timestamp, parameter_overrides)
+    with perf.phase("process_parameters"):
+        ITERATIONS, df = process_parameters(os.path.basename(bngl_file), run_folder, timestamp, parameter_overrides)
 
     # Check to see if total iterations is defined as a global parameter
     if ITERATIONS is None:
@@ -58,12 +122,151 @@ def run_model(parameter_overrides=None, bngl_file="dodecamer_NMDAR.bngl"):
     # Set the total iterations (use the ITERATIONS from the BNGL or the overridden one)
     model.config.total_iterations = ITERATIONS
 
+    # Keep a record of how this run was started, needed to resume it
+    save_run_info(run_folder, timestamp, parameter_overrides=parameter_overrides, seed=seed,
+                  bngl_file=bngl_file, ITERATIONS=ITERATIONS, mcell_config=config)
+
     # Initialize, export, and run the model
-    model.initialize()
-    model.run_iterations(ITERATIONS)
-    model.end_simulation()
+    with perf.phase("initialize"):
+        model.initialize()
+        count_writer = None
+        if output_cadence is not None:
+            count_writer = CountWriter(model, os.path.join(run_folder, f"{timestamp}_out.gdat"), output_cadence, ITERATIONS)
+        # Save viz_data under timestamped folder
+        viz_writer = None
+        if viz_output is not None:
+            viz_writer = VizWriter(model, run_folder, timestamp, viz_output, ITERATIONS)
+        writers = [writer for writer in (count_writer, viz_writer) if writer is not None]
+    perf.start_sampling()
+    with perf.phase("run_iterations"):
+        if chunk_iterations is None and steady_state is None and checkpoint_every is None and not writers:
+            # Run in blocks only to sample the speed along the run, the result is the same as a single run_iterations() call
+            sample_every = max(1, int(ITERATIONS // PERF_SAMPLES))
+            iterations_run = 0
+            while iterations_run < ITERATIONS:
+                n = int(min(sample_every, ITERATIONS - iterations_run))
+                model.run_iterations(n)
+                iterations_run += n
+                perf.sample(iterations_run)
+        else:
+            iterations_run = run_in_chunks(model, ITERATIONS, chunk_iterations or count_every_n_timesteps, steady_state,
+                                           run_folder, timestamp, checkpoint_every=checkpoint_every, perf=perf,
+                                           writers=writers)
+        # The last rows and frames are taken before end_simulation(), while the molecules can still be read
+        for writer in writers:
+            writer.close(iterations_run)
+    with perf.phase("end_simulation"):
+        model.end_simulation()
+        if count_writer is not None:
+            count_writer.finish()
+
+    # Record where the time went, also used to predict the runtime of future runs (see runtime_predictor.py)
+    run_seconds = perf.phases["run_iterations"]["wall_seconds"]
+    perf.write(os.path.join(run_folder, f"{timestamp}_perf.json"),
+               iterations=int(iterations_run),
+               run_seconds=run_seconds,
+               iterations_per_second=iterations_run / run_seconds if run_seconds > 0 else None)
+
+    if use_cache:
+        record_run(cache_key, run_folder, timestamp)
 
     return run_folder, timestamp, df
 
+def run_in_chunks(model, ITERATIONS, chunk_iterations, steady_state, run_folder, timestamp, checkpoint_every=None, perf=None,
+                  writers=None):
+    """
+    Advances an initialized model in blocks of chunk_iterations, optionally stopping early at steady state
+    and saving a checkpoint every checkpoint_every iterations.
+    If a PerfRecorder is given (see run_telemetry.py), the speed is sampled after every block.
+    If writers are given (CountWriter from output_cadence.py, VizWriter from viz_export.py), the model also stops
+    at every iteration one of them has to write at.
+
+    The iteration the run stopped at is saved to <timestamp>_termination.json in the run folder.
+    The .gdat stays well-formed, MCell writes the counts up to that iteration when end_simulation() is called.
+    """
+    criterion = make_criterion(steady_state) if steady_state is not None else None
+
+    # Observables the steady state criterion looks at
+    tracked_counts = list(model.counts)
+    if criterion is not None and criterion['observables'] is not None:
+        wanted = [name.lower() for name in criterion['observables']]
+        tracked_counts = [count for count in model.counts if count.name.lower() in wanted]
+
+    history = []
+    iterations_done = 0
+    reached_steady_state = False
+    next_check = chunk_iterations
+    next_checkpoint = checkpoint_every if checkpoint_every else ITERATIONS
+    while iterations_done < ITERATIONS:
+        # Stop at whichever comes first: the end of the block, the next checkpoint, the next output or the end of the run
+        next_output = min([writer.next_output(iterations_done) for writer in writers or []] + [ITERATIONS])
+        n = int(min(next_check, next_checkpoint, next_output, ITERATIONS) - iterations_done)
+        model.run_iterations(n)
+        iterations_done += n
+        for writer in writers or []:
+            writer.record(iterations_done)
+
+        if checkpoint_every and iterations_done >= next_checkpoint and iterations_done < ITERATIONS:
+            save_checkpoint(model, run_folder, iterations_done)
+            next_checkpoint += checkpoint_every
+
+        if iterations_done < next_check:
+            continue
+        next_check += chunk_iterations
+        if perf is not None:
+            perf.sample(iterations_done)
+
+        if criterion is None:
+            continue
+        history.append([count.get_current_value() for count in tracked_counts])
+        if iterations_done >= criterion['min_iterations'] and is_steady(history, criterion):
+            reached_steady_state = True
+            print(f"Observables reached steady state at iteration {iterations_done} of {int(ITERATIONS)}, stopping early.")
+            break
+
+    termination = {
+        "total_iterations": int(ITERATIONS),
+        "termination_iteration": int(iterations_done),
+        "chunk_iterations": int(chunk_iterations),
+        "reached_steady_state": reached_steady_state,
+        "steady_state_criterion": criterion,
+    }
+    with open(os.path.join(run_folder, f"{timestamp}_termination.json"), 'w') as f:
+        json.dump(termination, f, indent=4)
+
+    return iterations_done
+
+def resume_run(run_folder):
+    """
+    Continues a run from the latest checkpoint saved in its run folder (see checkpoint_every in run_model()).
+
+    MCell saves a checkpoint as a generated model.py, which restores the molecules, the iteration and 
+    the random number generator state, and appends the remaining counts to the existing *_out.gdat.
+    It is run from the directory the original run was started from, so the .gdat path in it still points to the run folder.
+    The remaining iterations are run in one go (no more checkpoints or steady state checks).
+
+    Returns:
+        The iteration the run was resumed from.
+    """
+    checkpoint_dir = latest_checkpoint(run_folder)
+    if checkpoint_dir is None:
+        raise FileNotFoundError(f"No complete checkpoint found in {run_folder}.")
+
+    info = load_run_info(run_folder)
+    iteration = checkpoint_iteration(checkpoint_dir)
+    print(f"Resuming {run_folder} from iteration {iteration} of {int(info['ITERATIONS'])}.")
+
+    subprocess.run([sys.executable, os.path.join(os.path.abspath(checkpoint_dir), "model.py")], cwd=info["cwd"], check=True)
+
+    with open(os.path.join(run_folder, f"{info['timestamp']}_resumed.json"), 'a') as f:
+        f.write(json.dumps({"resumed_from_iteration": iteration, "checkpoint": checkpoint_dir}) + "\n")
+    print(f"Run {run_folder} finished after resuming from iteration {iteration}.")
+
+    return iteration
+
 if __name__ == "__main__":
-    run_model()  # This will only run if run_model.py is executed directly, not when importing the script into other files.
+    # python run_model.py --resume <run_folder> continues a run from its latest checkpoint
+    if len(sys.argv) == 3 and sys.argv[1] == "--resume":
+        resume_run(sys.argv[2])
+    else:
+        run_model()  # This will only run if run_model.py is executed directly, not when importing the script into other files.
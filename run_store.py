@@ -0,0 +1,204 @@
+# This is the script where I convert the .gdat of each run to binary columns, so analysis can memory-map them instead of parsing text
+import os
+import sys
+import glob
+import json
+import shutil
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from gdat_io import read_gdat, HeaderIndex
+from sweep_ledger import gdat_is_complete
+
+"""
+The .gdat stays the archival copy of a run's counts. Next to it, `ingest` writes <run_folder>/<timestamp>_store/ with:
+- time.npy: the time axis (float64),
+- columns/<observable>.npy: one file per observable, int32 when all its values are whole numbers (molecule counts),
+  float64 otherwise,
+- meta.json: the observable names in .gdat order, the dtype of each column, the run's parameters (from its
+  _parameters.csv), seed and overrides (from its _run_info.json), and the size and modification time of the .gdat
+  it was made from. If the .gdat changes (e.g. a run continued from a checkpoint), the store is made again.
+
+Every column is opened with np.load(mmap_mode='r'), so pulling one observable out of hundreds of runs only reads that
+column from disk:
+
+    python run_store.py ingest data_output
+
+    values = observable_across_runs("data_output", "CaMKII_open")   # run folder -> (time, counts), memory-mapped
+    store = open_run(run_folder); store.column("camkii_open"); store.parameters['kon_CaMKII_NMDAR']
+"""
+
+STORE_SUFFIX = "_store"
+
+def store_folder(gdat_file):
+    # <run_folder>/<timestamp>_out.gdat -> <run_folder>/<timestamp>_store
+    return gdat_file[:-len("_out.gdat")] + STORE_SUFFIX
+
+def _source_stamp(gdat_file):
+    stat = os.stat(gdat_file)
+    return {"source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns}
+
+def _run_metadata(run_folder, timestamp):
+    parameters, run_info = {}, {}
+    param_file = os.path.join(run_folder, f"{timestamp}_parameters.csv")
+    if os.path.exists(param_file):
+        params = pd.read_csv(param_file)
+        parameters = {name: float(value) for name, value
+                      in zip(params['Parameter'], pd.to_numeric(params['Value'], errors='coerce'))}
+    info_file = os.path.join(run_folder, f"{timestamp}_run_info.json")
+    if os.path.exists(info_file):
+        with open(info_file, 'r') as f:
+            run_info = json.load(f)
+    return {"parameters": parameters, "seed": run_info.get("seed"),
+            "parameter_overrides": run_info.get("parameter_overrides"), "bngl_file": run_info.get("bngl_file")}
+
+def is_up_to_date(gdat_file):
+    """
+    True if the store of this .gdat exists and was made from the .gdat as it is now.
+    """
+    meta_file = os.path.join(store_folder(gdat_file), "meta.json")
+    if not os.path.exists(meta_file):
+        return False
+    with open(meta_file, 'r') as f:
+        meta = json.load(f)
+    stamp = _source_stamp(gdat_file)
+    return all(meta.get(key) == value for key, value in stamp.items())
+
+def convert_run(run_folder, force=False):
+    """
+    Writes the binary store of the run's *_out.gdat, unless it is already up to date.
+
+    Returns the store folder, or None if the run has no complete .gdat (still running, or crashed).
+    """
+    data_files = glob.glob(os.path.join(run_folder, "*_out.gdat"))
+    if len(data_files) != 1 or not gdat_is_complete(run_folder):
+        return None
+    gdat_file = data_files[0]
+    folder = store_folder(gdat_file)
+    if not force and is_up_to_date(gdat_file):
+        return folder
+
+    stamp = _source_stamp(gdat_file)
+    data, header_index = read_gdat(gdat_file)
+    names = header_index.names[1:]
+    timestamp = os.path.basename(gdat_file)[:-len("_out.gdat")]
+
+    # Written to a temporary folder and moved in place, so a reader never sees a half-written store
+    tmp_folder = folder + ".tmp"
+    shutil.rmtree(tmp_folder, ignore_errors=True)
+    os.makedirs(os.path.join(tmp_folder, "columns"))
+    np.save(os.path.join(tmp_folder, "time.npy"), data[:, 0])
+    dtypes = {}
+    for idx, name in enumerate(names, start=1):
+        column = data[:, idx]
+        if np.all(column == np.round(column)) and np.all(np.abs(column) < 2 ** 31):
+            column = column.astype(np.int32)
+        dtypes[name] = column.dtype.name
+        np.save(os.path.join(tmp_folder, "columns", f"{name}.npy"), column)
+
+    meta = {"source": os.path.basename(gdat_file), **stamp, "n_rows": len(data), "names": names,
+            "dtypes": dtypes, **_run_metadata(run_folder, timestamp)}
+    with open(os.path.join(tmp_folder, "meta.json"), 'w') as f:
+        json.dump(meta, f, indent=4)
+
+    shutil.rmtree(folder, ignore_errors=True)
+    os.replace(tmp_folder, folder)
+    return folder
+
+def find_run_folders(base_dir="data_output", exclude=()):
+    # Every folder under base_dir with a *_out.gdat (run folders, also the ones inside ensemble folders),
+    # except the ones inside a folder named in exclude
+    return sorted({os.path.dirname(gdat_file)
+                   for gdat_file in glob.glob(os.path.join(base_dir, "**", "*_out.gdat"), recursive=True)
+                   if not set(os.path.normpath(os.path.relpath(gdat_file, base_dir)).split(os.sep)[:-1]) & set(exclude)})
+
+def ingest(base_dir="data_output", force=False, exclude=()):
+    """
+    Converts every run under base_dir whose store is missing or older than its .gdat.
+    Runs inside a folder named in exclude (e.g. "warm_start") are left out.
+    Returns the list of store folders.
+    """
+    converted, up_to_date, skipped, folders = 0, 0, 0, []
+    for run_folder in find_run_folders(base_dir, exclude):
+        gdat_files = glob.glob(os.path.join(run_folder, "*_out.gdat"))
+        was_up_to_date = len(gdat_files) == 1 and not force and is_up_to_date(gdat_files[0])
+        folder = convert_run(run_folder, force=force)
+        if folder is None:
+            skipped += 1
+            print(f"Skipping {run_folder}, its .gdat is missing or incomplete.")
+            continue
+        folders.append(folder)
+        if was_up_to_date:
+            up_to_date += 1
+        else:
+            converted += 1
+    print(f"Converted {converted} runs, {up_to_date} already up to date, {skipped} skipped.")
+    return folders
+
+class RunStore:
+    """
+    The binary store of one run, columns are memory-mapped when asked for.
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        with open(os.path.join(folder, "meta.json"), 'r') as f:
+            self.meta = json.load(f)
+        self.names = self.meta["names"]
+        self.parameters = self.meta["parameters"]
+        self.seed = self.meta["seed"]
+        self._index = HeaderIndex(["time"] + self.names)
+
+    @property
+    def time(self):
+        return np.load(os.path.join(self.folder, "time.npy"), mmap_mode='r')
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def observable_name(self, name):
+        # The name as written in the .gdat, name is case-insensitive
+        if name not in self._index:
+            raise KeyError(f"No observable '{name}' in {self.folder}")
+        return self.names[self._index[name] - 1]
+
+    def column(self, name):
+        return np.load(os.path.join(self.folder, "columns", f"{self.observable_name(name)}.npy"), mmap_mode='r')
+
+def open_run(run_folder):
+    """
+    Opens the store of a run, converting its .gdat first if the store is missing or out of date.
+    """
+    folder = convert_run(run_folder)
+    if folder is None:
+        raise FileNotFoundError(f"No complete *_out.gdat in {run_folder}.")
+    return RunStore(folder)
+
+def observable_across_runs(base_dir, name, convert=True):
+    """
+    Returns {run folder: (time, values)} for one observable in every run under base_dir, both memory-mapped.
+    With convert=True, runs without an up-to-date store are converted first.
+    """
+    if convert:
+        ingest(base_dir)
+    values = {}
+    for meta_file in sorted(glob.glob(os.path.join(base_dir, "**", f"*{STORE_SUFFIX}", "meta.json"), recursive=True)):
+        store = RunStore(os.path.dirname(meta_file))
+        if name in store:
+            values[os.path.dirname(store.folder)] = (store.time, store.column(name))
+    return values
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Binary columnar store of the run outputs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    ingest_parser = subparsers.add_parser("ingest", help="convert every run's .gdat that is new or has changed")
+    ingest_parser.add_argument("base_dir", nargs="?", default="data_output")
+    ingest_parser.add_argument("--force", action="store_true", help="convert every run again")
+    args = parser.parse_args(argv)
+
+    if args.command == "ingest":
+        ingest(args.base_dir, force=args.force)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
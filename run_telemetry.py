@@ -0,0 +1,88 @@
+# This is the script where I record where the time and memory of a run go
+import os
+import json
+import time
+from contextlib import contextmanager
+
+from process_memory import get_rss_mb, get_peak_rss_mb, reset_peak_rss
+
+"""
+run_model() times each phase of a run (set_up_model, prepare_out_folder, load_bngl, process_parameters,
+initialize, run_iterations, end_simulation) and samples the speed along the run, then saves it all
+to <timestamp>_perf.json in the run folder, next to <timestamp>_parameters.csv.
+
+MCell writes the counts during run_iterations, so the count output is part of that phase
+(and of end_simulation, which writes what is left).
+
+peak_rss_mb is the peak memory of this run only, also when a pool or warm worker does many runs in one process:
+the process peak is reset when the run starts (Linux), otherwise it is the largest of the sampled values
+(getrusage() would give the peak over the whole life of the process, which can come from an earlier run).
+"""
+
+# Number of speed samples taken along a run
+PERF_SAMPLES = 100
+
+class PerfRecorder:
+    def __init__(self):
+        self.phases = {}
+        self.samples = []
+        self.start = time.perf_counter()
+        self._last_sample = None
+        # So the peak memory read at the end is the one of this run
+        self._peak_reset = reset_peak_rss()
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Times the code inside the with block:
+
+            with perf.phase("initialize"):
+                model.initialize()
+        """
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.phases[name] = {
+                "wall_seconds": time.perf_counter() - wall_start,
+                "cpu_seconds": time.process_time() - cpu_start,
+                "rss_mb": get_rss_mb(os.getpid()),
+            }
+
+    def start_sampling(self, iteration=0):
+        self._last_sample = (iteration, time.perf_counter())
+
+    def sample(self, iteration):
+        """
+        Records the speed (iterations per second) since the last sample, call it after each block of iterations.
+        """
+        now = time.perf_counter()
+        if self._last_sample is None:
+            self._last_sample = (0, self.start)
+        last_iteration, last_time = self._last_sample
+        if now > last_time and iteration > last_iteration:
+            self.samples.append({
+                "iteration": int(iteration),
+                "elapsed_seconds": now - self.start,
+                "iterations_per_second": (iteration - last_iteration) / (now - last_time),
+                "rss_mb": get_rss_mb(os.getpid()),
+            })
+        self._last_sample = (iteration, now)
+
+    def write(self, perf_file, **info):
+        """
+        Saves the phases, samples and peak memory to perf_file, with any other values given (e.g. iterations).
+        """
+        sampled_rss = [value["rss_mb"] for value in list(self.phases.values()) + self.samples if value["rss_mb"] is not None]
+        run_peak = get_peak_rss_mb() if self._peak_reset else None
+        peak = max([value for value in [run_peak] + sampled_rss if value is not None], default=None)
+        perf = {
+            **info,
+            "total_wall_seconds": time.perf_counter() - self.start,
+            "peak_rss_mb": peak,
+            "phases": self.phases,
+            "samples": self.samples,
+        }
+        with open(perf_file, 'w') as f:
+            json.dump(perf, f, indent=4)
+        return perf
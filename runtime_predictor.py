@@ -0,0 +1,213 @@
+# This is the script where I predict how long a run will take from the runs already done
+import os
+import sys
+import glob
+import json
+import heapq
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from bngl_parameters import load_bngl_parameters
+from bngl_cache import load_parameters_cached
+
+"""
+Runs with high kon_CaMKII_NMDAR or Ca_i have many more reactions per iteration and take much longer.
+This script fits a runtime model to the telemetry of past runs (the <timestamp>_perf.json and
+<timestamp>_parameters.csv in each run folder):
+
+    log(seconds per iteration) = b0 + sum_i b_i * log10(parameter_i)
+
+and uses it to order a sweep longest-first (so the slow runs don't all end up at the end)
+and to give an ETA for a design before submitting it:
+
+    python runtime_predictor.py fit
+    python runtime_predictor.py eta --design sweep_design.csv --workers 64
+"""
+
+MODEL_FILE = os.path.join("data_output", "runtime_model.json")
+
+# Small ridge penalty, keeps the fit stable when there are few runs or parameters move together
+RIDGE = 1e-3
+
+def collect_telemetry(base_dir="data_output"):
+    """
+    Returns a DataFrame with one row per finished run: its parameters, ITERATIONS and iterations per second.
+    """
+    rows = []
+    for perf_file in glob.glob(os.path.join(base_dir, "**", "*_perf.json"), recursive=True):
+        run_folder = os.path.dirname(perf_file)
+        timestamp = os.path.basename(perf_file)[:-len("_perf.json")]
+        param_file = os.path.join(run_folder, f"{timestamp}_parameters.csv")
+        if not os.path.exists(param_file):
+            continue
+
+        with open(perf_file, 'r') as f:
+            perf = json.load(f)
+        if not perf.get("iterations_per_second"):
+            continue
+
+        params = pd.read_csv(param_file)
+        row = dict(zip(params['Parameter'], pd.to_numeric(params['Value'], errors='coerce')))
+        row["iterations_per_second"] = perf["iterations_per_second"]
+        row["run_folder"] = run_folder
+        rows.append(row)
+
+    telemetry = pd.DataFrame(rows)
+    print(f"Found telemetry for {len(telemetry)} runs in {base_dir}.")
+    return telemetry
+
+def _features(values, feature_names):
+    # log10 of each parameter (parameters at 0 or below are clipped to a tiny value)
+    for row in values:
+        missing = [name for name in feature_names if name not in row]
+        if missing:
+            raise ValueError(f"Parameter(s) {missing} used by the runtime model are not in the parameters to predict from "
+                             f"(was the model fitted on runs of another BNGL file?).")
+    return np.log10(np.maximum(np.array([[row[name] for name in feature_names] for row in values], dtype=float), 1e-300))
+
+def _load_parameters(bngl_file, overrides_list):
+    # The model is fitted on the _parameters.csv values, which MCell's loader wrote, so predict from that loader too.
+    # Without MCell (e.g. an ETA on a login node) the python evaluator is used, which may not give the same values.
+    try:
+        import mcell_params  # imports MCell from MCELL_PATH
+        loader = mcell_params.m.bngl_utils.load_bngl_parameters
+    except ImportError:
+        print("MCell not found, predicting from the bngl_parameters.py values, check they match MCell's with "
+              "'python bngl_parameters.py --check-mcell <bngl file>'.")
+        loader = load_bngl_parameters
+    return [load_parameters_cached(bngl_file, parameter_overrides, loader=loader) for parameter_overrides in overrides_list]
+
+class RuntimeModel:
+    def __init__(self, feature_names=None, coefficients=None, intercept=0.0, n_runs=0):
+        self.feature_names = feature_names or []
+        self.coefficients = np.array(coefficients if coefficients is not None else [], dtype=float)
+        self.intercept = float(intercept)
+        self.n_runs = n_runs
+
+    @classmethod
+    def fit(cls, telemetry, feature_names=None):
+        """
+        Fits the model to the telemetry from collect_telemetry().
+
+        feature_names: parameters to use, by default every parameter that changes between the runs.
+        With fewer runs than features, only the average speed is fitted.
+        """
+        if len(telemetry) == 0:
+            raise ValueError("No telemetry to fit, run some models first.")
+
+        target = np.log(1 / telemetry["iterations_per_second"].to_numpy(dtype=float))  # log(seconds per iteration)
+
+        if feature_names is None:
+            numeric = telemetry.drop(columns=["iterations_per_second", "run_folder", "ITERATIONS"], errors='ignore')
+            numeric = numeric.select_dtypes(include=[np.number])
+            feature_names = [name for name in numeric.columns
+                             if numeric[name].notna().all() and (numeric[name] > 0).all() and numeric[name].nunique() > 1]
+        if len(telemetry) <= len(feature_names) + 1:
+            print(f"Only {len(telemetry)} runs for {len(feature_names)} varying parameters, using the average speed.")
+            feature_names = []
+
+        X = _features(telemetry.to_dict('records'), feature_names)
+        if feature_names:
+            mean = X.mean(axis=0)
+            Xc = X - mean
+            coefficients = np.linalg.solve(Xc.T @ Xc + RIDGE * len(X) * np.eye(len(feature_names)), Xc.T @ (target - target.mean()))
+            intercept = target.mean() - mean @ coefficients
+        else:
+            coefficients = np.array([])
+            intercept = target.mean()
+
+        model = cls(feature_names, coefficients, intercept, len(telemetry))
+        print(f"Runtime model fitted on {len(telemetry)} runs, parameters: {feature_names or 'none (average speed)'}")
+        return model
+
+    def seconds_per_iteration(self, param_dicts):
+        X = _features(param_dicts, self.feature_names) if self.feature_names else np.zeros((len(param_dicts), 0))
+        return np.exp(self.intercept + X @ self.coefficients)
+
+    def predict_seconds(self, overrides_list, bngl_file="dodecamer_NMDAR.bngl"):
+        """
+        Predicted run time in seconds of each set of overrides (ITERATIONS is taken from the evaluated parameters).
+        """
+        param_dicts = _load_parameters(bngl_file, overrides_list)
+        iterations = np.array([params.get('ITERATIONS', 100) for params in param_dicts], dtype=float)
+        return iterations * self.seconds_per_iteration(param_dicts)
+
+    def save(self, model_file=MODEL_FILE):
+        folder = os.path.dirname(model_file)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(model_file, 'w') as f:
+            json.dump({"feature_names": self.feature_names, "coefficients": self.coefficients.tolist(),
+                       "intercept": self.intercept, "n_runs": self.n_runs}, f, indent=4)
+        print(f"Runtime model saved to {model_file}")
+
+    @classmethod
+    def load(cls, model_file=MODEL_FILE):
+        with open(model_file, 'r') as f:
+            return cls(**json.load(f))
+
+def load_runtime_model(model_file=MODEL_FILE):
+    # The saved model, or None if none has been fitted yet
+    if not os.path.exists(model_file):
+        return None
+    return RuntimeModel.load(model_file)
+
+def longest_first(overrides_list, runtime_model, bngl_file="dodecamer_NMDAR.bngl"):
+    """
+    Returns the order (list of indices into overrides_list) with the longest predicted runs first.
+    """
+    seconds = runtime_model.predict_seconds(overrides_list, bngl_file)
+    return [int(i) for i in np.argsort(-seconds, kind='stable')]
+
+def estimate_eta(overrides_list, runtime_model, n_workers=1, bngl_file="dodecamer_NMDAR.bngl"):
+    """
+    Estimates the wall time of a sweep run longest-first on n_workers, by giving each run to the first free worker.
+
+    Returns:
+    - dict with the wall time (seconds), the total CPU time (seconds) and the longest single run (seconds).
+    """
+    seconds = np.sort(runtime_model.predict_seconds(overrides_list, bngl_file))[::-1]
+    workers = [0.0] * max(1, n_workers)
+    for duration in seconds:
+        heapq.heappush(workers, heapq.heappop(workers) + duration)
+    eta = {
+        "n_runs": len(seconds),
+        "n_workers": n_workers,
+        "wall_seconds": max(workers),
+        "cpu_seconds": float(seconds.sum()),
+        "longest_run_seconds": float(seconds[0]) if len(seconds) else 0.0,
+    }
+    print(f"{eta['n_runs']} runs on {n_workers} workers: about {eta['wall_seconds'] / 3600:.1f} h "
+          f"({eta['cpu_seconds'] / 3600:.1f} CPU hours, longest run {eta['longest_run_seconds'] / 3600:.1f} h)")
+    return eta
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit a runtime model to past runs, or estimate the time of a sweep.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    fit_parser = subparsers.add_parser("fit", help="fit the runtime model to the runs in a folder")
+    fit_parser.add_argument("--base-dir", default="data_output")
+
+    eta_parser = subparsers.add_parser("eta", help="estimate how long a design table will take")
+    eta_parser.add_argument("--design", required=True, help="design table .csv (see samplers.py)")
+    eta_parser.add_argument("--workers", type=int, default=1)
+    eta_parser.add_argument("--replicates", type=int, default=1)
+    eta_parser.add_argument("--bngl", default="dodecamer_NMDAR.bngl")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "fit":
+        RuntimeModel.fit(collect_telemetry(args.base_dir)).save()
+    else:
+        from samplers import design_to_overrides
+        runtime_model = load_runtime_model()
+        if runtime_model is None:
+            print(f"No runtime model in {MODEL_FILE}, run 'python runtime_predictor.py fit' first.")
+            return
+        overrides_list = design_to_overrides(args.design) * args.replicates
+        estimate_eta(overrides_list, runtime_model, args.workers, args.bngl)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
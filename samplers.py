@@ -0,0 +1,130 @@
+# This is the script where I make the design table (which parameter values to run) for a global sensitivity sweep
+import numpy as np
+import pandas as pd
+from scipy.stats import qmc
+
+"""
+Instead of running every combination of values (itertools.product), which explodes with the number of parameters,
+these samplers spread a chosen number of points over the whole parameter space:
+
+- latin_hypercube: every parameter range is cut into n_samples slices and each slice is used exactly once.
+- sobol: scrambled Sobol sequence, fills the space more evenly than random points (best with a power of 2 samples).
+- morris: trajectories that change one parameter at a time, for Morris elementary effects screening.
+
+Parameter ranges are given as a dictionary:
+    ranges = {
+        'kon_CaMKII_NMDAR': (2e3, 2e7, 'log'),   # (low, high, 'log' or 'linear')
+        'koff_CaMKII_NMDAR': (3e-4, 3, 'log'),
+        'k_P_CaMKII286': (0.5, 1.5, 'linear'),
+    }
+The design table has one row per run and one column per parameter, and is read by global_sensitivity_run.design_sweep().
+"""
+
+# Columns of the design table that are not parameters
+DESIGN_META_COLUMNS = ['point', 'trajectory', 'step']
+
+def scale_to_ranges(unit_samples, ranges):
+    """
+    Turns samples in the unit cube [0, 1]^d into parameter values, column by column, on a log or linear scale.
+    """
+    design = {}
+    for column, (name, (low, high, scale)) in enumerate(ranges.items()):
+        u = unit_samples[:, column]
+        if scale == 'log':
+            if low <= 0 or high <= 0:
+                raise ValueError(f"Log range for '{name}' must be positive, got ({low}, {high}).")
+            design[name] = 10 ** (np.log10(low) + u * (np.log10(high) - np.log10(low)))
+        elif scale == 'linear':
+            design[name] = low + u * (high - low)
+        else:
+            raise ValueError(f"Unknown scale '{scale}' for '{name}'. Use 'log' or 'linear'.")
+
+    design = pd.DataFrame(design)
+    design.insert(0, 'point', np.arange(len(design)))
+    return design
+
+def latin_hypercube(ranges, n_samples, seed=None):
+    sampler = qmc.LatinHypercube(d=len(ranges), seed=seed)
+    return scale_to_ranges(sampler.random(n_samples), ranges)
+
+def sobol(ranges, n_samples, seed=None):
+    sampler = qmc.Sobol(d=len(ranges), scramble=True, seed=seed)
+    m = int(np.log2(n_samples))
+    if 2**m == n_samples:
+        unit_samples = sampler.random_base2(m)
+    else:
+        print(f"Warning: Sobol points are best used in powers of 2, {n_samples} was asked for.")
+        unit_samples = sampler.random(n_samples)
+    return scale_to_ranges(unit_samples, ranges)
+
+def morris(ranges, n_trajectories, n_levels=4, seed=None):
+    """
+    Morris trajectories: each one starts at a random point of a grid with n_levels per parameter,
+    then moves one parameter at a time (in random order) by delta = n_levels / (2 * (n_levels - 1)).
+    Each trajectory has len(ranges) + 1 points, so the design has n_trajectories * (len(ranges) + 1) rows.
+    """
+    rng = np.random.default_rng(seed)
+    n_params = len(ranges)
+    delta = n_levels / (2 * (n_levels - 1))
+
+    # Only start from levels where the step up by delta stays inside [0, 1]
+    start_levels = np.arange(n_levels)[np.arange(n_levels) / (n_levels - 1) + delta <= 1 + 1e-12] / (n_levels - 1)
+
+    unit_samples = []
+    trajectory_ids = []
+    steps = []
+    for trajectory in range(n_trajectories):
+        point = rng.choice(start_levels, size=n_params)
+        # Randomly step up from the start point or down from the point delta above it
+        directions = rng.choice([1, -1], size=n_params)
+        point = np.where(directions == -1, point + delta, point)
+
+        unit_samples.append(point.copy())
+        for step, param in enumerate(rng.permutation(n_params), start=1):
+            point[param] += directions[param] * delta
+            unit_samples.append(point.copy())
+        trajectory_ids += [trajectory] * (n_params + 1)
+        steps += list(range(n_params + 1))
+
+    design = scale_to_ranges(np.clip(np.array(unit_samples), 0, 1), ranges)
+    design.insert(1, 'trajectory', trajectory_ids)
+    design.insert(2, 'step', steps)
+    return design
+
+SAMPLERS = {
+    'latin_hypercube': latin_hypercube,
+    'sobol': sobol,
+    'morris': morris,
+}
+
+def make_design(ranges, n, method='latin_hypercube', seed=None, output_csv=None):
+    """
+    Makes a design table with the chosen sampler and saves it to output_csv if given.
+
+    For 'morris', n is the number of trajectories, for the others the number of points.
+    """
+    if method not in SAMPLERS:
+        raise ValueError(f"Unknown method '{method}'. Use one of {list(SAMPLERS)}.")
+
+    design = SAMPLERS[method](ranges, n, seed=seed)
+
+    if output_csv is not None:
+        design.to_csv(output_csv, index=False)
+        print(f"Design table with {len(design)} runs saved to {output_csv}")
+    return design
+
+def design_to_overrides(design):
+    """
+    Turns a design table (DataFrame or csv path) into a list of parameter override dictionaries, one per row.
+    """
+    if isinstance(design, str):
+        design = pd.read_csv(design)
+    param_names = [column for column in design.columns if column not in DESIGN_META_COLUMNS]
+    return [{name: float(row[name]) for name in param_names} for _, row in design.iterrows()]
+
+if __name__ == "__main__":
+    ranges = {
+        'kon_CaMKII_NMDAR': (2e6 * 0.01, 2e6 * 100, 'log'),
+        'koff_CaMKII_NMDAR': (0.03 * 0.01, 0.03 * 100, 'log'),
+    }
+    make_design(ranges, 64, method='sobol', seed=0, output_csv="sweep_design.csv")
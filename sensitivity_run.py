@@ -1,17 +1,19 @@
 import os
 
 from run_model import run_model
+from replicates import run_replicates
+from bngl_validator import preflight
 
 # different 'kon' values to run through
 kon_values = [-10]
 
 koff_values = [-10] 
 
-# Note that if parameter_value does not match, this code currently will not throw an error and will just run with the preset value stated in the .bngl file. 
-# Check the .csv of values to see which 'kon' was used
+# If parameter_name is not a parameter of the .bngl file, the preflight check stops the sweep before the first run
+# (MCell itself would just run with the preset value stated in the .bngl file)
 
 
-def parameter_sweep(values, parameter_name):
+def parameter_sweep(values, parameter_name, n_replicates=None, seeds=None, base_seed=0):
     """
     This (void) function does a parameter sweep by iterating over a list of values for a given parameter.
 
@@ -20,11 +22,19 @@ def parameter_sweep(values, parameter_name):
     Arguments it takes:
     values (list): A list of values to sweep through for the specified parameter.
     parameter_name (str): The name of the parameter to override in each iteration.
+    n_replicates (int) or seeds (list of int): optional, run each value once per seed, 
+    with the replicates of one value running at the same time in one ensemble folder (see replicates.py).
     """
+    preflight("dodecamer_NMDAR.bngl", [{parameter_name: value} for value in values])
     for value in values:
         print(f"Starting run for {parameter_name} = {value}")
         parameter_overrides = {parameter_name: value}
-        run_model(parameter_overrides)
+        if n_replicates is None and seeds is None:
+            run_model(parameter_overrides)
+        else:
+            run_replicates(parameter_overrides, n_replicates=n_replicates, seeds=seeds, base_seed=base_seed)
         print(f"Run completed for {parameter_name} = {value}")
 
-parameter_sweep(kon_values, 'kon_camkii_open')
+# The guard is needed so the worker processes used for replicates can import this file without starting the sweep again
+if __name__ == "__main__":
+    parameter_sweep(kon_values, 'kon_camkii_open')
@@ -0,0 +1,63 @@
+# This is the script where I check if the observables of a run have stopped changing (reached a steady state)
+import numpy as np
+
+"""
+A steady state criterion is a dictionary, for example:
+    steady_state = {
+        'method': 'slope',       # 'slope' or 'variance'
+        'window': 20,            # number of last samples (one per chunk of iterations) to look at
+        'threshold': 0.01,       # see below
+        'observables': None,     # names of the observables to check, None checks all of them
+        'min_iterations': 0,     # never stop before this many iterations
+    }
+
+- 'slope': a straight line is fitted to the last `window` samples of each observable,
+  steady if the change along that line over the window is less than threshold * mean (for every observable).
+- 'variance': steady if the standard deviation of the last `window` samples is less than threshold * mean.
+
+Means below 1 molecule are taken as 1, so observables that stay at (or close to) zero count as steady.
+"""
+
+DEFAULT_CRITERION = {
+    'method': 'slope',
+    'window': 20,
+    'threshold': 0.01,
+    'observables': None,
+    'min_iterations': 0,
+}
+
+def make_criterion(steady_state):
+    # Fill in the defaults for any keys that were not given
+    criterion = {**DEFAULT_CRITERION, **(steady_state or {})}
+    if criterion['method'] not in ('slope', 'variance'):
+        raise ValueError(f"Unknown steady state method '{criterion['method']}'. Use 'slope' or 'variance'.")
+    if criterion['window'] < 2:
+        raise ValueError("The steady state window needs at least 2 samples.")
+    return criterion
+
+def is_steady(history, criterion):
+    """
+    Checks the steady state criterion on the history of sampled observables.
+
+    Arguments:
+    - history (list or array): one row per sample, one column per tracked observable.
+    - criterion (dict): as returned by make_criterion().
+
+    Returns:
+    - bool: True if every observable is steady over the last window of samples.
+    """
+    window = criterion['window']
+    if len(history) < window:
+        return False
+
+    recent = np.asarray(history[-window:], dtype=float)
+    scale = np.maximum(np.abs(recent.mean(axis=0)), 1.0)
+
+    if criterion['method'] == 'slope':
+        x = np.arange(window) - (window - 1) / 2
+        slope = x @ (recent - recent.mean(axis=0)) / (x @ x)  # least squares slope of each column
+        change = np.abs(slope) * (window - 1)
+    else:
+        change = recent.std(axis=0)
+
+    return bool(np.all(change < criterion['threshold'] * scale))
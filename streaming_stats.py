@@ -0,0 +1,217 @@
+# This is the script where I average traces over many runs one run at a time, so memory doesn't grow with the number of runs
+import os
+
+import numpy as np
+
+from gdat_io import read_header, read_gdat, read_final_row, HeaderIndex
+
+"""
+plot_mean_from_gdat.py used to keep every run's trace in memory and then take np.mean/np.std across them.
+TraceAggregator keeps, for every time point (and observable), only:
+- the number of runs, the running mean and the sum of squared differences from it (Welford's algorithm),
+  which give the mean and variance without the precision loss of summing squares,
+- the running min and max,
+- optionally a reservoir of n_quantile_samples whole runs, chosen uniformly at random among all the runs added,
+  for approximate quantiles (exact while there are fewer runs than that).
+So its memory is fixed by the size of one run (times the reservoir size), whatever the number of runs.
+
+Aggregators of the same time axis can be merged (Chan et al.'s parallel update), so each worker can aggregate
+its own runs and the results are combined at the end, giving the same mean and variance as one pass over all runs:
+
+    aggregator = TraceAggregator(time)
+    for values in runs:                 # (time,) or (time, observable) arrays
+        aggregator.add(values)
+    aggregator.merge(other_worker_aggregator)
+    aggregator.mean, aggregator.std(), aggregator.quantile(0.9)
+"""
+
+class TraceAggregator:
+    def __init__(self, time, n_quantile_samples=0, seed=0):
+        self.time = np.asarray(time, dtype=float)
+        self.n_quantile_samples = int(n_quantile_samples)
+        self.rng = np.random.default_rng(seed)
+        self.count = 0
+        self.mean = None
+        self.m2 = None      # sum of squared differences from the mean
+        self.min = None
+        self.max = None
+        self.samples = None # reservoir of whole runs, (n_quantile_samples, time, ...)
+        self.n_samples = 0
+
+    def _on_time_axis(self, values, time):
+        # Values of a run with another time axis, interpolated onto this one
+        # (held at the run's last value past its end, like the ensemble cube)
+        values = np.asarray(values, dtype=float)
+        if time is None or (len(time) == len(self.time) and np.array_equal(time, self.time)):
+            if values.shape[0] != len(self.time):
+                raise ValueError(f"Run has {values.shape[0]} time points, the aggregator has {len(self.time)}.")
+            return values
+        columns = values.reshape(len(time), -1)
+        interpolated = np.column_stack([np.interp(self.time, time, column) for column in columns.T])
+        return interpolated.reshape((len(self.time),) + values.shape[1:])
+
+    def add(self, values, time=None):
+        """
+        Adds one run, values is (time,) or (time, observable). If time (the run's time axis) is given and differs
+        from the aggregator's, the run is interpolated onto it.
+        """
+        values = self._on_time_axis(values, time)
+        if self.mean is None:
+            self.mean = np.zeros_like(values)
+            self.m2 = np.zeros_like(values)
+            self.min = values.copy()
+            self.max = values.copy()
+        elif values.shape != self.mean.shape:
+            raise ValueError(f"Run has shape {values.shape}, the aggregator {self.mean.shape}.")
+
+        self.count += 1
+        delta = values - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (values - self.mean)
+        np.minimum(self.min, values, out=self.min)
+        np.maximum(self.max, values, out=self.max)
+
+        if self.n_quantile_samples:
+            if self.samples is None:
+                self.samples = np.empty((self.n_quantile_samples,) + values.shape)
+            if self.n_samples < self.n_quantile_samples:
+                self.samples[self.n_samples] = values
+                self.n_samples += 1
+            else:
+                slot = self.rng.integers(0, self.count)
+                if slot < self.n_quantile_samples:
+                    self.samples[slot] = values
+        return self
+
+    def merge(self, other):
+        """
+        Adds the runs of another aggregator (same time axis) to this one.
+        """
+        if other.count == 0:
+            return self
+        if not np.array_equal(other.time, self.time):
+            raise ValueError("Only aggregators with the same time axis can be merged.")
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean.copy(), other.m2.copy()
+            self.min, self.max = other.min.copy(), other.max.copy()
+            if other.samples is not None:
+                self.samples, self.n_samples = other.samples.copy(), other.n_samples
+            return self
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 = self.m2 + other.m2 + delta ** 2 * self.count * other.count / count
+        self.mean = self.mean + delta * other.count / count
+        np.minimum(self.min, other.min, out=self.min)
+        np.maximum(self.max, other.max, out=self.max)
+
+        if self.n_quantile_samples and other.samples is not None and self.samples is not None:
+            # Each reservoir stands for its aggregator's runs, take as many from each as a uniform sample of all runs would
+            size = min(self.n_quantile_samples, self.n_samples + other.n_samples)
+            from_self = self.rng.hypergeometric(self.count, other.count, size)
+            from_self = min(max(from_self, size - other.n_samples), self.n_samples)
+            keep_self = self.rng.choice(self.n_samples, from_self, replace=False)
+            keep_other = self.rng.choice(other.n_samples, size - from_self, replace=False)
+            merged = np.concatenate([self.samples[keep_self], other.samples[keep_other]])
+            self.samples[:size] = merged
+            self.n_samples = size
+        self.count = count
+        return self
+
+    def variance(self, ddof=0):
+        if self.count <= ddof:
+            return np.full_like(self.mean, np.nan)
+        return self.m2 / (self.count - ddof)
+
+    def std(self, ddof=0):
+        return np.sqrt(self.variance(ddof))
+
+    def quantile(self, q):
+        """
+        Approximate quantile(s) q (0 to 1) across runs, from the reservoir of runs (needs n_quantile_samples > 0).
+        """
+        if not self.n_samples:
+            raise ValueError("No quantile samples, make the aggregator with n_quantile_samples > 0.")
+        return np.quantile(self.samples[:self.n_samples], q, axis=0)
+
+    def save(self, file):
+        # So a worker can hand its partial result over to be merged
+        arrays = {"time": self.time, "count": self.count, "n_quantile_samples": self.n_quantile_samples}
+        if self.count:
+            arrays.update(mean=self.mean, m2=self.m2, min=self.min, max=self.max)
+        if self.n_samples:
+            arrays.update(samples=self.samples[:self.n_samples])
+        np.savez_compressed(file, **arrays)
+
+    @classmethod
+    def load(cls, file, seed=0):
+        with np.load(file) as data:
+            aggregator = cls(data["time"], int(data["n_quantile_samples"]), seed)
+            aggregator.count = int(data["count"])
+            if aggregator.count:
+                aggregator.mean, aggregator.m2 = data["mean"], data["m2"]
+                aggregator.min, aggregator.max = data["min"], data["max"]
+            if "samples" in data:
+                samples = data["samples"]
+                aggregator.n_samples = len(samples)
+                aggregator.samples = np.empty((aggregator.n_quantile_samples,) + samples.shape[1:])
+                aggregator.samples[:len(samples)] = samples
+        return aggregator
+
+def common_time_axis(gdat_files):
+    """
+    The time axis to aggregate runs on: the first run's times, carried on with the longest run's times after its end.
+    Runs that ended earlier (e.g. stopped at steady state) are held at their last value after their end,
+    the same as in the ensemble cube (see ensemble.py), instead of cutting every run short.
+    Only the first and the longest file are read fully, the end of the others comes from their last row.
+    """
+    ends = {}
+    for gdat_file in gdat_files:
+        try:
+            ends[gdat_file] = read_final_row(gdat_file, allow_truncated=True)[0][0]
+        except ValueError:
+            continue
+    for gdat_file in gdat_files:
+        data, _ = read_gdat(gdat_file, columns=[])
+        if len(data):
+            time = data[:, 0]
+            longest = max(ends, key=ends.get) if ends else gdat_file
+            if longest != gdat_file and ends[longest] > time[-1]:
+                longest_time = read_gdat(longest, columns=[])[0][:, 0]
+                time = np.concatenate([time, longest_time[longest_time > time[-1]]])
+            return time
+    raise ValueError("None of the .gdat files have any rows.")
+
+def aggregate_gdat_files(gdat_files, variables=None, time=None, n_quantile_samples=0, seed=0):
+    """
+    Reads the .gdat files one at a time and returns {variable (lower case): TraceAggregator}.
+
+    Arguments:
+    - variables (list of str): variables to aggregate (case-insensitive), all the ones of the first file by default.
+      A file that doesn't have a variable is left out of that variable only.
+    - time: time axis to aggregate on, by default common_time_axis() of the files.
+    """
+    if time is None:
+        time = common_time_axis(gdat_files)
+    aggregators = {}
+    for gdat_file in gdat_files:
+        print(f"Processing {os.path.basename(gdat_file)}...")
+        header_index = HeaderIndex(read_header(gdat_file))
+        if variables is None:
+            variables = list(header_index.keys())
+        found = [name.lower() for name in variables if name in header_index]
+        for name in variables:
+            if name not in header_index:
+                print(f"Variable '{name}' not found in {os.path.basename(gdat_file)}. Skipping.")
+        if not found:
+            continue
+
+        data, _ = read_gdat(gdat_file, columns=found)
+        if len(data) < 2:
+            print(f"Warning: {os.path.basename(gdat_file)} appears to have an unexpected format. Skipping.")
+            continue
+        for idx, name in enumerate(found, start=1):
+            if name not in aggregators:
+                aggregators[name] = TraceAggregator(time, n_quantile_samples, seed)
+            aggregators[name].add(data[:, idx], data[:, 0])
+    return aggregators
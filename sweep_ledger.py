@@ -0,0 +1,136 @@
+# This is the script where I keep track of which runs of a sweep are done, so an interrupted sweep can be restarted
+import os
+import glob
+import json
+import hashlib
+from datetime import datetime
+
+# States a run can be in
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+def evaluate_overrides(parameter_overrides):
+    """
+    Turns the override values into plain python numbers (numpy floats, ints and '2e6' strings all become floats),
+    so the same point always gives the same key however the values were written.
+    """
+    evaluated = {}
+    for name, value in (parameter_overrides or {}).items():
+        try:
+            evaluated[name] = float(value)
+        except (TypeError, ValueError):
+            evaluated[name] = str(value)  # e.g. an expression, keep it as it is
+    return evaluated
+
+def run_key(parameter_overrides, seed, context=None):
+    # Key of one run: the evaluated overrides (sorted by name) plus the seed, and the sweep context if there is one
+    key_inputs = {"overrides": evaluate_overrides(parameter_overrides), "seed": int(seed)}
+    if context:
+        key_inputs["context"] = context
+    text = json.dumps(key_inputs, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+# run_model() options that don't change the output of a run, left out of the sweep context
+OPTIONS_NOT_IN_KEY = ("output_folder", "use_cache", "run_folder_callback")
+
+def sweep_context(bngl_file, **run_options):
+    """
+    What else the output of a run depends on, besides its overrides and seed: the path and content of the BNGL file,
+    and the run options given (e.g. warm_start, steady_state, output_cadence). Options that are None are left out,
+    so adding a new option to the sweep doesn't change the keys of the runs already done.
+    With it in the keys, editing the BNGL file or changing an option re-runs the points instead of skipping them.
+    """
+    run_options = {name: value for name, value in run_options.items()
+                   if name not in OPTIONS_NOT_IN_KEY and not callable(value)}
+    with open(bngl_file, 'rb') as f:
+        bngl_hash = hashlib.sha1(f.read()).hexdigest()
+    context = {"bngl_file": os.path.normpath(bngl_file), "bngl_hash": bngl_hash}
+    context.update({name: value for name, value in run_options.items() if value is not None})
+    return context
+
+def gdat_is_complete(run_folder):
+    """
+    Checks that the run folder has a non-empty *_out.gdat whose last line was written completely.
+    """
+    if run_folder is None:
+        return False
+    data_files = glob.glob(os.path.join(run_folder, "*_out.gdat"))
+    if len(data_files) != 1 or os.path.getsize(data_files[0]) == 0:
+        return False
+    with open(data_files[0], 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+class SweepLedger:
+    """
+    Records the state (pending, running, done, failed) of every run of a sweep in a file.
+
+    The file has one json line per change of state, and the last line for a run wins.
+    Lines are only ever appended, so if the sweep is killed while writing, at most the last line is lost.
+
+    context (see sweep_context()) is part of the key of every run, so a run done with another BNGL file (or another
+    version of it) or other run options doesn't count as done.
+    """
+    def __init__(self, ledger_file, context=None):
+        self.ledger_file = ledger_file
+        self.context = context
+        self.entries = {}
+
+        folder = os.path.dirname(ledger_file)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        if os.path.exists(ledger_file):
+            with open(ledger_file, 'r') as f:
+                text = f.read()
+            for line in text.splitlines():
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # half-written line from a crash
+                self.entries[entry["key"]] = entry
+
+            # Finish off a half-written last line, so the next entry starts on its own line
+            if text and not text.endswith("\n"):
+                with open(ledger_file, 'a') as f:
+                    f.write("\n")
+
+    def key(self, parameter_overrides, seed):
+        return run_key(parameter_overrides, seed, self.context)
+
+    def state(self, parameter_overrides, seed):
+        entry = self.entries.get(self.key(parameter_overrides, seed))
+        return entry["state"] if entry else PENDING
+
+    def mark(self, parameter_overrides, seed, state, run_folder=None, error=None):
+        entry = {
+            "key": self.key(parameter_overrides, seed),
+            "overrides": evaluate_overrides(parameter_overrides),
+            "seed": int(seed),
+            "state": state,
+            "run_folder": run_folder,
+            "error": error,
+            "time": datetime.now().isoformat(timespec="seconds"),
+        }
+        self.entries[entry["key"]] = entry
+        with open(self.ledger_file, 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def is_done(self, parameter_overrides, seed):
+        # Only trust 'done' if the output is still there and complete
+        entry = self.entries.get(self.key(parameter_overrides, seed))
+        return entry is not None and entry["state"] == DONE and gdat_is_complete(entry["run_folder"])
+
+    def remaining(self, jobs):
+        """
+        Returns the (parameter_overrides, seed) jobs that still need running:
+        pending ones, and running or failed ones left over from an interrupted sweep.
+        """
+        todo = [(parameter_overrides, seed) for parameter_overrides, seed in jobs
+                if not self.is_done(parameter_overrides, seed)]
+        print(f"Sweep ledger {self.ledger_file}: {len(jobs) - len(todo)} of {len(jobs)} runs already done.")
+        return todo
@@ -1,4 +1,3 @@
-import os
 import numpy as np
 import pandas as pd
 import seaborn as sns
@@ -6,29 +5,7 @@ import matplotlib.pyplot as plt
 from scipy import stats
 from statsmodels.stats.multicomp import pairwise_tukeyhsd
 from statannotations.Annotator import Annotator
-
-def load_final_values(folder_path, variable_name):
-    final_values = []
-    for root, dirs, files in os.walk(folder_path):
-        for file in files:
-            if file.endswith(".gdat"):
-                target_filepath = os.path.join(root, file)
-                data = np.loadtxt(target_filepath)
-                if data.ndim == 1:
-                    continue  # Skip if bad file
-
-                with open(target_filepath, 'r') as f:
-                    first_line = f.readline().strip()
-                    header = first_line.split()[2:]  # skip "# time"
-
-                header_dict = {var.lower(): idx + 1 for idx, var in enumerate(header)}
-                var_lower = variable_name.lower()
-
-                if var_lower in header_dict:
-                    idx = header_dict[var_lower]
-                    final_val = data[-1, idx]
-                    final_values.append(final_val)
-    return final_values
+from gdat_io import load_final_values
 
 def run_analysis(group_paths: dict, variable_name: str):
     """Takes a dict of group_name -> folder_path and a variable name, runs analysis & shows plot."""
@@ -0,0 +1,181 @@
+# This is the script where I save molecule positions during a run, small enough to keep on in production runs
+import os
+import re
+import json
+import glob
+
+import numpy as np
+
+from output_cadence import make_cadence, output_iterations
+
+"""
+MCell's CellBlender viz output writes every molecule every 100 iterations, which for 60 dodecamers x 12 subunits
+plus Ca and CaM is far too much to write. This writes the positions as compressed numpy arrays instead, with:
+- a species filter: only complexes containing these molecule types, e.g. ['CaMKII', 'NMDAR'],
+- a region filter: only molecules near the PM surface ({'near_surface': 0.05}, distance in um; surface molecules
+  are always on it) or inside a box ({'box': [[xmin, ymin, zmin], [xmax, ymax, zmax]]}, um),
+- decimation: frames at the iterations of a cadence (see output_cadence.py, e.g. log-spaced so the start of the run
+  gets more frames), and at most max_molecules molecules per species in a frame. The molecules kept are chosen
+  by id, so the same ones are followed from frame to frame.
+
+Settings are a dictionary given to run_model(viz_output=...), e.g.
+    {'cadence': {'method': 'log', 'n_points': 200}, 'species': ['CaMKII', 'NMDAR'], 'region': {'near_surface': 0.05}}
+
+Each frame is saved to <run_folder>/viz_data/<timestamp>_viz_<iteration>.npz with the arrays
+ids, species (index into the species list) and positions (float32, um), and the frames and the species list
+are listed in <run_folder>/viz_data/<timestamp>_viz_index.json. load_viz_frames() reads them back.
+"""
+
+DEFAULT_VIZ_OUTPUT = {
+    'cadence': {'method': 'uniform', 'every': 50000},
+    'species': None,        # molecule type names to keep, None keeps all
+    'region': None,         # {'near_surface': distance} or {'box': [low corner, high corner]}, None keeps everywhere
+    'max_molecules': None,  # largest number of molecules of one species in a frame, None keeps all
+}
+
+def make_viz_output(viz_output=None):
+    """
+    Fills in the defaults for any setting that isn't given, and checks them.
+    """
+    full_viz_output = dict(DEFAULT_VIZ_OUTPUT)
+    if viz_output:
+        unknown = set(viz_output) - set(DEFAULT_VIZ_OUTPUT)
+        if unknown:
+            raise ValueError(f"Unknown viz output settings: {sorted(unknown)}")
+        full_viz_output.update(viz_output)
+    full_viz_output['cadence'] = make_cadence(full_viz_output['cadence'])
+    if full_viz_output['cadence']['method'] == 'change':
+        raise ValueError("The 'change' cadence only works for the counts, use 'uniform', 'log' or 'piecewise' for viz output.")
+    region = full_viz_output['region']
+    if region is not None and set(region) - {'near_surface', 'box'}:
+        raise ValueError(f"Unknown viz region {region}, use {{'near_surface': distance}} or {{'box': [low, high]}}.")
+    return full_viz_output
+
+def molecule_types(species_name):
+    # Molecule type names in a BNGL species, e.g. 'CaM(ca~4,camkii!1).CaMKII(cam!1)' -> {'CaM', 'CaMKII'}
+    return set(re.findall(r"([A-Za-z_]\w*)\(", species_name)) or {species_name}
+
+class VizWriter:
+    def __init__(self, model, run_folder, timestamp, viz_output, ITERATIONS, surface_object="CP"):
+        self.model = model
+        self.settings = make_viz_output(viz_output)
+        self.schedule = output_iterations(self.settings['cadence'], ITERATIONS)
+        self.time_step = model.config.time_step
+        self.timestamp = timestamp
+        self.folder = os.path.join(run_folder, "viz_data")
+        os.makedirs(self.folder, exist_ok=True)
+        self.index_file = os.path.join(self.folder, f"{timestamp}_viz_index.json")
+
+        self.wanted_types = set(self.settings['species']) if self.settings['species'] else None
+        self.species = []          # species names, in the order of their index in the frames
+        self._species_index = {}   # MCell species id -> index in self.species, or None if filtered out
+        self.frames = []
+
+        # Centre and radius of the compartment, for the near_surface filter
+        vertices = None
+        for geometry_object in model.geometry_objects:
+            if geometry_object.name == surface_object:
+                vertices = np.array(geometry_object.vertex_list, dtype=float)
+        if vertices is not None:
+            self.centre = vertices.mean(axis=0)
+            self.radius = np.linalg.norm(vertices - self.centre, axis=1).mean()
+        elif self.settings['region'] and 'near_surface' in self.settings['region']:
+            raise ValueError(f"No geometry object '{surface_object}' in the model for the near_surface viz filter.")
+
+        self.record(0)
+
+    def next_output(self, iteration):
+        later = self.schedule[self.schedule > iteration]
+        return int(later[0]) if len(later) else int(self.schedule[-1])
+
+    def _species(self, species_id):
+        if species_id not in self._species_index:
+            name = self.model.get_species_name(species_id)
+            if self.wanted_types is not None and not molecule_types(name) & self.wanted_types:
+                self._species_index[species_id] = None
+            else:
+                self._species_index[species_id] = len(self.species)
+                self.species.append(name)
+        return self._species_index[species_id]
+
+    def _in_region(self, molecule, position):
+        region = self.settings['region']
+        if region is None:
+            return True
+        if 'box' in region:
+            low, high = np.array(region['box'][0]), np.array(region['box'][1])
+            return bool(np.all(position >= low) and np.all(position <= high))
+        if molecule.wall_index >= 0:
+            return True  # surface molecule (only they have a wall), on the PM
+        return self.radius - np.linalg.norm(position - self.centre) <= region['near_surface']
+
+    def record(self, iteration, force=False):
+        """
+        Saves a frame for this iteration if the cadence asks for one (always if force is True).
+        """
+        if self.frames and self.frames[-1]["iteration"] == iteration:
+            return
+        if not force and iteration not in self.schedule:
+            return
+
+        ids, species, positions = [], [], []
+        for molecule_id in self.model.get_molecule_ids():
+            molecule = self.model.get_molecule(molecule_id)
+            species_index = self._species(molecule.species_id)
+            if species_index is None:
+                continue
+            position = np.array(molecule.pos3d, dtype=float)
+            if not self._in_region(molecule, position):
+                continue
+            ids.append(molecule_id)
+            species.append(species_index)
+            positions.append(position)
+
+        ids = np.array(ids, dtype=np.int64)
+        species = np.array(species, dtype=np.int32)
+        positions = np.array(positions, dtype=np.float32).reshape(-1, 3)
+
+        max_molecules = self.settings['max_molecules']
+        if max_molecules is not None and len(ids):
+            keep = np.zeros(len(ids), dtype=bool)
+            for species_index in np.unique(species):
+                of_species = np.flatnonzero(species == species_index)
+                # Every stride-th molecule id, so the same molecules are kept in the next frames
+                stride = int(np.ceil(len(of_species) / max_molecules))
+                keep[of_species[ids[of_species] % stride == 0][:max_molecules]] = True
+            ids, species, positions = ids[keep], species[keep], positions[keep]
+
+        frame_file = f"{self.timestamp}_viz_{int(iteration):010d}.npz"
+        np.savez_compressed(os.path.join(self.folder, frame_file), ids=ids, species=species, positions=positions)
+        self.frames.append({"iteration": int(iteration), "time": iteration * self.time_step,
+                            "file": frame_file, "n_molecules": int(len(ids))})
+        self._write_index()
+
+    def _write_index(self):
+        with open(self.index_file, 'w') as f:
+            json.dump({"species": self.species, "frames": self.frames, "settings": self.settings}, f, indent=4)
+
+    def close(self, iteration):
+        # Last frame, at the iteration the run stopped at
+        self.record(iteration, force=True)
+
+def load_viz_frames(run_folder):
+    """
+    Reads back the viz output of a run.
+
+    Returns:
+    - species (list of str): species names, frames refer to them by index.
+    - frames (list of dict): iteration, time, and the arrays ids, species and positions of each frame.
+    """
+    index_files = glob.glob(os.path.join(run_folder, "viz_data", "*_viz_index.json"))
+    if not index_files:
+        raise FileNotFoundError(f"No viz output in {run_folder}.")
+    with open(index_files[0], 'r') as f:
+        index = json.load(f)
+
+    frames = []
+    for frame in index["frames"]:
+        with np.load(os.path.join(run_folder, "viz_data", frame["file"])) as data:
+            frames.append({"iteration": frame["iteration"], "time": frame["time"],
+                           "ids": data["ids"], "species": data["species"], "positions": data["positions"]})
+    return index["species"], frames
@@ -0,0 +1,135 @@
+# This is the script where I equilibrate Ca-CaM binding once and start sweep runs from that state (warm start)
+import os
+import re
+import glob
+import json
+import hashlib
+
+from run_model import run_model
+from gdat_io import read_final_row
+from bngl_parameters import load_bngl_parameters
+
+"""
+Every run starts with all CaM at ca~0 and spends its first iterations binding Ca to CaM,
+which does not depend on the CaMKII or NMDAR parameters being swept.
+
+A warm start runs that Ca-CaM equilibration once (without CaMKII, NMDAR or PP1) for each set of upstream parameters,
+saves the number of CaM molecules in each ca~ state, and writes a copy of the BNGL file
+whose species block starts from those numbers. Sweep points then run from that copy with their own overrides.
+"""
+
+# Parameters that change the Ca-CaM equilibration. Points with the same values for these share one warm start.
+UPSTREAM_PARAMETERS = [
+    'Ca_i', 'CaM_i',
+    'kon_1_CaCaM', 'kon_2_CaCaM', 'kon_3_CaCaM', 'kon_4_CaCaM',
+    'koff_1CaCaM', 'koff_2CaCaM', 'koff_3CaCaM', 'koff_4CaCaM',
+    'D_VOL', 'MCELL_DIFFUSION_CONSTANT_3D_Ca', 'MCELL_DIFFUSION_CONSTANT_3D_CaM', 'VolCP',
+]
+
+# Observables with the number of CaM molecules with 0 to 4 Ca bound
+CAM_OBSERVABLES = ['CaM_free', 'CaM_Ca1', 'CaM_Ca2', 'CaM_Ca3', 'CaM_Ca4']
+
+WARM_START_FOLDER = os.path.join("data_output", "warm_start")
+
+def upstream_values(bngl_file, parameter_overrides):
+    # Evaluated values of the upstream parameters with these overrides, so an override of anything they are
+    # computed from (e.g. VOL_RXN or NA_um3 for the kon_*_CaCaM rates) changes them too
+    values = load_bngl_parameters(bngl_file, parameter_overrides)
+    return {name: float(values[name]) for name in UPSTREAM_PARAMETERS if name in values}
+
+def warm_start_key(bngl_file, parameter_overrides, burn_in_iterations):
+    # The BNGL text, the evaluated upstream parameters and the length of the burn-in decide the equilibrated state
+    with open(bngl_file, 'rb') as f:
+        bngl_hash = hashlib.sha1(f.read()).hexdigest()
+    upstream = upstream_values(bngl_file, parameter_overrides)
+    text = json.dumps({"bngl": bngl_hash, "upstream": upstream, "burn_in": int(burn_in_iterations)}, sort_keys=True)
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+def final_cam_state(run_folder):
+    """
+    Reads the last row of the run's .gdat and returns the number of CaM molecules in each ca~ state.
+    """
+    gdat_file = glob.glob(os.path.join(run_folder, "*_out.gdat"))[0]
+    row, header_dict = read_final_row(gdat_file, columns=CAM_OBSERVABLES)
+    return [int(row[header_dict[name]]) for name in CAM_OBSERVABLES]
+
+def write_warm_bngl(bngl_file, cam_counts, Ca_i, output_file):
+    """
+    Writes a copy of bngl_file that starts with CaM already bound to Ca:
+    one CaM species per ca~ state with the counts from the burn-in, and the free Ca left over.
+    """
+    free_ca = int(round(Ca_i)) - sum(n_ca * count for n_ca, count in enumerate(cam_counts))
+    if free_ca < 0:
+        raise ValueError(f"More Ca bound to CaM ({int(Ca_i) - free_ca}) than Ca_i ({Ca_i}).")
+
+    with open(bngl_file, 'r') as f:
+        lines = f.readlines()
+
+    new_lines = []
+    in_species = False
+    found_ca = found_cam = False
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith("begin species"):
+            in_species = True
+        elif stripped.startswith("end species"):
+            in_species = False
+        elif in_species and re.match(r"@CP:Ca\(\)\s", stripped):
+            new_lines.append(f"@CP:Ca() {free_ca} # warm start, was: {stripped}\n")
+            found_ca = True
+            continue
+        elif in_species and re.match(r"@CP:CaM\(ca~0,camkii\)\s", stripped):
+            new_lines.append(f"# warm start, was: {stripped}\n")
+            for n_ca, count in enumerate(cam_counts):
+                new_lines.append(f"@CP:CaM(ca~{n_ca},camkii) {count}\n")
+            found_cam = True
+            continue
+        new_lines.append(line)
+
+    # A copy that still starts from the cold state would look like a warm start, so don't write one
+    missing = [species for species, found in [("@CP:Ca()", found_ca), ("@CP:CaM(ca~0,camkii)", found_cam)] if not found]
+    if missing:
+        raise ValueError(f"Can't write a warm start for {bngl_file}: no {' or '.join(missing)} line in its species block.")
+
+    with open(output_file, 'w') as f:
+        f.writelines(new_lines)
+    return output_file
+
+def get_warm_start(bngl_file, parameter_overrides=None, burn_in_iterations=100000, seed=None):
+    """
+    Returns the path to a warm-start copy of bngl_file for these upstream parameters,
+    running the Ca-CaM burn-in first if it hasn't been done yet.
+
+    The burn-in uses the same seed for every warm start, so all points (and replicates) that share
+    upstream parameters also share the same starting CaM state.
+    """
+    key = warm_start_key(bngl_file, parameter_overrides, burn_in_iterations)
+    warm_bngl = os.path.join(WARM_START_FOLDER, f"{key}_{os.path.basename(bngl_file)}")
+    if os.path.exists(warm_bngl):
+        return warm_bngl
+
+    os.makedirs(WARM_START_FOLDER, exist_ok=True)
+    # The point's own overrides give the upstream values the key was made from, the ones that only act
+    # downstream don't matter with no CaMKII, NMDAR or PP1
+    burn_in_overrides = {
+        **(parameter_overrides or {}),
+        'CaMKII_i': 0, 'NMDAR_i': 0, 'PP1_i': 0,
+        'ITERATIONS': burn_in_iterations,
+    }
+    print(f"Warm start {key}: equilibrating Ca-CaM for {int(burn_in_iterations)} iterations.")
+    run_kwargs = {} if seed is None else {"seed": seed}
+    run_folder, timestamp, df = run_model(burn_in_overrides, bngl_file=bngl_file, output_folder=WARM_START_FOLDER, **run_kwargs)
+
+    cam_counts = final_cam_state(run_folder)
+    Ca_i = df.loc[df['Parameter'] == 'Ca_i', 'Value'].iloc[0]
+
+    # Write to a temporary name first, so a half-written file is never taken as a finished warm start
+    write_warm_bngl(bngl_file, cam_counts, Ca_i, warm_bngl + ".tmp")
+    os.replace(warm_bngl + ".tmp", warm_bngl)
+    with open(os.path.join(WARM_START_FOLDER, f"{key}.json"), 'w') as f:
+        json.dump({"bngl_file": bngl_file, "burn_in_run_folder": run_folder, "cam_counts": cam_counts,
+                   "Ca_i": float(Ca_i), "overrides": burn_in_overrides,
+                   "upstream": upstream_values(bngl_file, parameter_overrides)}, f, indent=4, default=float)
+    print(f"Warm start {key} saved to {warm_bngl}")
+
+    return warm_bngl
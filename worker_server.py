@@ -0,0 +1,170 @@
+# This is the script where I keep worker processes running, with MCell already imported, to take runs from a queue
+import os
+import queue
+import traceback
+import multiprocessing as mp
+from collections import deque
+
+"""
+Every run normally pays for `import mcell`, building the CP/PM icosphere and loading the BNGL.
+For short runs that setup is a large part of the time. A WorkerServer starts long-lived worker processes
+that import MCell and build the geometry once, then take run requests (parameter overrides, seed, ...)
+from a queue until they are stopped.
+
+    server = WorkerServer(n_workers=8)
+    server.start()
+    for seed in [1, 2, 3]:
+        server.submit({'kon_CaMKII_NMDAR': 2e4}, seed=seed)
+    for job_id, run_output, error in server.results(3):
+        ...
+    server.stop()
+
+A worker that dies in the middle of a run (killed for memory, or a segfault inside MCell) is replaced by a new one,
+and its run comes back from results() with an error instead of leaving the caller waiting forever.
+
+The parsed BNGL itself isn't kept in the worker: MCell builds the molecule types, rules and rates into the model
+object with the overrides of the run, and those objects can only be added to one model,
+so every run still calls model.load_bngl(). The parameter dictionary for the .csv is cached per process (bngl_cache.py).
+"""
+
+# Seconds results() waits for a result before checking that the workers are still alive
+RESULT_POLL_SECONDS = 5
+
+# Workers replaced after dying, before giving up (a worker that dies on start-up would otherwise be restarted forever)
+MAX_RESTARTS = 20
+
+def warm_up_worker():
+    """
+    Pays the start-up cost of a worker process: imports MCell (through run_model) and builds the geometry.
+    Also used as the initializer of the process pool in parallel_runs.py.
+    """
+    import mcell_params
+    import run_model  # noqa: F401, imported here so the worker doesn't import it again for its first run
+    mcell_params.create_geometry()
+
+def _serve(request_queue, result_queue):
+    # Worker loop: run requests until the None sentinel arrives
+    warm_up_worker()
+    from run_model import run_model
+    print(f"Worker {os.getpid()} ready.")
+
+    while True:
+        request = request_queue.get()
+        if request is None:
+            break
+        job_id, parameter_overrides, run_kwargs = request
+        try:
+            result_queue.put((job_id, run_model(parameter_overrides, **run_kwargs), None))
+        except Exception:
+            result_queue.put((job_id, None, traceback.format_exc()))
+
+class WorkerServer:
+    """
+    A set of long-lived worker processes, each given one run request at a time from the server's backlog,
+    so the server always knows which run each worker is on.
+    """
+    def __init__(self, n_workers=None):
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.result_queue = mp.Queue()
+        self.backlog = deque()
+        self.workers = []
+        self.request_queues = {}  # worker -> its own request queue
+        self.running = {}         # worker -> request it is running, or None when idle
+        self.next_job_id = 0
+        self.restarts = 0
+
+    def _start_worker(self):
+        request_queue = mp.Queue()
+        worker = mp.Process(target=_serve, args=(request_queue, self.result_queue), daemon=True)
+        worker.start()
+        self.workers.append(worker)
+        self.request_queues[worker] = request_queue
+        self.running[worker] = None
+
+    def start(self):
+        for _ in range(self.n_workers):
+            self._start_worker()
+        print(f"Started {self.n_workers} workers.")
+        return self
+
+    def _dispatch(self):
+        # Hands the next requests of the backlog to the idle workers
+        for worker in self.workers:
+            if not self.backlog:
+                break
+            if self.running[worker] is None:
+                request = self.backlog.popleft()
+                self.running[worker] = request
+                self.request_queues[worker].put(request)
+
+    def submit(self, parameter_overrides=None, **run_kwargs):
+        """
+        Queues one run. run_kwargs are passed on to run_model() (e.g. seed, bngl_file).
+        Returns the job id, which comes back with its result.
+        """
+        job_id = self.next_job_id
+        self.next_job_id += 1
+        self.backlog.append((job_id, parameter_overrides or {}, run_kwargs))
+        self._dispatch()
+        return job_id
+
+    def n_pending(self):
+        # Runs submitted whose result hasn't been returned by results() yet
+        return len(self.backlog) + sum(request is not None for request in self.running.values())
+
+    def results(self, n_results):
+        """
+        Yields (job_id, (run_folder, timestamp, df), error) for the next n_results runs to finish.
+        error is None for runs that finished, the traceback for runs that failed,
+        and a message for runs whose worker died (killed for memory, a segfault inside MCell, ...).
+        """
+        n_yielded = 0
+        while n_yielded < n_results:
+            try:
+                results = [self.result_queue.get(timeout=RESULT_POLL_SECONDS)]
+            except queue.Empty:
+                results = self._replace_dead_workers()
+            for result in results:
+                for worker, request in self.running.items():
+                    if request is not None and request[0] == result[0]:
+                        self.running[worker] = None
+                yield result
+                n_yielded += 1
+            self._dispatch()
+
+    def _replace_dead_workers(self):
+        # Starts a new worker for each one that died, returns an error result for the run each dead worker was on
+        results = []
+        for worker in [worker for worker in self.workers if not worker.is_alive()]:
+            request = self.running.pop(worker)
+            self.workers.remove(worker)
+            del self.request_queues[worker]
+            if request is not None:
+                message = f"Worker {worker.pid} died (exit code {worker.exitcode}) while running job {request[0]}."
+                print(message)
+                results.append((request[0], None, message))
+            if self.restarts >= MAX_RESTARTS:
+                raise RuntimeError(f"Workers died {self.restarts} times, not starting more.")
+            self.restarts += 1
+            self._start_worker()
+        return results
+
+    def stop(self):
+        # Runs already submitted are finished first (their results are dropped if they weren't read), then one sentinel per worker
+        pending = self.n_pending()
+        if pending:
+            print(f"Finishing {pending} submitted runs before stopping.")
+            for _ in self.results(pending):
+                pass
+        for worker in self.workers:
+            self.request_queues[worker].put(None)
+        for worker in self.workers:
+            worker.join()
+        self.workers, self.request_queues, self.running = [], {}, {}
+        print("Workers stopped.")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()